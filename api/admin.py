@@ -8,7 +8,8 @@ from .models import (
     Receiving, ReceivingItem, SaleReturn, Notification, UserPermission,
     OnlineOrder, OnlineOrderItem, OnlineReturn,
     Client, Device, Feature, ClientFeature,
-    Employee, Attendance, Leave, Payroll, PerformanceReview, Shift
+    Employee, Attendance, Leave, Payroll, PerformanceReview, Shift,
+    SyncJob, PushSession, DeviceSyncState
 )
 
 
@@ -238,3 +239,22 @@ class ShiftAdmin(admin.ModelAdmin):
 class UserPermissionAdmin(admin.ModelAdmin):
     list_display = ('user', 'updated_at')
     search_fields = ('user__email',)
+
+@admin.register(SyncJob)
+class SyncJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'store_id', 'device_id', 'status', 'processed_rows', 'total_rows', 'attempts', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('id', 'store_id', 'device_id')
+    exclude = ('payload',)
+
+@admin.register(PushSession)
+class PushSessionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'store_id', 'device_id', 'status', 'total_chunks', 'created_at', 'completed_at')
+    list_filter = ('status',)
+    search_fields = ('id', 'store_id', 'device_id')
+
+@admin.register(DeviceSyncState)
+class DeviceSyncStateAdmin(admin.ModelAdmin):
+    list_display = ('device_id', 'table_name', 'store_id', 'watermark', 'change_seq', 'last_row_count', 'last_duration_ms', 'last_pulled_at')
+    list_filter = ('table_name',)
+    search_fields = ('device_id', 'store_id')
@@ -3,3 +3,25 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from . import checks  # noqa: F401 (registers the sync index check)
+
+        # Build the sync field metadata once per model instead of per pushed/pulled row
+        from .sync import build_schemas, connect_changelog, snapshot_save_side_effects
+        models = list(self.get_models())
+        build_schemas(models)
+
+        # Remember which models have business post_save receivers before the
+        # change log adds its own to every pulled model
+        snapshot_save_side_effects(models)
+        from .views import PullEndpoint
+        connect_changelog(PullEndpoint.changelog_tables())
+
+        # Cached barcode/SKU scans go stale with their product or tax slab
+        from .search import connect_lookup_cache
+        connect_lookup_cache()
+
+        # Inline Base64 images go to the media store before they reach the database
+        from .media import connect_media
+        connect_media(models)
@@ -0,0 +1,39 @@
+from django.core import checks
+
+
+@checks.register(checks.Tags.models)
+def check_sync_indexes(app_configs, **kwargs):
+    """
+    Every pulled table needs an index matching the incremental pull filter:
+    (store, <delta field>, pk) for store-scoped tables, (<delta field>, pk) for
+    tables every store receives. Without it Postgres scans all of a store's
+    rows (or the whole table) on every device sync.
+    """
+    from .sync import get_schema
+    from .views import PullEndpoint
+
+    errors = []
+    pull = PullEndpoint()
+    for table, model, store_path in PullEndpoint.changelog_tables():
+        if app_configs is not None and model._meta.app_config not in app_configs:
+            continue
+        schema = get_schema(model)
+        delta_field = pull.delta_field(table, schema)
+        if delta_field is None:
+            continue
+        if store_path is None:
+            expected = [delta_field, schema.pk_name]
+        else:
+            expected = ['store', delta_field, schema.pk_name]
+
+        prefixes = {tuple(expected[:-1])}
+        if expected[0] == 'store':
+            prefixes.add(('store_id', *expected[1:-1]))
+        if not any(tuple(index.fields[:len(expected) - 1]) in prefixes for index in model._meta.indexes):
+            errors.append(checks.Error(
+                f"Synced table '{table}' ({model.__name__}) has no index for incremental pulls.",
+                hint=f"Add models.Index(fields={expected!r}, name=...) to {model.__name__}.Meta.indexes and make a migration.",
+                obj=model,
+                id='api.E001',
+            ))
+    return errors
@@ -0,0 +1,153 @@
+"""
+Server-push change notifications for the sync endpoints (sync/events).
+
+A device opens a Server-Sent Events stream for its store and receives one
+small message per burst of committed changes:
+
+    id: 1234
+    event: changes
+    data: {"store_id": "store-1", "tables": ["sales", "sale_payments"], "seq": 1234}
+
+It then runs sync/pull since_seq=<its last seq> as usual; the message is only a
+hint, the change log stays the source of truth. Messages are published by the
+change log writers in api.sync once the writing transaction commits.
+
+Fan-out goes through a broker chosen by SYNC_EVENTS_BROKER. The default
+InProcessBroker only reaches subscribers in the same process as the writer,
+which covers a single ASGI process (and tests); deployments with several
+workers plug in a shared backend implementing the same three methods.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class InProcessBroker:
+    """
+    Subscribers are asyncio queues keyed by store. publish() may be called
+    from any thread (sync views run in worker threads under ASGI): delivery
+    is handed to each subscriber's event loop with call_soon_threadsafe.
+    """
+    QUEUE_SIZE = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # store_id -> {queue: loop}
+
+    def subscribe(self, store_id):
+        """New queue receiving the messages of `store_id`; call from the event loop."""
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(store_id, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, store_id, queue):
+        with self._lock:
+            queues = self._subscribers.get(store_id, {})
+            queues.pop(queue, None)
+            if not queues:
+                self._subscribers.pop(store_id, None)
+
+    def publish(self, store_id, message):
+        """Deliver `message` to the subscribers of `store_id` ('' = every store)."""
+        with self._lock:
+            if store_id == '':
+                targets = [item for queues in self._subscribers.values() for item in queues.items()]
+            else:
+                targets = list(self._subscribers.get(store_id, {}).items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, message)
+            except RuntimeError:  # Loop already closed: the stream is gone
+                continue
+
+
+def _offer(queue, message):
+    # A full queue means the stream is far behind; it coalesces whatever it has
+    # and the pull it triggers catches up on the rest
+    if not queue.full():
+        queue.put_nowait(message)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'SYNC_EVENTS_BROKER', 'api.events.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish_changes(store_id, tables, seq=None):
+    """Announce that `tables` of `store_id` changed up to ChangeLog `seq`."""
+    get_broker().publish(store_id, {"store_id": store_id, "tables": sorted(tables), "seq": seq})
+
+
+def format_event(message):
+    lines = []
+    if message.get("seq") is not None:
+        lines.append(f"id: {message['seq']}")
+    lines.append("event: changes")
+    lines.append(f"data: {json.dumps(message, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+def changes_since(store_id, since_seq):
+    """(tables, newest seq) this store missed after `since_seq`, for reconnecting streams."""
+    from .models import ChangeLog
+
+    entries = ChangeLog.objects.filter(seq__gt=since_seq, store_id__in=[store_id, ''])
+    tables = sorted(set(entries.values_list('table_name', flat=True).distinct()))
+    seq = entries.order_by('-seq').values_list('seq', flat=True).first()
+    return tables, seq
+
+
+async def change_event_stream(store_id, since_seq=None):
+    """
+    SSE body for one subscriber. Each burst is held for the change log settle
+    window (see api.sync.get_settle_cutoff) before it is sent, so the pull it
+    triggers can already see the rows; everything arriving meanwhile is merged
+    into the same message.
+    """
+    from asgiref.sync import sync_to_async
+
+    broker = get_broker()
+    queue = broker.subscribe(store_id)
+    settle = getattr(settings, 'SYNC_CHANGELOG_SETTLE_SECONDS', 5)
+    keepalive = getattr(settings, 'SYNC_EVENTS_KEEPALIVE_SECONDS', 15)
+    print(f"[EVENTS] Stream opened for store {store_id}")
+    try:
+        yield "retry: 5000\n\n"
+
+        # Reconnect: report what was missed while the stream was down
+        if since_seq is not None:
+            tables, seq = await sync_to_async(changes_since)(store_id, since_seq)
+            if seq is not None:
+                yield format_event({"store_id": store_id, "tables": tables, "seq": seq})
+
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            await asyncio.sleep(settle)
+            tables, seq = set(message["tables"]), message["seq"]
+            while not queue.empty():
+                extra = queue.get_nowait()
+                tables.update(extra["tables"])
+                if extra["seq"] is not None:
+                    seq = max(seq or 0, extra["seq"])
+            yield format_event({"store_id": store_id, "tables": sorted(tables), "seq": seq})
+    finally:
+        broker.unsubscribe(store_id, queue)
+        print(f"[EVENTS] Stream closed for store {store_id}")
@@ -0,0 +1,104 @@
+"""
+Default filter backends of the DRF viewsets (REST_FRAMEWORK DEFAULT_FILTER_BACKENDS).
+
+- IndexedOrderingFilter: ?ordering= limited to fields an index can serve,
+  so a client can't ask for a sort that scans the whole table.
+- SparseFieldsFilter: with ?fields=, skips loading the text/JSON columns and
+  prefetches that no requested field needs (nothing is skipped when a
+  requested field reads the whole object, e.g. a SerializerMethodField).
+  The serializers drop the other fields themselves (serializers.SparseFieldsMixin).
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import QuerySet
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+# Column types worth not loading when a list view doesn't show them
+HEAVY_FIELD_TYPES = (models.TextField, models.JSONField)
+
+
+def requested_fields(request):
+    """Field names asked for with ?fields=a,b on a read request (always with id), or None."""
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return None
+    raw = request.query_params.get('fields')
+    if not raw:
+        return None
+    fields = {name.strip() for name in raw.split(',') if name.strip()}
+    return fields | {'id'} if fields else None
+
+
+def is_nullable(model, name):
+    """Whether `name` is a nullable column of `model` (False for pk aliases and annotations)."""
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return bool(getattr(field, 'null', False)) and getattr(field, 'concrete', False)
+
+
+def indexed_ordering_fields(model):
+    """
+    Fields of `model` an ordering can use an index for: the pk, indexed or
+    unique columns, the first column of each Meta index and, for indexes
+    starting with the store, the column after it (store-scoped lists).
+    Relations are left out, ordering by them sorts on the related table, and
+    so are nullable columns: a cursor can't continue from a NULL position
+    (`col > NULL` matches nothing), so pages would repeat or drop rows.
+    """
+    names = {model._meta.pk.name}
+    for field in model._meta.concrete_fields:
+        if (field.db_index or field.unique) and not field.is_relation:
+            names.add(field.name)
+    for index in model._meta.indexes:
+        columns = [column.lstrip('-') for column in index.fields]
+        if columns[:1] in (['store'], ['store_id']):
+            columns = columns[1:]
+        if columns:
+            names.add(columns[0])
+    return sorted(
+        name for name in names
+        if name == model._meta.pk.name
+        or not (model._meta.get_field(name).is_relation or is_nullable(model, name))
+    )
+
+
+class IndexedOrderingFilter(OrderingFilter):
+    """
+    ?ordering= for every viewset. A view may still list its own
+    ordering_fields; by default the whitelist is indexed_ordering_fields().
+    """
+    def get_default_valid_fields(self, queryset, view, context=None):
+        return [(name, name) for name in indexed_ordering_fields(queryset.model)]
+
+
+class SparseFieldsFilter(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        wanted = requested_fields(request)
+        if not wanted or not isinstance(queryset, QuerySet) or not hasattr(view, 'get_serializer_class'):
+            return queryset
+
+        # Model attributes the requested serializer fields read
+        needed = set()
+        for name, field in view.get_serializer_class()().fields.items():
+            if name in wanted:
+                if field.source == '*':
+                    # SerializerMethodField & co. may read any column or relation:
+                    # deferring would cost a query per row, so load everything
+                    return queryset
+                needed.add(name)
+                if field.source:
+                    needed.add(field.source.split('.')[0])
+
+        deferred = [
+            field.name for field in queryset.model._meta.concrete_fields
+            if isinstance(field, HEAVY_FIELD_TYPES) and not field.primary_key and field.name not in needed
+        ]
+        if deferred:
+            queryset = queryset.defer(*deferred)
+
+        lookups = queryset._prefetch_related_lookups
+        kept = [lookup for lookup in lookups if getattr(lookup, 'prefetch_to', lookup).split('__')[0] in needed]
+        if len(kept) != len(lookups):
+            queryset = queryset.prefetch_related(None).prefetch_related(*kept)
+        return queryset
@@ -0,0 +1,136 @@
+import gzip
+import json
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.renderers import msgpack_available, packb, unpackb
+from api.sync import get_schema
+from api.views import PullEndpoint
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class Command(BaseCommand):
+    help = 'Compares sync pull payload size and encode/decode time for JSON, MessagePack, gzip and zstd'
+
+    # Row counts of the synthetic dump, roughly a mid-sized store after a year
+    SYNTHETIC_ROWS = {
+        'products': 3000,
+        'customers': 2000,
+        'sales': 20000,
+        'sale_payments': 20000,
+        'stock_logs': 40000,
+        'transactions': 8000,
+        'suppliers': 100,
+        'purchases': 1500,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', help='Benchmark the real pull of this store instead of synthetic rows')
+        parser.add_argument('--scale', type=float, default=1.0, help='Multiply the synthetic row counts')
+        parser.add_argument('--repeat', type=int, default=3, help='Timing runs per format (best is reported)')
+
+    def handle(self, *args, **options):
+        if options['store']:
+            json_dump, native_dump = self.store_dump(options['store'])
+        else:
+            json_dump, native_dump = self.synthetic_dump(options['scale'])
+        rows = sum(len(v) for v in json_dump['updates'].values())
+        self.stdout.write(f"Dump: {rows} rows in {len(json_dump['updates'])} tables\n")
+
+        codecs = [('identity', lambda b: b, lambda b: b), ('gzip', lambda b: gzip.compress(b, 6), gzip.decompress)]
+        if zstandard is not None:
+            codecs.append(('zstd', zstandard.ZstdCompressor(level=3).compress, zstandard.ZstdDecompressor().decompress))
+        else:
+            self.stdout.write("zstandard not installed: zstd rows skipped")
+
+        formats = [('json', json_dump, lambda d: json.dumps(d, separators=(',', ':')).encode(), json.loads)]
+        if msgpack_available():
+            formats.append(('msgpack', native_dump, packb, unpackb))
+        else:
+            self.stdout.write("msgpack not installed: MessagePack rows skipped")
+
+        baseline = None
+        self.stdout.write(f"{'format':<20}{'bytes':>14}{'ratio':>8}{'encode ms':>12}{'decode ms':>12}")
+        for format_name, dump, encode, decode in formats:
+            for codec_name, compress, decompress in codecs:
+                encode_ms, payload = self.best_of(options['repeat'], lambda: compress(encode(dump)))
+                decode_ms, _ = self.best_of(options['repeat'], lambda: decode(decompress(payload)))
+                baseline = baseline or len(payload)
+                label = format_name if codec_name == 'identity' else f"{format_name}+{codec_name}"
+                self.stdout.write(
+                    f"{label:<20}{len(payload):>14,}{len(payload) / baseline:>8.2f}{encode_ms:>12.1f}{decode_ms:>12.1f}"
+                )
+
+    def best_of(self, repeat, fn):
+        best, result = None, None
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            result = fn()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def store_dump(self, store_id):
+        """The full pull of a real store, once as JSON-ready strings and once with native types."""
+        dumps = []
+        for native in (False, True):
+            pull = PullEndpoint()
+            pull.native_types = native
+            updates = {}
+            for table in pull.ORDER:
+                model = pull.MODEL_MAPPING.get(table)
+                if not model:
+                    continue
+                try:
+                    rows, _, _ = pull.pull_table(table, model, store_id, None)
+                except Exception as e:
+                    self.stdout.write(f"skipping {table}: {e}")
+                    continue
+                if rows:
+                    updates[table] = rows
+            dumps.append({"status": "success", "updates": updates})
+        return dumps
+
+    def synthetic_dump(self, scale):
+        """Rows shaped like the real pull output, generated from each model's pull columns."""
+        rng = random.Random(42)
+        now = timezone.now()
+        json_updates, native_updates = {}, {}
+        for table, count in self.SYNTHETIC_ROWS.items():
+            schema = get_schema(PullEndpoint.MODEL_MAPPING[table])
+            json_rows, native_rows = [], []
+            for i in range(int(count * scale)):
+                raw = [self.fake_value(field, i, rng, now) for field in schema.pull_fields]
+                json_rows.append({k: convert(v) for k, convert, v in zip(schema.pull_keys, schema.pull_converters, raw)})
+                native_rows.append({k: convert(v) for k, convert, v in zip(schema.pull_keys, schema.pull_native_converters, raw)})
+            json_updates[table], native_updates[table] = json_rows, native_rows
+        return {"status": "success", "updates": json_updates}, {"status": "success", "updates": native_updates}
+
+    def fake_value(self, field, i, rng, now):
+        kind = field.internal_type
+        if field.primary_key or field.is_relation:
+            return f"{field.name[:4]}-{rng.randrange(36 ** 9):09x}"
+        if field.null and rng.random() < 0.2:
+            return None
+        if kind == 'DateTimeField':
+            return now - timedelta(seconds=rng.randrange(365 * 86400), microseconds=rng.randrange(10 ** 6))
+        if kind == 'DateField':
+            return (now - timedelta(days=rng.randrange(365))).date()
+        if kind == 'DecimalField':
+            return Decimal(rng.randrange(1, 10 ** 6)) / 100
+        if kind == 'BooleanField':
+            return rng.random() < 0.5
+        if kind in ('IntegerField', 'PositiveIntegerField', 'BigIntegerField'):
+            return rng.randrange(1000)
+        if kind == 'TextField':
+            return f"note {i} " * rng.randrange(1, 6)
+        return f"{field.name} {i}"
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Store
+from api.snapshots import build_snapshot, is_stale, latest_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Builds bootstrap snapshots for stores whose newest one is missing or stale (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', action='append', dest='stores', help='Only this store id (repeatable)')
+        parser.add_argument('--force', action='store_true', help='Rebuild even if the current snapshot is fresh')
+
+    def handle(self, *args, **options):
+        store_ids = options['stores'] or list(Store.objects.values_list('id', flat=True))
+        built = 0
+        for store_id in store_ids:
+            if not options['force'] and not is_stale(latest_snapshot(store_id)):
+                self.stdout.write(f"{store_id}: snapshot is fresh, skipped")
+                continue
+            try:
+                snapshot = build_snapshot(store_id)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"{store_id}: snapshot failed: {e}"))
+                continue
+            built += 1
+            self.stdout.write(f"{store_id}: {snapshot.row_count} rows, {snapshot.size_bytes} bytes, seq {snapshot.change_seq}")
+        self.stdout.write(self.style.SUCCESS(f'Built {built} snapshot(s).'))
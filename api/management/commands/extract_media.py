@@ -0,0 +1,62 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from api.media import INLINE_MIN_LENGTH, decode_inline_image, store_image
+from api.sync import record_changes
+
+
+class Command(BaseCommand):
+    help = 'Moves inline Base64 images already in the database to the media store, keeping only their URL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows rewritten per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be rewritten')
+
+    def handle(self, *args, **options):
+        total = 0
+        for model in apps.get_app_config('api').get_models():
+            for field in getattr(model, 'MEDIA_FIELDS', ()):
+                moved = self.extract(model, field, options['batch_size'], options['dry_run'])
+                if moved:
+                    self.stdout.write(f"{model.__name__}.{field}: {moved} image(s)")
+                total += moved
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total} inline image(s) to the media store.'))
+
+    def extract(self, model, field, batch_size, dry_run):
+        # URLs and paths are short or start with a scheme / slash; only the rest is decoded
+        pks = list(
+            model.objects.annotate(value_length=Length(field))
+            .filter(value_length__gte=INLINE_MIN_LENGTH)
+            .exclude(Q(**{f'{field}__startswith': 'http'}) | Q(**{f'{field}__startswith': '/'}))
+            .values_list('pk', flat=True)
+        )
+        moved = 0
+        for start in range(0, len(pks), batch_size):
+            batch = []
+            for pk, value in model.objects.filter(pk__in=pks[start:start + batch_size]).values_list('pk', field):
+                decoded = decode_inline_image(value)
+                if decoded is None:
+                    continue
+                moved += 1
+                if not dry_run:
+                    batch.append((pk, store_image(*decoded)))
+            if batch:
+                self.rewrite(model, field, batch)
+        return moved
+
+    def rewrite(self, model, field, batch):
+        changes = {field: None}
+        if any(f.name == 'updated_at' for f in model._meta.concrete_fields):
+            # Devices pull the URL on their next incremental sync
+            changes['updated_at'] = timezone.now()
+        with transaction.atomic():
+            for pk, url in batch:
+                changes[field] = url
+                model.objects.filter(pk=pk).update(**changes)
+            # update() sends no post_save
+            record_changes(model, [pk for pk, _ in batch])
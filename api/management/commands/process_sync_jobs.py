@@ -0,0 +1,71 @@
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from api.models import SyncJob
+from api.sync import enable_hash_pool
+from api.views import PushEndpoint
+
+
+class Command(BaseCommand):
+    help = 'Applies queued async sync pushes (sync/push?async=1), FIFO per store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        self.stdout.write("Sync job worker started.")
+        # Long-lived worker: worth a password hashing pool (web workers never start one)
+        enable_hash_pool()
+        # Jobs left running by a worker that died (OOM, deploy, SIGKILL)
+        requeued, failed = SyncJob.reclaim_stale()
+        if requeued or failed:
+            self.stdout.write(f"Reclaimed stale jobs: {requeued} requeued, {failed} failed.")
+        while True:
+            close_old_connections()
+            job = SyncJob.claim_next()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+            self.run_job(job)
+        self.stdout.write(self.style.SUCCESS('Sync job queue drained.'))
+
+    def run_job(self, job):
+        self.stdout.write(f"Running {job} ({job.total_rows} rows, attempt {job.attempts})")
+        progress = dict(job.progress)
+        # Only this run's updates: a run reclaimed as stale must not overwrite a later one
+        this_run = SyncJob.objects.filter(pk=job.pk, status='running', started_at=job.started_at)
+
+        def on_progress(table, synced, total):
+            progress.setdefault(table, {'total': total, 'synced': 0})['synced'] = synced
+            this_run.update(
+                progress=progress,
+                processed_rows=sum(entry['synced'] for entry in progress.values()),
+                updated_at=timezone.now(),
+            )
+
+        try:
+            # No outer transaction: each chunk commits on its own so progress is visible
+            synced_ids = PushEndpoint().ingest(job.payload, progress=on_progress, device_id=job.device_id)
+        except Exception as e:
+            traceback.print_exc()
+            this_run.update(
+                status='failed', error=str(e), finished_at=timezone.now(), updated_at=timezone.now()
+            )
+            self.stdout.write(self.style.ERROR(f"{job.id} failed: {e}"))
+            return
+
+        this_run.update(
+            status='completed',
+            synced_ids=synced_ids,
+            payload={},
+            finished_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        self.stdout.write(self.style.SUCCESS(f"{job.id} completed"))
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import ChangeLog, PushReceipt, SyncLedger
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes ChangeLog entries older than SYNC_CHANGELOG_RETENTION_DAYS, push ledger rows not '
+        'refreshed for SYNC_LEDGER_RETENTION_DAYS and Idempotency-Key receipts past SYNC_IDEMPOTENCY_TTL_HOURS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Override the change log retention period')
+        parser.add_argument('--ledger-days', type=int, default=None, help='Override the push ledger retention period')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+
+        days = options['days'] or settings.SYNC_CHANGELOG_RETENTION_DAYS
+        deleted, _ = ChangeLog.objects.filter(created_at__lt=now - timedelta(days=days)).delete()
+        # Devices whose since_seq predates what is left get a "reset" and do a full pull
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} change log entries older than {days} days.'))
+
+        ledger_days = options['ledger_days'] or settings.SYNC_LEDGER_RETENTION_DAYS
+        deleted, _ = SyncLedger.objects.filter(updated_at__lt=now - timedelta(days=ledger_days)).delete()
+        # A pruned row re-sent later is just written again
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} push ledger rows older than {ledger_days} days.'))
+
+        # save_push_receipt() only clears the pushing device's own receipts
+        ttl_hours = settings.SYNC_IDEMPOTENCY_TTL_HOURS
+        deleted, _ = PushReceipt.objects.filter(created_at__lt=now - timedelta(hours=ttl_hours)).delete()
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} push receipts older than {ttl_hours} hours.'))
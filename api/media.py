@@ -0,0 +1,249 @@
+"""
+Content-addressed store for the images clients send inline.
+
+Product, ProductImage, Supplier and User image columns are documented as
+"URL or Base64". Base64 values are decoded, written once to the media
+storage under their SHA-256 (images/ab/abcd....png), and the column keeps
+only the URL. Identical images share one file, and a URL never changes
+content, so it is served with a one-year immutable Cache-Control.
+
+Models opt in with MEDIA_FIELDS = ('image',). Values are moved out on
+Model.save() (a pre_save receiver, see connect_media), on sync pushes
+(externalize_rows, bulk upserts skip signals) and for existing rows by
+manage.py extract_media.
+
+The storage is STORAGES['media']: local disk under MEDIA_ROOT by default,
+or any Django storage backend such as django-storages' S3Storage. URLs
+point at MEDIA_PUBLIC_BASE_URL (a CDN or bucket) when set, otherwise at the
+media endpoint of this API (GET media/<name>).
+
+Thumbnails (GET media/thumbs/<variant>/<name>) are fixed-size WebP, or
+JPEG when Pillow lacks WebP, made on first request and stored next to the
+originals as thumbs/<variant>/ab/<hash>.<ext>. Optional: without Pillow the
+endpoint serves the original image.
+"""
+import base64
+import binascii
+import hashlib
+import re
+
+from django.conf import settings
+from django.db.models.signals import pre_save
+
+try:
+    from PIL import Image, ImageOps, features as pil_features
+except ImportError:
+    Image = None
+
+# Shorter values are URLs, paths or empty placeholders, never an image worth moving
+INLINE_MIN_LENGTH = 128
+
+MEDIA_DIR = 'images'
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+    'bmp': 'image/bmp',
+    'ico': 'image/x-icon',
+    'svg': 'image/svg+xml',
+}
+EXTENSIONS = {content_type: ext for ext, content_type in CONTENT_TYPES.items()}
+EXTENSIONS['image/jpg'] = 'jpg'
+
+_DATA_URL = re.compile(r'^data:(?P<type>[\w.+-]+/[\w.+-]+)?(?:;[\w.+-]+=[\w.+-]+)*;base64,', re.IGNORECASE)
+_BARE_BASE64 = re.compile(r'^[A-Za-z0-9+/\s]+={0,2}\s*$')
+MEDIA_NAME = re.compile(rf'^{MEDIA_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{64}}\.(?:{"|".join(CONTENT_TYPES)})$')
+
+# Longest side in pixels of each thumbnail variant
+THUMBNAIL_SIZES = {
+    'cart': 96,
+    'grid': 320,
+    'detail': 800,
+}
+THUMBNAIL_DIR = 'thumbs'
+# Vector and icon sources are served as they are
+THUMBNAIL_SOURCES = ('png', 'jpg', 'gif', 'webp', 'bmp')
+
+
+def sniff_extension(data):
+    """File extension from the image's magic bytes, or None."""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    if data.startswith(b'BM'):
+        return 'bmp'
+    if data.startswith(b'\x00\x00\x01\x00'):
+        return 'ico'
+    if data.lstrip()[:5] in (b'<?xml', b'<svg ') and b'<svg' in data[:1024]:
+        return 'svg'
+    return None
+
+
+def decode_inline_image(value):
+    """(bytes, extension) of a data: URL or bare Base64 image, or None for anything else."""
+    if not isinstance(value, str) or len(value) < INLINE_MIN_LENGTH:
+        return None
+    match = _DATA_URL.match(value)
+    if match:
+        payload = value[match.end():]
+    elif _BARE_BASE64.match(value[:INLINE_MIN_LENGTH]):
+        payload = value
+    else:
+        return None
+    try:
+        data = base64.b64decode(''.join(payload.split()))
+    except (binascii.Error, ValueError):
+        return None
+
+    ext = sniff_extension(data)
+    if ext is None and match:
+        ext = EXTENSIONS.get((match.group('type') or '').lower())
+    if ext is None:
+        return None  # Bare Base64 that isn't a known image: leave the value alone
+    return data, ext
+
+
+def get_media_storage():
+    from django.core.files.storage import storages
+    return storages['media']
+
+
+def media_url(name):
+    base = getattr(settings, 'MEDIA_PUBLIC_BASE_URL', '')
+    if base:
+        return f"{base.rstrip('/')}/{name}"
+    from django.urls import reverse
+    return reverse('media-file', args=[name])
+
+
+def save_once(name, data):
+    """Store `data` as `name` unless it is already there (names are content-derived)."""
+    from django.core.files.base import ContentFile
+
+    storage = get_media_storage()
+    if storage.exists(name):
+        return
+    saved = storage.save(name, ContentFile(data))
+    if saved != name:
+        # Another writer stored the same content meanwhile; drop our renamed copy
+        storage.delete(saved)
+    print(f"[MEDIA] Stored {name} ({len(data)} bytes)")
+
+
+def store_image(data, ext):
+    """Write `data` once under its content hash and return its URL."""
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"{MEDIA_DIR}/{digest[:2]}/{digest}.{ext}"
+    save_once(name, data)
+    return media_url(name)
+
+
+def externalize(value):
+    """The URL to keep instead of an inline image, or `value` unchanged."""
+    decoded = decode_inline_image(value)
+    if decoded is None:
+        return value
+    return store_image(*decoded)
+
+
+def externalize_rows(model, rows):
+    """Replace inline images in the MEDIA_FIELDS of prepared (obj_id, cleaned_data) push rows."""
+    fields = getattr(model, 'MEDIA_FIELDS', ())
+    if not fields:
+        return
+    for _, cleaned_data in rows:
+        for field in fields:
+            if field in cleaned_data:
+                cleaned_data[field] = externalize(cleaned_data[field])
+
+
+def externalize_instance(sender, instance, update_fields=None, **kwargs):
+    for field in sender.MEDIA_FIELDS:
+        if update_fields is None or field in update_fields:
+            setattr(instance, field, externalize(getattr(instance, field)))
+
+
+def connect_media(models):
+    for model in models:
+        if getattr(model, 'MEDIA_FIELDS', None):
+            pre_save.connect(externalize_instance, sender=model, weak=False, dispatch_uid=f"media:{model.__name__}")
+
+
+# ─────────────────────────────────────────────────────────────
+# THUMBNAILS
+# ─────────────────────────────────────────────────────────────
+
+def media_name(url):
+    """The media store name behind one of our image URLs, or None (external URL, inline data)."""
+    if not isinstance(url, str):
+        return None
+    name = url.rsplit('?', 1)[0]
+    name = name[name.find(f'{MEDIA_DIR}/'):] if f'{MEDIA_DIR}/' in name else ''
+    return name if MEDIA_NAME.match(name) and url == media_url(name) else None
+
+
+def thumbnail_url(url, variant):
+    """URL of the `variant` thumbnail of an image column value; other values come back unchanged."""
+    name = media_name(url)
+    if name is None:
+        return url
+    from django.urls import reverse
+    return reverse('media-thumbnail', args=[variant, name])
+
+
+def thumbnail_format():
+    return 'webp' if Image is not None and pil_features.check('webp') else 'jpg'
+
+
+def get_thumbnail(variant, name):
+    """
+    (storage name, content type) of the `variant` thumbnail of the stored
+    image `name`, rendering it on first use. Falls back to the original when
+    Pillow is missing, the source isn't a raster image or can't be decoded.
+    """
+    source_ext = name.rsplit('.', 1)[1]
+    if Image is None or source_ext not in THUMBNAIL_SOURCES:
+        return name, CONTENT_TYPES[source_ext]
+
+    ext = thumbnail_format()
+    digest = name.rsplit('/', 1)[1].split('.')[0]
+    thumb = f"{THUMBNAIL_DIR}/{variant}/{digest[:2]}/{digest}.{ext}"
+    storage = get_media_storage()
+    if storage.exists(thumb):
+        return thumb, CONTENT_TYPES[ext]
+    try:
+        data = render_thumbnail(storage, name, THUMBNAIL_SIZES[variant], ext)
+    except Exception as e:
+        print(f"[MEDIA] Could not make {variant} thumbnail of {name}: {e}")
+        return name, CONTENT_TYPES[source_ext]
+    save_once(thumb, data)
+    return thumb, CONTENT_TYPES[ext]
+
+
+def render_thumbnail(storage, name, size, ext):
+    import io
+
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image.seek(0)  # First frame of animations
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    out = io.BytesIO()
+    if ext == 'webp':
+        image.convert('RGBA' if has_alpha else 'RGB').save(out, 'WEBP', quality=80, method=4)
+    else:
+        if has_alpha:
+            # JPEG has no alpha: flatten onto white like the storefront background
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image.convert('RGBA'), mask=image.convert('RGBA').split()[-1])
+            image = background
+        image.convert('RGB').save(out, 'JPEG', quality=82, optimize=True, progressive=True)
+    return out.getvalue()
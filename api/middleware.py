@@ -0,0 +1,100 @@
+import io
+import zlib
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def decompress(raw, encoding, limit):
+    """Decode a gzip/zstd request body, refusing to inflate past `limit` bytes."""
+    if encoding == 'gzip':
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = decoder.decompress(raw, limit + 1)
+    else:
+        data = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(raw)).read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(f"Decompressed body exceeds {limit} bytes")
+    return data
+
+
+def compress(data, encoding):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6, wbits=16 + zlib.MAX_WBITS)
+
+
+def pick_encoding(accept_encoding):
+    """Best response encoding the client accepts: zstd (if installed), then gzip."""
+    offered = set()
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0'):
+            continue
+        offered.add(name.strip().lower())
+    if 'zstd' in offered and zstandard is not None:
+        return 'zstd'
+    if 'gzip' in offered:
+        return 'gzip'
+    return None
+
+
+class SyncCompressionMiddleware:
+    """
+    Content-Encoding support for the sync endpoints (any path containing /sync/).
+
+    Requests: gzip or zstd bodies (Content-Encoding header) are inflated before
+    DRF parses them, with SYNC_MAX_DECOMPRESSED_BYTES as a zip-bomb guard.
+    Responses: bodies of at least SYNC_COMPRESS_MIN_BYTES are compressed with
+    the best encoding listed in Accept-Encoding. Streaming responses (snapshot
+    downloads, already compressed) are left alone.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if '/sync/' not in request.path:
+            return self.get_response(request)
+
+        encoding = request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if encoding and encoding != 'identity':
+            if encoding not in ('gzip', 'zstd') or (encoding == 'zstd' and zstandard is None):
+                return JsonResponse(
+                    {"status": "error", "message": f"Unsupported Content-Encoding: {encoding}"}, status=415
+                )
+            limit = getattr(settings, 'SYNC_MAX_DECOMPRESSED_BYTES', 256 * 1024 * 1024)
+            try:
+                # Read the raw stream (not request.body) so the compressed size isn't
+                # checked against DATA_UPLOAD_MAX_MEMORY_SIZE, matching plain JSON pushes
+                body = decompress(request.read(), encoding, limit)
+            except Exception as e:
+                return JsonResponse({"status": "error", "message": f"Could not decode {encoding} body: {e}"}, status=400)
+            print(f"[SYNC] Inflated {encoding} request body to {len(body)} bytes")
+            request._stream = io.BytesIO(body)
+            request._read_started = False
+            request.META['CONTENT_LENGTH'] = str(len(body))
+            del request.META['HTTP_CONTENT_ENCODING']
+
+        response = self.get_response(request)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < getattr(settings, 'SYNC_COMPRESS_MIN_BYTES', 1024):
+            return response
+        response_encoding = pick_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if response_encoding is None:
+            return response
+
+        compressed = compress(response.content, response_encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = response_encoding
+        return response
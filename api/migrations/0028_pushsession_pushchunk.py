@@ -0,0 +1,41 @@
+import api.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_syncjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PushSession',
+            fields=[
+                ('id', models.CharField(default=api.models.generate_pushsession_id, max_length=50, primary_key=True, serialize=False)),
+                ('store_id', models.CharField(blank=True, default='', max_length=50)),
+                ('device_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('completed', 'Completed')], default='open', max_length=20)),
+                ('total_chunks', models.IntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PushChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.IntegerField()),
+                ('row_count', models.IntegerField(default=0)),
+                ('synced_ids', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='api.pushsession')),
+            ],
+            options={
+                'ordering': ['seq'],
+                'unique_together': {('session', 'seq')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_pushsession_pushchunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(max_length=255)),
+                ('table_name', models.CharField(max_length=100)),
+                ('row_id', models.CharField(max_length=255)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('device_id', 'table_name', 'row_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PushReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(blank=True, default='', max_length=255)),
+                ('key', models.CharField(max_length=255)),
+                ('response', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('device_id', 'key')},
+            },
+        ),
+    ]
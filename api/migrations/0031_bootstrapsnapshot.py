@@ -0,0 +1,29 @@
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BootstrapSnapshot',
+            fields=[
+                ('id', models.CharField(default=api.models.generate_snapshot_id, max_length=50, primary_key=True, serialize=False)),
+                ('store_id', models.CharField(max_length=50)),
+                ('change_seq', models.BigIntegerField(default=0)),
+                ('file_path', models.CharField(max_length=500)),
+                ('compression', models.CharField(default='gzip', max_length=10)),
+                ('size_bytes', models.BigIntegerField(default=0)),
+                ('row_count', models.IntegerField(default=0)),
+                ('build_seconds', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['store_id', 'created_at'], name='snapshot_store_created_idx')],
+            },
+        ),
+    ]
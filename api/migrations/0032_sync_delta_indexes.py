@@ -0,0 +1,141 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0031_bootstrapsnapshot'),
+    ]
+
+    operations = [
+        # Declared on the model long ago but never migrated; the pull has been
+        # failing on this table and the index below needs the column
+        migrations.AddField(
+            model_name='onlineorderitem',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='onlineorderitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='store',
+            index=models.Index(fields=['updated_at', 'id'], name='store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['updated_at', 'id'], name='user_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='account_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='category_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expensecategory',
+            index=models.Index(fields=['updated_at', 'id'], name='expensecategor_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taxslab',
+            index=models.Index(fields=['updated_at', 'id'], name='taxslab_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='customer_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentterm',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='paymentterm_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='supplier_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='suppliercustomfield',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='suppliercustom_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='product_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quotation',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='quotation_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='sale_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='purchase_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='suppliertransaction',
+            index=models.Index(fields=['store', 'created_at', 'id'], name='suppliertransa_store_cre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplierdocument',
+            index=models.Index(fields=['store', 'uploaded_at', 'id'], name='supplierdocume_store_upl_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='transaction_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocklog',
+            index=models.Index(fields=['store', 'created_at', 'id'], name='stocklog_store_cre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receiving',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='receiving_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='giftcard',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='giftcard_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryzone',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='deliveryzone_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userpermission',
+            index=models.Index(fields=['updated_at', 'id'], name='userpermission_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='invoice_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cheque',
+            index=models.Index(fields=['store', 'created_at', 'id'], name='cheque_store_cre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='attendance_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leave',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='leave_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='employee_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='onlineorder',
+            index=models.Index(fields=['updated_at', 'id'], name='onlineorder_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='onlineorderitem',
+            index=models.Index(fields=['updated_at', 'id'], name='onlineorderite_upd_idx'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+# (model, parent FK, parent model) for the children that get a copy of the parent's store
+CHILDREN = [
+    ('SalePayment', 'sale', 'Sale'),
+    ('SupplierCustomFieldValue', 'supplier', 'Supplier'),
+    ('LoyaltyPoint', 'sale', 'Sale'),
+    ('Commission', 'sale', 'Sale'),
+]
+
+
+def backfill_child_stores(apps, schema_editor):
+    for model_name, parent_name, parent_model_name in CHILDREN:
+        Model = apps.get_model('api', model_name)
+        Parent = apps.get_model('api', parent_model_name)
+        parent_store = Parent.objects.filter(pk=OuterRef(f'{parent_name}_id')).values('store_id')[:1]
+        Model.objects.filter(store__isnull=True).update(store_id=Subquery(parent_store))
+
+    # The new updated_at columns start at their creation time rather than the
+    # migration time, so devices don't re-download the whole history once
+    for model_name in ('LoyaltyPoint', 'Commission'):
+        apps.get_model('api', model_name).objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0032_sync_delta_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salepayment',
+            name='store',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.store'),
+        ),
+        migrations.AddField(
+            model_name='suppliercustomfieldvalue',
+            name='store',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.store'),
+        ),
+        migrations.AddField(
+            model_name='loyaltypoint',
+            name='store',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.store'),
+        ),
+        migrations.AddField(
+            model_name='loyaltypoint',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='commission',
+            name='store',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.store'),
+        ),
+        migrations.AddField(
+            model_name='commission',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_child_stores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='salepayment',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='salepayment_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workorder',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='workorder_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='delivery_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='suppliercustomfieldvalue',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='suppliercfv_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loyaltypoint',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='loyaltypoint_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commission',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='commission_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receivingitem',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='receivingitem_store_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoiceitem',
+            index=models.Index(fields=['store', 'updated_at', 'id'], name='invoiceitem_store_upd_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_child_store_denormalization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(max_length=255)),
+                ('table_name', models.CharField(max_length=100)),
+                ('store_id', models.CharField(blank=True, default='', max_length=50)),
+                ('watermark', models.DateTimeField(blank=True, null=True)),
+                ('change_seq', models.BigIntegerField(blank=True, null=True)),
+                ('last_row_count', models.IntegerField(default=0)),
+                ('last_duration_ms', models.FloatField(blank=True, null=True)),
+                ('last_pulled_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['store_id', 'device_id'], name='devicesync_store_device_idx')],
+                'unique_together': {('device_id', 'table_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# PostgreSQL only, and kept out of Product.Meta.indexes so other databases
+# (SQLite in local dev) never see them. The expressions must match api.search.
+def index_definitions():
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+    from django.contrib.postgres.search import SearchVector
+
+    return [
+        GinIndex(SearchVector('name', 'sku', 'brand', 'description', config='simple'), name='product_search_fts_idx'),
+        GinIndex(OpClass('name', name='gin_trgm_ops'), name='product_name_trgm_idx'),
+    ]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Product = apps.get_model('api', 'Product')
+    for index in index_definitions():
+        schema_editor.add_index(Product, index)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Product = apps.get_model('api', 'Product')
+    for index in index_definitions():
+        schema_editor.remove_index(Product, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0034_devicesyncstate'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
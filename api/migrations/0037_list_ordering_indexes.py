@@ -0,0 +1,49 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0036_product_lookup_indexes'),
+    ]
+
+    operations = [
+        # Default order of the paginated list endpoints, and the ?ordering=
+        # fields they open up (see api.filters.indexed_ordering_fields)
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['store', 'date'], name='sale_store_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['store', 'date'], name='invoice_store_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['store', 'name'], name='customer_store_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['store', 'name'], name='product_store_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='onlineorder',
+            index=models.Index(fields=['created_at'], name='onlineorder_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at'], name='notification_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salereturn',
+            index=models.Index(fields=['created_at'], name='salereturn_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_at'], name='review_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['created_at'], name='feedback_created_idx'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0037_list_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pushsession',
+            name='id_mapping',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
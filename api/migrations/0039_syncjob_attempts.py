@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0038_pushsession_id_mapping'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncjob',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0039_syncjob_attempts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='syncledger',
+            index=models.Index(fields=['updated_at'], name='syncledger_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pushreceipt',
+            index=models.Index(fields=['created_at'], name='pushreceipt_created_idx'),
+        ),
+    ]
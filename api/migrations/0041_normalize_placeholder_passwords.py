@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def normalize_placeholder_passwords(apps, schema_editor):
+    # Stored placeholders were salted per call; rewrite them to the one fixed
+    # placeholder hash so the push path recognises them by string comparison.
+    # One check_password per hashed user, once.
+    from django.contrib.auth.hashers import check_password
+    from api.sync import HASHED_PASSWORD_PREFIXES, PLACEHOLDER_PASSWORD, placeholder_password_hash
+
+    User = apps.get_model('api', 'User')
+    placeholder = placeholder_password_hash()
+    matches = []
+    for pk, encoded in User.objects.exclude(password=placeholder).values_list('pk', 'password').iterator():
+        if not encoded or not encoded.startswith(HASHED_PASSWORD_PREFIXES):
+            continue
+        try:
+            if check_password(PLACEHOLDER_PASSWORD, encoded):
+                matches.append(pk)
+        except ValueError:  # Unknown or malformed hash
+            continue
+    if matches:
+        User.objects.filter(pk__in=matches).update(password=placeholder)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0040_sync_ledger_retention_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_placeholder_passwords, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,7 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from .sync import batch_side_effect, defer_side_effects
 
 def generate_id(prefix='id'):
     """Generate a random ID similar to the frontend format: prefix-randomString"""
@@ -58,6 +59,22 @@ def generate_clientfeat_id(): return generate_id('cf')
 def generate_perm_id(): return generate_id('perm')
 
 
+class ParentStoreMixin:
+    """
+    Child rows that carry a denormalized copy of their parent's store, so the
+    sync pull can filter them by (store, updated_at) without a join.
+    STORE_PARENT names the FK whose store is copied when none was given.
+    The bulk push path bypasses save() and fills store_id itself.
+    """
+    STORE_PARENT = None
+
+    def save(self, *args, **kwargs):
+        if self.store_id is None and self.STORE_PARENT:
+            parent = getattr(self, self.STORE_PARENT)
+            if parent is not None:
+                self.store_id = parent.store_id
+        super().save(*args, **kwargs)
+
 
 class Store(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_store_id)
@@ -68,10 +85,17 @@ class Store(models.Model):
     device_id = models.CharField(max_length=50, null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='store_upd_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.branch})" if self.branch else self.name
 
 class User(AbstractUser):
+    MEDIA_FIELDS = ('avatar',)  # Inline images moved to the media store (api.media)
+
     id = models.CharField(max_length=50, primary_key=True, default=generate_user_id)
     role = models.CharField(max_length=50, choices=[
         ('admin', 'Admin'), 
@@ -107,6 +131,11 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username'] # username is still required by AbstractUser unless we override more
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='user_upd_idx'),
+        ]
+
     def __str__(self):
         return f"{self.email} ({self.role})"
     
@@ -120,6 +149,11 @@ class UserPermission(models.Model):
     permissions = models.JSONField(default=dict)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='userpermission_upd_idx'),
+        ]
+
     def __str__(self):
         return f"Permissions for {self.user.email}"
 
@@ -133,6 +167,11 @@ class Account(models.Model):
     is_deleted = models.BooleanField(default=False)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='account_store_upd_idx'),
+        ]
+
 class Category(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_cat_id)
     name = models.CharField(max_length=255)
@@ -141,10 +180,17 @@ class Category(models.Model):
     device_id = models.CharField(max_length=50, null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='category_store_upd_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 class Product(models.Model):
+    MEDIA_FIELDS = ('image',)  # Inline images moved to the media store (api.media)
+
     id = models.CharField(max_length=50, primary_key=True, default=generate_prod_id)
     name = models.CharField(max_length=255)
     description = models.TextField(null=True, blank=True)
@@ -173,6 +219,15 @@ class Product(models.Model):
     device_id = models.CharField(max_length=50, null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='product_store_upd_idx'),
+            models.Index(fields=['store', 'name'], name='product_store_name_idx'), # Catalog lists by name
+            # Scanner lookups (products/lookup); code first so store-less lookups use them too
+            models.Index(fields=['barcode', 'store'], name='product_barcode_store_idx'),
+            models.Index(fields=['sku', 'store'], name='product_sku_store_idx'),
+        ]
+
 class Customer(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_cust_id)
     name = models.CharField(max_length=255)
@@ -190,11 +245,19 @@ class Customer(models.Model):
     is_deleted = models.BooleanField(default=False)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='customer_store_upd_idx'),
+            models.Index(fields=['store', 'name'], name='customer_store_name_idx'), # Customer lists by name
+        ]
+
 @receiver(post_save, sender=Customer)
 def sync_customer_to_user(sender, instance, created, **kwargs):
     """
     Automatically create a User record (login) for every Customer created in the ERP.
     """
+    if defer_side_effects(sender, [instance.pk]):
+        return
     if instance.email:
         # Check if user already exists
         user = User.objects.filter(email=instance.email).first()
@@ -220,6 +283,63 @@ def sync_customer_to_user(sender, instance, created, **kwargs):
             )
             print(f"Auto-created User for customer: {instance.email} with default pass: {default_pass}")
 
+@batch_side_effect(Customer)
+def sync_customers_to_users(customer_ids):
+    """
+    Set-based sync_customer_to_user for a push batch: one lookup of the
+    emails that already have a login, then one bulk_create for the rest.
+    """
+    from django.db import IntegrityError, transaction
+    from .sync import hash_passwords, record_changes
+    import random
+    import string
+
+    customers = {}
+    for email, name in Customer.objects.filter(pk__in=customer_ids).exclude(email__isnull=True).exclude(email='').values_list('email', 'name'):
+        customers.setdefault(email, name)  # First customer wins when several share an email
+    if not customers:
+        return
+    existing = set(User.objects.filter(email__in=list(customers)).values_list('email', flat=True))
+
+    new_users = []
+    for email, name in customers.items():
+        if email in existing:
+            continue
+        default_pass = 'Welcome' + ''.join(random.choices(string.digits, k=4)) + '!'
+        new_users.append(User(
+            email=email,
+            username=email.split('@')[0],
+            first_name=name.split(' ')[0],
+            last_name=' '.join(name.split(' ')[1:]) if ' ' in name else '',
+            role='user',
+            is_active=True,
+            is_verified=True,
+            password=default_pass
+        ))
+        print(f"Auto-created User for customer: {email} with default pass: {default_pass}")
+    if not new_users:
+        return
+    for user, encoded in zip(new_users, hash_passwords([(user.password, None) for user in new_users])):
+        user.password = encoded
+
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(new_users)
+        created = new_users
+    except IntegrityError as e:
+        # e.g. two emails with the same local part -> duplicate username; keep the ones that fit
+        print(f"[SYNC] Bulk user provisioning failed, retrying one by one: {e}")
+        created = []
+        for user in new_users:
+            try:
+                with transaction.atomic():
+                    user.save(force_insert=True)
+                created.append(user)
+            except IntegrityError as user_err:
+                print(f"[SYNC] Could not create user for customer {user.email}: {user_err}")
+    # bulk_create skips the change log receivers
+    record_changes(User, [user.pk for user in created])
+
 def generate_gc_id(): return generate_id('gc')
 def generate_wo_id(): return generate_id('wo')
 def generate_del_id(): return generate_id('del')
@@ -254,14 +374,28 @@ class Sale(models.Model):
     is_deleted = models.BooleanField(default=False)
     updated_at = models.DateTimeField(auto_now=True)
 
-class SalePayment(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='sale_store_upd_idx'),
+            models.Index(fields=['store', 'date'], name='sale_store_date_idx'), # Sales lists
+        ]
+
+class SalePayment(ParentStoreMixin, models.Model):
+    STORE_PARENT = 'sale'
+
     id = models.CharField(max_length=50, primary_key=True, default=generate_sp_id)
     sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='payments')
     payment_mode = models.CharField(max_length=50) # cash, card, upi, store_credit
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     account = models.ForeignKey(Account, on_delete=models.CASCADE)
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, null=True, blank=True) # Copy of sale.store
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='salepayment_store_upd_idx'),
+        ]
+
 class GiftCard(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_gc_id)
     card_number = models.CharField(max_length=100, unique=True)
@@ -272,6 +406,11 @@ class GiftCard(models.Model):
     store = models.ForeignKey(Store, on_delete=models.CASCADE)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='giftcard_store_upd_idx'),
+        ]
+
 class WorkOrder(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_wo_id)
     sale = models.OneToOneField(Sale, on_delete=models.CASCADE, related_name='work_order')
@@ -284,6 +423,11 @@ class WorkOrder(models.Model):
     store = models.ForeignKey(Store, on_delete=models.CASCADE)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='workorder_store_upd_idx'),
+        ]
+
 class Delivery(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_del_id)
     sale = models.OneToOneField(Sale, on_delete=models.CASCADE, related_name='delivery')
@@ -316,7 +460,14 @@ class Delivery(models.Model):
     notes = models.TextField(blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='delivery_store_upd_idx'),
+        ]
+
 class Supplier(models.Model):
+    MEDIA_FIELDS = ('logo',)  # Inline images moved to the media store (api.media)
+
     id = models.CharField(max_length=50, primary_key=True, default=generate_sup_id)
     company_name = models.CharField(max_length=255)
     first_name = models.CharField(max_length=255, null=True, blank=True)
@@ -359,6 +510,11 @@ class Supplier(models.Model):
     device_id = models.CharField(max_length=50, null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='supplier_store_upd_idx'),
+        ]
+
     def __str__(self):
         return self.company_name
 
@@ -375,13 +531,26 @@ class SupplierCustomField(models.Model):
     store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='supplier_custom_fields')
     updated_at = models.DateTimeField(auto_now=True)
 
-class SupplierCustomFieldValue(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='suppliercustom_store_upd_idx'),
+        ]
+
+class SupplierCustomFieldValue(ParentStoreMixin, models.Model):
+    STORE_PARENT = 'supplier'
+
     id = models.CharField(max_length=50, primary_key=True, default=generate_scfv_id)
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='custom_values')
     field = models.ForeignKey(SupplierCustomField, on_delete=models.CASCADE)
     value = models.TextField(null=True, blank=True)
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, null=True, blank=True) # Copy of supplier.store
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='suppliercfv_store_upd_idx'),
+        ]
+
 class PaymentTerm(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_pt_id)
     name = models.CharField(max_length=100)
@@ -389,6 +558,11 @@ class PaymentTerm(models.Model):
     store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='payment_terms')
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='paymentterm_store_upd_idx'),
+        ]
+
 class DeliveryZone(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_del_id)
     name = models.CharField(max_length=255)
@@ -397,6 +571,11 @@ class DeliveryZone(models.Model):
     store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='delivery_zones')
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='deliveryzone_store_upd_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} (${self.fee})"
 
@@ -409,6 +588,11 @@ class SupplierDocument(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     store = models.ForeignKey(Store, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'uploaded_at', 'id'], name='supplierdocume_store_upl_idx'),
+        ]
+
 class SupplierTransaction(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_stx_id)
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='transactions')
@@ -424,6 +608,11 @@ class SupplierTransaction(models.Model):
     device_id = models.CharField(max_length=50, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'created_at', 'id'], name='suppliertransa_store_cre_idx'),
+        ]
+
 
 class Purchase(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_pur_id)
@@ -439,6 +628,11 @@ class Purchase(models.Model):
     is_deleted = models.BooleanField(default=False)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='purchase_store_upd_idx'),
+        ]
+
 class StockLog(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_log_id)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -450,6 +644,11 @@ class StockLog(models.Model):
     device_id = models.CharField(max_length=50, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'created_at', 'id'], name='stocklog_store_cre_idx'),
+        ]
+
 class Quotation(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_qtn_id)
     quotation_number = models.CharField(max_length=100, unique=True)
@@ -466,6 +665,11 @@ class Quotation(models.Model):
     device_id = models.CharField(max_length=50, null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='quotation_store_upd_idx'),
+        ]
+
 class Transaction(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_trans_id)
     type = models.CharField(max_length=50, choices=[
@@ -485,18 +689,33 @@ class Transaction(models.Model):
     is_deleted = models.BooleanField(default=False)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='transaction_store_upd_idx'),
+        ]
+
 class ExpenseCategory(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_exp_id)
     name = models.CharField(max_length=255)
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='subcategories')
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='expensecategor_upd_idx'),
+        ]
+
 class TaxSlab(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_tax_id)
     name = models.CharField(max_length=255)
     percentage = models.DecimalField(max_digits=5, decimal_places=2)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='taxslab_upd_idx'),
+        ]
+
 class StockTransfer(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_st_id)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -519,22 +738,40 @@ class PurchaseOrder(models.Model):
     device_id = models.CharField(max_length=50, null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-class LoyaltyPoint(models.Model):
+class LoyaltyPoint(ParentStoreMixin, models.Model):
+    STORE_PARENT = 'sale'
+
     id = models.CharField(max_length=50, primary_key=True, default=generate_lp_id)
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True, related_name='loyalty_points')
     points = models.IntegerField()
     reason = models.CharField(max_length=255, null=True, blank=True)
     sale = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, blank=True)
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, null=True, blank=True) # Copy of sale.store
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='loyaltypoint_store_upd_idx'),
+        ]
+
+class Commission(ParentStoreMixin, models.Model):
+    STORE_PARENT = 'sale'
 
-class Commission(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_com_id)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='commissions')
     sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='commissions')
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     percentage = models.DecimalField(max_digits=5, decimal_places=2)
     status = models.CharField(max_length=50, choices=[('pending', 'Pending'), ('paid', 'Paid')], default='pending')
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, null=True, blank=True) # Copy of sale.store
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='commission_store_upd_idx'),
+        ]
 
 
 def generate_emp_id(): return generate_id('emp')
@@ -558,6 +795,11 @@ class Employee(models.Model):
     is_deleted = models.BooleanField(default=False)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='employee_store_upd_idx'),
+        ]
+
 class Attendance(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_att_id)
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance')
@@ -571,6 +813,11 @@ class Attendance(models.Model):
     is_deleted = models.BooleanField(default=False)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='attendance_store_upd_idx'),
+        ]
+
 class Leave(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_leave_id)
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='leaves')
@@ -584,6 +831,11 @@ class Leave(models.Model):
     is_deleted = models.BooleanField(default=False)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='leave_store_upd_idx'),
+        ]
+
 class Payroll(models.Model):
     id = models.CharField(max_length=50, primary_key=True, default=generate_payroll_id)
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='payrolls')
@@ -654,6 +906,11 @@ class Receiving(models.Model):
     completed_at     = models.DateTimeField(null=True, blank=True)
     updated_at       = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='receiving_store_upd_idx'),
+        ]
+
     def __str__(self):
         supplier_name = self.supplier.company_name if self.supplier else "No Supplier"
         return f"{self.receiving_number} — {supplier_name}"
@@ -678,6 +935,11 @@ class ReceivingItem(models.Model):
     store         = models.ForeignKey(Store, on_delete=models.CASCADE)
     updated_at    = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='receivingitem_store_upd_idx'),
+        ]
+
     def __str__(self):
         return f"{self.product_name} × {self.quantity}"
 
@@ -725,6 +987,12 @@ class Invoice(models.Model):
     device_id = models.CharField(max_length=50, null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='invoice_store_upd_idx'),
+            models.Index(fields=['store', 'date'], name='invoice_store_date_idx'), # Invoice lists
+        ]
+
     def __str__(self):
         party = self.customer.name if self.type == 'customer' and self.customer else (self.supplier.company_name if self.supplier else 'Unknown')
         return f"{self.invoice_number} — {party} ({self.total_amount})"
@@ -743,6 +1011,11 @@ class InvoiceItem(models.Model):
     store = models.ForeignKey(Store, on_delete=models.CASCADE)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'updated_at', 'id'], name='invoiceitem_store_upd_idx'),
+        ]
+
     def __str__(self):
         return f"{self.product_name} x {self.quantity} (Inv: {self.invoice.invoice_number})"
 
@@ -769,6 +1042,11 @@ class Cheque(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'created_at', 'id'], name='cheque_store_cre_idx'),
+        ]
+
     def __str__(self):
         return f"Cheque {self.cheque_number} - {self.party_name} ({self.status})"
 
@@ -787,10 +1065,17 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='review_created_idx'),
+        ]
+
     def __str__(self):
         return f"Review by {self.user_name} ({self.rating} stars)"
 
 class ProductImage(models.Model):
+    MEDIA_FIELDS = ('image',)  # Inline images moved to the media store (api.media)
+
     id = models.CharField(max_length=50, primary_key=True, default=generate_pimg_id)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.TextField(null=True, blank=True) # URL or Base64
@@ -833,6 +1118,11 @@ class Feedback(models.Model):
     rating = models.IntegerField(default=5) # For general satisfaction
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='feedback_created_idx'),
+        ]
+
     def __str__(self):
         return f"Feedback from {self.name}: {self.subject}"
 
@@ -848,6 +1138,11 @@ class SaleReturn(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='salereturn_created_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         is_new = self._state.adding
         super().save(*args, **kwargs)
@@ -865,11 +1160,18 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='notification_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.type.upper()}: {self.title}"
 
 @receiver(post_save, sender=Product)
 def check_stock_level(sender, instance, **kwargs):
+    if defer_side_effects(sender, [instance.pk]):
+        return
     if instance.quantity <= instance.min_stock:
         # Check if notification already exists to avoid spam
         title = f"Low Stock: {instance.name}"
@@ -880,6 +1182,33 @@ def check_stock_level(sender, instance, **kwargs):
                 type='warning'
             )
 
+@batch_side_effect(Product)
+def check_stock_levels(product_ids):
+    """
+    Set-based check_stock_level for a push batch: one query for the products
+    at or below min_stock, one for their open alerts, one bulk_create.
+    """
+    low = list(
+        Product.objects.filter(pk__in=product_ids, quantity__lte=models.F('min_stock'))
+        .values_list('name', 'quantity', 'min_stock')
+    )
+    if not low:
+        return
+    titles = {f"Low Stock: {name}" for name, _, _ in low}
+    open_titles = set(Notification.objects.filter(title__in=titles, is_read=False).values_list('title', flat=True))
+
+    alerts = {}
+    for name, quantity, min_stock in low:
+        title = f"Low Stock: {name}"
+        if title in open_titles or title in alerts:
+            continue
+        alerts[title] = Notification(
+            title=title,
+            message=f"Product {name} is low on stock ({quantity} left). Minimum level is {min_stock}.",
+            type='warning'
+        )
+    Notification.objects.bulk_create(alerts.values())
+
 
 class OnlineOrder(models.Model):
     STATUS_CHOICES = (
@@ -917,6 +1246,12 @@ class OnlineOrder(models.Model):
     shipping_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='onlineorder_upd_idx'),
+            models.Index(fields=['created_at'], name='onlineorder_created_idx'), # Order lists
+        ]
+
     def __str__(self):
         return f"Order {self.order_id} - {self.user_email} ({self.status})"
 
@@ -930,6 +1265,11 @@ class OnlineOrderItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='onlineorderite_upd_idx'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product_name}"
 
@@ -1062,3 +1402,268 @@ def seed_ai_features():
     for name, desc in ai_features:
         Feature.objects.get_or_create(name=name, defaults={'description': desc})
     print(f"Successfully seeded {len(ai_features)} AI features.")
+
+# ──────────────────────────────────────────────────────────────
+# SYNC INFRASTRUCTURE MODELS
+# ──────────────────────────────────────────────────────────────
+
+def generate_syncjob_id(): return generate_id('job')
+
+class SyncJob(models.Model):
+    """
+    A sync push accepted with ?async=1. The payload is stored as-is and applied
+    later by `manage.py process_sync_jobs`, one job at a time per store (FIFO).
+    A running job whose worker died (no progress for SYNC_JOB_TIMEOUT_SECONDS)
+    is put back in the queue, or failed after SYNC_JOB_MAX_ATTEMPTS runs.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    id = models.CharField(max_length=50, primary_key=True, default=generate_syncjob_id)
+    store_id = models.CharField(max_length=50, blank=True, default='') # Loose link, the store may arrive in this very payload
+    device_id = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    payload = models.JSONField(default=dict) # Cleared once the job completes
+    progress = models.JSONField(default=dict) # {table: {"total": n, "synced": m}}
+    total_rows = models.IntegerField(default=0)
+    processed_rows = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0) # Runs started, including ones reclaimed after a worker died
+    synced_ids = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'store_id', 'created_at'], name='syncjob_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"SyncJob {self.id} [{self.status}] store={self.store_id}"
+
+    @classmethod
+    def reclaim_stale(cls):
+        """
+        Requeue running jobs that made no progress (updated_at, bumped after
+        every chunk) for SYNC_JOB_TIMEOUT_SECONDS: their worker was killed
+        and they would block their store's queue forever. Re-running is safe,
+        pushes are upserts and the ledger skips rows already applied. Jobs
+        that already used SYNC_JOB_MAX_ATTEMPTS runs are failed instead.
+        Returns (requeued, failed).
+        """
+        from datetime import timedelta
+        from django.conf import settings
+        from django.utils import timezone
+
+        now = timezone.now()
+        stale = cls.objects.filter(
+            status='running',
+            updated_at__lt=now - timedelta(seconds=getattr(settings, 'SYNC_JOB_TIMEOUT_SECONDS', 900)),
+        )
+        max_attempts = getattr(settings, 'SYNC_JOB_MAX_ATTEMPTS', 3)
+        failed = stale.filter(attempts__gte=max_attempts).update(
+            status='failed',
+            error=f"Worker stopped responding {max_attempts} times, giving up",
+            finished_at=now,
+            updated_at=now,
+        )
+        requeued = stale.filter(attempts__lt=max_attempts).update(status='queued', updated_at=now)
+        if requeued or failed:
+            print(f"[SYNC] Reclaimed stale sync jobs: {requeued} requeued, {failed} failed")
+        return requeued, failed
+
+    @classmethod
+    def claim_next(cls):
+        """
+        Atomically move the next runnable job to 'running' and return it (or None).
+        A job is runnable when no earlier queued job and no running job exists for
+        its store, which keeps each store strictly FIFO even with several workers.
+        Stale running jobs are reclaimed first so a dead worker can't block a store.
+        """
+        from django.db import transaction
+        from django.db.models import Exists, F, OuterRef, Q
+        from django.utils import timezone
+
+        cls.reclaim_stale()
+        same_store = cls.objects.filter(store_id=OuterRef('store_id'))
+        blocked = same_store.filter(
+            Q(status='running') | Q(status='queued', created_at__lt=OuterRef('created_at'))
+        )
+        with transaction.atomic():
+            job = (
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(status='queued')
+                .exclude(Exists(blocked))
+                .order_by('created_at')
+                .first()
+            )
+            if job is None:
+                return None
+            job.status = 'running'
+            job.started_at = timezone.now()
+            job.attempts = F('attempts') + 1
+            job.save(update_fields=['status', 'started_at', 'attempts', 'updated_at'])
+            job.refresh_from_db(fields=['attempts'])
+        return job
+
+
+def generate_pushsession_id(): return generate_id('psn')
+
+class PushSession(models.Model):
+    """
+    A chunked push (sync/push/sessions). The device sends its backlog as numbered
+    chunks; each one is committed together with its PushChunk ack, so a chunk
+    re-sent after a disconnect is recognised by (session, seq) and skipped.
+    id_mapping carries the incoming -> server id remaps of earlier chunks (users
+    collapsed by email, colliding ids) so later chunks' foreign keys follow them.
+    """
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('completed', 'Completed'),
+    ]
+    id = models.CharField(max_length=50, primary_key=True, default=generate_pushsession_id)
+    store_id = models.CharField(max_length=50, blank=True, default='') # Loose link, like SyncJob
+    device_id = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    total_chunks = models.IntegerField(null=True, blank=True) # Announced by the client, optional
+    id_mapping = models.JSONField(default=dict, blank=True) # Incoming id -> server id, updated with each chunk
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"PushSession {self.id} [{self.status}] device={self.device_id}"
+
+class PushChunk(models.Model):
+    """Acknowledgement of one committed chunk of a PushSession."""
+    session = models.ForeignKey(PushSession, on_delete=models.CASCADE, related_name='chunks')
+    seq = models.IntegerField()
+    row_count = models.IntegerField(default=0)
+    synced_ids = models.JSONField(default=dict) # Replayed verbatim when the chunk is re-sent
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('session', 'seq')
+        ordering = ['seq']
+
+    def __str__(self):
+        return f"{self.session_id}#{self.seq}"
+
+class SyncLedger(models.Model):
+    """
+    Last content hash each device pushed for each row. A re-sent row whose hash
+    matches is acknowledged without touching its table (see api.sync.split_unchanged).
+    Entries untouched for SYNC_LEDGER_RETENTION_DAYS are pruned; such a row is
+    simply applied again if the device ever re-sends it.
+    """
+    device_id = models.CharField(max_length=255)
+    table_name = models.CharField(max_length=100)
+    row_id = models.CharField(max_length=255)
+    content_hash = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('device_id', 'table_name', 'row_id')
+        indexes = [
+            models.Index(fields=['updated_at'], name='syncledger_updated_idx'), # prune_changelog
+        ]
+
+    def __str__(self):
+        return f"{self.device_id}:{self.table_name}:{self.row_id}"
+
+class PushReceipt(models.Model):
+    """Response of a push sent with an Idempotency-Key, replayed when the same key is retried."""
+    device_id = models.CharField(max_length=255, blank=True, default='')
+    key = models.CharField(max_length=255)
+    response = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('device_id', 'key')
+        indexes = [
+            models.Index(fields=['created_at'], name='pushreceipt_created_idx'), # prune_changelog
+        ]
+
+    def __str__(self):
+        return f"{self.device_id}:{self.key}"
+
+class ChangeLog(models.Model):
+    """
+    Append-only outbox of synced row changes. `seq` is the pull watermark:
+    devices ask for "changes since seq X" instead of scanning every table.
+    Written by the post_save/post_delete receivers in api.sync and by the
+    bulk push path (which bypasses signals).
+    """
+    OP_CHOICES = [
+        ('upsert', 'Upsert'),
+        ('delete', 'Delete'),
+    ]
+    seq = models.BigAutoField(primary_key=True)
+    table_name = models.CharField(max_length=100)
+    row_pk = models.CharField(max_length=255)
+    store_id = models.CharField(max_length=50, blank=True, default='') # '' = visible to every store
+    op = models.CharField(max_length=10, choices=OP_CHOICES, default='upsert')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['store_id', 'seq'], name='changelog_store_seq_idx'),
+            models.Index(fields=['created_at'], name='changelog_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {self.op} {self.table_name}:{self.row_pk}"
+
+def generate_snapshot_id(): return generate_id('snap')
+
+class BootstrapSnapshot(models.Model):
+    """
+    A prebuilt compressed NDJSON dump of everything a new device of `store_id`
+    pulls, valid as of ChangeLog seq `change_seq`. Built by api.snapshots.
+    """
+    id = models.CharField(max_length=50, primary_key=True, default=generate_snapshot_id)
+    store_id = models.CharField(max_length=50)
+    change_seq = models.BigIntegerField(default=0) # Continue with sync/pull since_seq=<change_seq>
+    file_path = models.CharField(max_length=500)
+    compression = models.CharField(max_length=10, default='gzip') # gzip / zstd
+    size_bytes = models.BigIntegerField(default=0)
+    row_count = models.IntegerField(default=0)
+    build_seconds = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['store_id', 'created_at'], name='snapshot_store_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Snapshot {self.id} store={self.store_id} seq={self.change_seq}"
+
+class DeviceSyncState(models.Model):
+    """
+    What each device last pulled of each table: the watermark it sent (its
+    acknowledgement of what it already has), how many rows it got and how long
+    the table took. Written by PullEndpoint; read for per-device lag metrics.
+    """
+    device_id = models.CharField(max_length=255)
+    table_name = models.CharField(max_length=100)
+    store_id = models.CharField(max_length=50, blank=True, default='')
+    watermark = models.DateTimeField(null=True, blank=True) # last_sync sent by the device (None = full pull)
+    change_seq = models.BigIntegerField(null=True, blank=True) # since_seq sent by the device, for change-log pulls
+    last_row_count = models.IntegerField(default=0)
+    last_duration_ms = models.FloatField(null=True, blank=True) # None when skipped or served from the change log
+    last_pulled_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('device_id', 'table_name')
+        indexes = [
+            models.Index(fields=['store_id', 'device_id'], name='devicesync_store_device_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id}:{self.table_name}"
@@ -0,0 +1,39 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+from .filters import is_nullable
+
+
+class DefaultCursorPagination(CursorPagination):
+    """
+    Default pagination of the DRF viewsets: ?cursor= / ?page_size= (capped at
+    API_MAX_PAGE_SIZE). Unlike plain CursorPagination it keeps the order the
+    viewset's get_queryset() already applies (e.g. sales by -date) unless
+    ?ordering= asks for another indexed field (see api.filters), and always
+    ends with the pk so rows sharing a value come back in a stable order.
+    """
+    page_size_query_param = 'page_size'
+    ordering = '-pk'
+
+    @property
+    def max_page_size(self):
+        return getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        if not ordering:
+            # Expressions can't be turned into a cursor position, plain field names
+            # can, unless they are nullable (see indexed_ordering_fields)
+            ordering = [
+                item for item in queryset.query.order_by
+                if isinstance(item, str) and not is_nullable(queryset.model, item.lstrip('-'))
+            ] or [self.ordering]
+        ordering = [ordering] if isinstance(ordering, str) else list(ordering)
+
+        if not any(item.lstrip('-') in ('pk', 'id') for item in ordering):
+            ordering.append('-pk' if ordering[0].startswith('-') else 'pk')
+        return tuple(ordering)
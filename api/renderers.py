@@ -0,0 +1,106 @@
+"""
+MessagePack wire format for the sync endpoints.
+
+Optional: only active when the `msgpack` package is installed. Clients opt in
+with `Content-Type: application/msgpack` (push) and `Accept: application/msgpack`
+or `?format=msgpack` (pull). Unlike the JSON output, datetimes travel as
+MessagePack timestamps (ext type -1) instead of strings. Decimals stay
+strings as in JSON: a float would round money amounts on the wire.
+"""
+from datetime import date, datetime, time, timezone as dt_timezone
+from decimal import Decimal
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+
+def msgpack_available():
+    return msgpack is not None
+
+
+def _encode_native(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, datetime):
+        if obj.tzinfo is None:
+            obj = obj.replace(tzinfo=dt_timezone.utc)
+        return msgpack.Timestamp.from_datetime(obj)
+    if isinstance(obj, (date, time)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _encode_json(obj):
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()  # Full precision, unlike DjangoJSONEncoder
+    return str(obj)
+
+
+def to_json_types(data):
+    """
+    `data` as plain JSON values: datetimes as ISO strings and Decimals as
+    strings, the shapes a JSON push carries. For parsed MessagePack payloads
+    that must be stored in a JSONField (async SyncJobs).
+    """
+    import json
+    return json.loads(json.dumps(data, default=_encode_json))
+
+
+def packb(data):
+    return msgpack.packb(data, default=_encode_native, use_bin_type=True)
+
+
+def unpackb(raw):
+    # timestamp=3: timestamps come back as aware datetimes, like the JSON path after parsing
+    return msgpack.unpackb(raw, raw=False, timestamp=3, strict_map_key=False)
+
+
+class MessagePackParser(BaseParser):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if msgpack is None:
+            raise ParseError('MessagePack is not available on this server (pip install msgpack)')
+        try:
+            return unpackb(stream.read())
+        except Exception as e:
+            raise ParseError(f'MessagePack parse error - {e}')
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return packb(data)
+
+
+def sync_parser_classes():
+    """Default parsers plus MessagePack when it is installed."""
+    from rest_framework.settings import api_settings
+    return list(api_settings.DEFAULT_PARSER_CLASSES) + ([MessagePackParser] if msgpack else [])
+
+
+def sync_renderer_classes():
+    """Default renderers plus MessagePack when it is installed."""
+    from rest_framework.settings import api_settings
+    return list(api_settings.DEFAULT_RENDERER_CLASSES) + ([MessagePackRenderer] if msgpack else [])
+
+
+def wants_native_types(request):
+    """True when the response will be MessagePack, so pull rows can keep Decimal/datetime values."""
+    renderer = getattr(request, 'accepted_renderer', None)
+    return isinstance(renderer, MessagePackRenderer)
@@ -0,0 +1,183 @@
+"""
+Product search for the storefront and POS (ProductViewSet ?search=).
+
+On PostgreSQL a search term is matched two ways, both served by GIN indexes
+created in migration 0035:
+
+- full text: every word of the term is a prefix (`blu sh` finds "Blue
+  Shirt") against one tsvector built from name, sku, brand and description
+  with the 'simple' configuration (no stemming, so SKUs and brand names
+  survive as typed);
+- trigrams: the whole term is word-similar to the name (pg_trgm `%>`), which
+  tolerates typos such as `kayboard`.
+
+Results come back ordered by ts_rank plus trigram similarity. Other
+databases (SQLite in local dev) fall back to icontains matching of each
+word with a simple field-based ranking.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+# Longer terms are cut here: a few words already narrow a catalog down
+MAX_SEARCH_WORDS = 8
+
+# Must stay identical to the expression indexed by 0035_product_search_indexes,
+# or PostgreSQL stops using the index
+SEARCH_FIELDS = ('name', 'sku', 'brand', 'description')
+SEARCH_CONFIG = 'simple'
+
+
+def search_words(term):
+    return re.findall(r'\w+', (term or '').lower())[:MAX_SEARCH_WORDS]
+
+
+def search_products(qs, term):
+    """Filter `qs` to the products matching `term`, best matches first."""
+    words = search_words(term)
+    if not words:
+        # Nothing indexable (e.g. only punctuation): plain substring match
+        term = (term or '').strip()
+        return qs.filter(Q(name__icontains=term) | Q(sku__icontains=term)).order_by('-updated_at')
+    if connection.vendor == 'postgresql':
+        return _search_postgres(qs, term.strip(), words)
+    return _search_fallback(qs, term.strip(), words)
+
+
+def _search_postgres(qs, term, words):
+    from django.contrib.postgres.lookups import TrigramWordSimilar
+    from django.contrib.postgres.search import (
+        SearchQuery, SearchRank, SearchVector, SearchVectorExact, TrigramWordSimilarity
+    )
+
+    vector = SearchVector(*SEARCH_FIELDS, config=SEARCH_CONFIG)
+    # \w-only words need no tsquery escaping
+    query = SearchQuery(' & '.join(f"{word}:*" for word in words), search_type='raw', config=SEARCH_CONFIG)
+    return (
+        qs.filter(Q(SearchVectorExact(vector, query)) | Q(TrigramWordSimilar(F('name'), Value(term))))
+        .annotate(search_rank=SearchRank(vector, query) + TrigramWordSimilarity(Value(term), 'name'))
+        .order_by('-search_rank', '-updated_at')
+    )
+
+
+def _search_fallback(qs, term, words):
+    for word in words:
+        qs = qs.filter(
+            Q(name__icontains=word) | Q(sku__icontains=word) | Q(brand__icontains=word) | Q(description__icontains=word)
+        )
+    return qs.annotate(
+        search_rank=Case(
+            When(sku__iexact=term, then=Value(4)),
+            When(name__istartswith=term, then=Value(3)),
+            When(Q(name__icontains=term) | Q(name__istartswith=words[0]), then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    ).order_by('-search_rank', '-updated_at')
+
+
+# ─────────────────────────────────────────────────────────────
+# SCAN LOOKUP (products/lookup)
+# ─────────────────────────────────────────────────────────────
+
+# Compact shape returned to scanners: enough to add a cart/sale line
+LOOKUP_FIELDS = (
+    'id', 'name', 'sku', 'barcode', 'selling_price', 'discount_percentage', 'quantity',
+    'unit', 'is_kit', 'store_id', 'tax_slab_id',
+)
+# A code matching several products resolves to the barcode match first
+LOOKUP_PRIORITY = ('barcode', 'sku', 'id')
+_MISS = 'miss'  # Cached "no such code", distinct from a cache miss (None)
+
+
+# Version shared by every store's lookups: tax slabs are global, and each
+# cached product carries its slab's percentage
+_ALL_STORES = '*'
+
+
+def _lookup_version_key(store_id):
+    return f"products:lookup_version:{store_id}"
+
+
+def _lookup_versions(store_id):
+    """'<store version>.<all stores version>', creating missing versions."""
+    from django.core.cache import cache
+    from django.utils.crypto import get_random_string
+    keys = [_lookup_version_key(store_id), _lookup_version_key(_ALL_STORES)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = cache.get_or_set(key, lambda: get_random_string(8), None)
+    return '.'.join(versions[key] for key in keys)
+
+
+def forget_product_lookups(store_ids=None):
+    """
+    Drop the cached scans of `store_ids` and of store-less lookups, or of
+    every store when `store_ids` is None. Old entries are orphaned by the new
+    version and age out of the cache.
+    """
+    from django.core.cache import cache
+    if store_ids is None:
+        cache.delete(_lookup_version_key(_ALL_STORES))
+    else:
+        cache.delete_many([_lookup_version_key(store_id) for store_id in {*store_ids, ''}])
+
+
+def _forget_product_on_commit(sender, instance, **kwargs):
+    from django.db import transaction
+    store_id = instance.store_id
+    transaction.on_commit(lambda: forget_product_lookups([store_id] if store_id else []))
+
+
+def _forget_all_on_commit(sender, instance, **kwargs):
+    from django.db import transaction
+    transaction.on_commit(forget_product_lookups)
+
+
+def connect_lookup_cache():
+    """
+    Forget cached scans once a product or tax slab save/delete commits. Bulk
+    sync pushes send no signals; api.sync.announce_changes covers those.
+    """
+    from django.db.models.signals import post_delete, post_save
+    from .models import Product, TaxSlab
+    for signal in (post_save, post_delete):
+        signal.connect(_forget_product_on_commit, sender=Product, dispatch_uid=f"lookup_cache:product:{signal is post_save}")
+        signal.connect(_forget_all_on_commit, sender=TaxSlab, dispatch_uid=f"lookup_cache:taxslab:{signal is post_save}")
+
+
+def lookup_product(code, store_id=None):
+    """
+    (matched field, compact product dict) for a scanned barcode, SKU or id,
+    or (None, None). Answered from the cache when possible; otherwise one
+    query over the (barcode, store) and (sku, store) indexes and the pk.
+    """
+    from django.conf import settings
+    from django.core.cache import cache
+    from .models import Product
+
+    store_key = store_id or ''
+    key = f"products:lookup:{store_key}:{_lookup_versions(store_key)}:{code}"
+    cached = cache.get(key)
+    if cached is not None:
+        return (None, None) if cached == _MISS else cached
+
+    qs = Product.objects.filter(Q(barcode=code) | Q(sku=code) | Q(pk=code)).filter(Q(is_deleted=False) | Q(is_deleted__isnull=True))
+    if store_id:
+        qs = qs.filter(store_id=store_id)
+    candidates = list(qs.values(*LOOKUP_FIELDS, tax_percentage=F('tax_slab__percentage'))[:10])
+
+    result = None
+    for field in LOOKUP_PRIORITY:
+        product = next((row for row in candidates if row[field] == code), None)
+        if product is not None:
+            for name in ('selling_price', 'tax_percentage'):
+                if product[name] is not None:
+                    product[name] = str(product[name])  # Same as ProductSerializer's decimals
+            result = (field, product)
+            break
+
+    cache.set(key, result or _MISS, getattr(settings, 'PRODUCT_LOOKUP_CACHE_SECONDS', 60))
+    return result or (None, None)
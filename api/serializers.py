@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
+from .filters import requested_fields
 from .models import User, Store, SaleReturn, Notification, Product, Customer
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -157,13 +158,27 @@ from .models import (
 )
 
 
-class UserPermissionSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    ?fields=a,b on a read request trims the top-level serializer to those
+    fields (plus id); nested serializers keep all of theirs. The columns and
+    prefetches nobody asked for are skipped by api.filters.SparseFieldsFilter.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = requested_fields(self._context.get('request'))
+        if wanted:
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+
+class UserPermissionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = UserPermission
         fields = '__all__'
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     slug = serializers.SerializerMethodField()
     class Meta:
         model = Category
@@ -179,69 +194,69 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 
-class EmployeeSerializer(serializers.ModelSerializer):
+class EmployeeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Employee
         fields = '__all__'
 
-class AttendanceSerializer(serializers.ModelSerializer):
+class AttendanceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Attendance
         fields = '__all__'
 
-class LeaveSerializer(serializers.ModelSerializer):
+class LeaveSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Leave
         fields = '__all__'
 
-class PayrollSerializer(serializers.ModelSerializer):
+class PayrollSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Payroll
         fields = '__all__'
 
-class PerformanceReviewSerializer(serializers.ModelSerializer):
+class PerformanceReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = PerformanceReview
         fields = '__all__'
 
-class SupplierSerializer(serializers.ModelSerializer):
+class SupplierSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Supplier
         fields = '__all__'
 
-class SupplierCustomFieldSerializer(serializers.ModelSerializer):
+class SupplierCustomFieldSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SupplierCustomField
         fields = '__all__'
 
-class SupplierCustomFieldValueSerializer(serializers.ModelSerializer):
+class SupplierCustomFieldValueSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SupplierCustomFieldValue
         fields = '__all__'
 
-class SupplierTransactionSerializer(serializers.ModelSerializer):
+class SupplierTransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SupplierTransaction
         fields = '__all__'
 
-class PaymentTermSerializer(serializers.ModelSerializer):
+class PaymentTermSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = PaymentTerm
         fields = '__all__'
 
-class SupplierDocumentSerializer(serializers.ModelSerializer):
+class SupplierDocumentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SupplierDocument
         fields = '__all__'
 
 from .models import Receiving, ReceivingItem
 
-class ReceivingItemSerializer(serializers.ModelSerializer):
+class ReceivingItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ReceivingItem
         fields = '__all__'
 
-class ReceivingSerializer(serializers.ModelSerializer):
+class ReceivingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = ReceivingItemSerializer(many=True, read_only=True)
     supplier_name = serializers.CharField(source='supplier.company_name', read_only=True)
     purchase_order_number = serializers.CharField(source='purchase_order.id', read_only=True, allow_null=True)
@@ -250,17 +265,17 @@ class ReceivingSerializer(serializers.ModelSerializer):
         model = Receiving
         fields = '__all__'
 
-class InvoiceItemSerializer(serializers.ModelSerializer):
+class InvoiceItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = InvoiceItem
         fields = '__all__'
 
-class ChequeSerializer(serializers.ModelSerializer):
+class ChequeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Cheque
         fields = '__all__'
 
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = InvoiceItemSerializer(many=True, read_only=True, source='invoice_items')
     customer_name = serializers.CharField(source='customer.name', read_only=True, allow_null=True)
     supplier_name = serializers.CharField(source='supplier.company_name', read_only=True, allow_null=True)
@@ -269,17 +284,42 @@ class InvoiceSerializer(serializers.ModelSerializer):
         model = Invoice
         fields = '__all__'
 
-class ProductImageSerializer(serializers.ModelSerializer):
+class ThumbnailField(serializers.CharField):
+    """An image column rendered as the URL of one thumbnail variant (see api.media)."""
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        kwargs.setdefault('read_only', True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        from .media import thumbnail_url
+        return thumbnail_url(value, self.variant)
+
+class ThumbnailsField(serializers.Field):
+    """An image column rendered as {variant: thumbnail URL} for every variant."""
+    def __init__(self, **kwargs):
+        kwargs.setdefault('read_only', True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        from .media import THUMBNAIL_SIZES, thumbnail_url
+        if not value:
+            return None
+        return {variant: thumbnail_url(value, variant) for variant in THUMBNAIL_SIZES}
+
+class ProductImageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    thumbnails = ThumbnailsField(source='image')
+
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'is_thumbnail']
+        fields = ['id', 'image', 'thumbnails', 'is_thumbnail']
 
-class KeyFeatureSerializer(serializers.ModelSerializer):
+class KeyFeatureSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = KeyFeature
         fields = ['id', 'title', 'description']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(), source='category', write_only=True, required=False
@@ -295,7 +335,8 @@ class ProductSerializer(serializers.ModelSerializer):
     price_inr = serializers.SerializerMethodField()
     price_usd = serializers.SerializerMethodField()
     discount_percentage = serializers.IntegerField(required=False)
-    thumbnail = serializers.CharField(source='image', read_only=True)
+    thumbnail = ThumbnailField(source='image', variant='grid')
+    thumbnails = ThumbnailsField(source='image')
     slug = serializers.SerializerMethodField()
     featured = serializers.BooleanField(default=False, read_only=True)
     
@@ -304,7 +345,7 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'title', 'description', 'sku', 'category', 'category_id', 'slug',
             'selling_price', 'purchase_price', 'quantity', 'unit', 'brand', 'barcode',
-            'tax_slab', 'image', 'thumbnail', 'images', 'features', 'price', 'price_inr', 'price_usd',
+            'tax_slab', 'image', 'thumbnail', 'thumbnails', 'images', 'features', 'price', 'price_inr', 'price_usd',
             'discount_percentage', 'featured', 'updated_at'
         ]
         
@@ -317,12 +358,12 @@ class ProductSerializer(serializers.ModelSerializer):
     def get_slug(self, obj):
         return obj.sku or f"prod-{obj.id}"
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = '__all__'
 
-class SaleSerializer(serializers.ModelSerializer):
+class SaleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Online Delivery Details
     courier_name = serializers.CharField(source='online_order.courier_name', read_only=True, allow_null=True)
     tracking_number = serializers.CharField(source='online_order.tracking_number', read_only=True, allow_null=True)
@@ -375,24 +416,24 @@ class SaleSerializer(serializers.ModelSerializer):
 
 from .models import Review, Feedback, Cart, CartItem
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = '__all__'
 
-class FeedbackSerializer(serializers.ModelSerializer):
+class FeedbackSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Feedback
         fields = '__all__'
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     project = ProductSerializer(source='product', read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(), write_only=True, required=False, allow_null=True
     )
     product_name = serializers.CharField(source='product.name', read_only=True)
-    product_image = serializers.CharField(source='product.image', read_only=True)
+    product_image = ThumbnailField(source='product.image', variant='cart')
     subtotal = serializers.SerializerMethodField()
     price_at_time = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
     
@@ -403,7 +444,7 @@ class CartItemSerializer(serializers.ModelSerializer):
     def get_subtotal(self, obj):
         return obj.quantity * obj.price_at_time
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
     total_price = serializers.SerializerMethodField()
     count = serializers.SerializerMethodField()
@@ -418,17 +459,17 @@ class CartSerializer(serializers.ModelSerializer):
     def get_count(self, obj):
         return obj.items.count()
 
-class OnlineOrderItemSerializer(serializers.ModelSerializer):
+class OnlineOrderItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = OnlineOrderItem
         fields = '__all__'
 
-class OnlineReturnSerializer(serializers.ModelSerializer):
+class OnlineReturnSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = OnlineReturn
         fields = '__all__'
 
-class OnlineOrderSerializer(serializers.ModelSerializer):
+class OnlineOrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     web_items = OnlineOrderItemSerializer(many=True, read_only=True)
     returns = OnlineReturnSerializer(many=True, read_only=True)
     sale_invoice = serializers.CharField(source='sale.invoice_number', read_only=True, allow_null=True)
@@ -437,14 +478,14 @@ class OnlineOrderSerializer(serializers.ModelSerializer):
         model = OnlineOrder
         fields = '__all__'
 
-class SaleReturnSerializer(serializers.ModelSerializer):
+class SaleReturnSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     customer_name = serializers.CharField(source='customer.name', read_only=True)
     class Meta:
         model = SaleReturn
         fields = '__all__'
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = '__all__'
@@ -455,22 +496,22 @@ class NotificationSerializer(serializers.ModelSerializer):
 
 from .models import Client, Device, Feature, ClientFeature
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Client
         fields = ['id', 'name', 'license_key', 'created_at']
 
-class DeviceSerializer(serializers.ModelSerializer):
+class DeviceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Device
         fields = ['id', 'client', 'device_id', 'registered_at', 'last_active']
 
-class FeatureSerializer(serializers.ModelSerializer):
+class FeatureSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Feature
         fields = ['id', 'name', 'description']
 
-class ClientFeatureSerializer(serializers.ModelSerializer):
+class ClientFeatureSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     feature_name = serializers.CharField(source='feature.name', read_only=True)
     
     class Meta:
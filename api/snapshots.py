@@ -0,0 +1,149 @@
+"""
+Prebuilt bootstrap snapshots.
+
+A snapshot is the full pull of one store written once to disk as compressed
+NDJSON, so new device installs download a file instead of making the server
+re-serialize the whole store. Line format:
+
+    {"type": "header", "store_id": ..., "change_seq": ..., "created_at": ...}
+    {"table": "sales", "row": {...}}            one line per row, pull order
+    {"type": "end", "row_counts": {...}}
+
+The device loads the rows, then continues with sync/pull since_seq=<change_seq>.
+"""
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .sync import get_settle_cutoff, get_sync_watermark, read_snapshot
+
+# Rows fetched per keyset page while writing, bounds memory like a paginated pull
+SNAPSHOT_PAGE_SIZE = 2000
+
+
+def get_compression():
+    """Configured codec, falling back to gzip when zstandard isn't installed."""
+    compression = getattr(settings, 'SYNC_SNAPSHOT_COMPRESSION', 'gzip')
+    if compression == 'zstd':
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            print("[SNAPSHOT] zstandard is not installed, falling back to gzip")
+            return 'gzip'
+    return 'zstd' if compression == 'zstd' else 'gzip'
+
+
+def open_compressed(path, compression):
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.open(path, 'wt', encoding='utf-8')
+    return gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+
+
+def build_snapshot(store_id):
+    """Write a new snapshot for `store_id` and return its BootstrapSnapshot row."""
+    from .models import BootstrapSnapshot
+    from .views import PullEndpoint
+
+    started = time.monotonic()
+    compression = get_compression()
+    directory = settings.SYNC_SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+
+    snapshot = BootstrapSnapshot(store_id=store_id, compression=compression)
+    extension = 'ndjson.zst' if compression == 'zstd' else 'ndjson.gz'
+    final_path = os.path.join(directory, f"{store_id}-{snapshot.id}.{extension}")
+    tmp_path = final_path + '.tmp'
+
+    pull = PullEndpoint()
+    row_counts = {}
+    try:
+        # Same consistency as a live pull: rows and watermark from one read snapshot
+        cutoff = get_settle_cutoff()
+        with read_snapshot(), open_compressed(tmp_path, compression) as out:
+            snapshot.change_seq = get_sync_watermark(cutoff)[0]
+            out.write(json.dumps({
+                "type": "header",
+                "store_id": store_id,
+                "change_seq": snapshot.change_seq,
+                "created_at": timezone.now().isoformat(),
+            }) + "\n")
+            for table in pull.ORDER:
+                model = pull.MODEL_MAPPING.get(table)
+                if not model:
+                    continue
+                cursor, more = None, True
+                try:
+                    while more:
+                        with transaction.atomic():
+                            rows, cursor, more = pull.pull_table(table, model, store_id, None, cursor, SNAPSHOT_PAGE_SIZE)
+                        for row in rows:
+                            out.write(json.dumps({"table": table, "row": row}, separators=(',', ':'), default=str) + "\n")
+                        row_counts[table] = row_counts.get(table, 0) + len(rows)
+                except Exception as table_err:
+                    # Same policy as the live pull: a broken table doesn't sink the rest
+                    print(f"[SNAPSHOT] SKIPPING table '{table}': {table_err}")
+            out.write(json.dumps({"type": "end", "row_counts": row_counts}) + "\n")
+        os.replace(tmp_path, final_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    snapshot.file_path = final_path
+    snapshot.size_bytes = os.path.getsize(final_path)
+    snapshot.row_count = sum(row_counts.values())
+    snapshot.build_seconds = round(time.monotonic() - started, 3)
+    snapshot.save()
+    print(f"[SNAPSHOT] Built {snapshot} ({snapshot.row_count} rows, {snapshot.size_bytes} bytes, {snapshot.build_seconds}s)")
+
+    prune_snapshots(store_id)
+    return snapshot
+
+
+def latest_snapshot(store_id):
+    """Newest snapshot whose file is still on disk, or None."""
+    from .models import BootstrapSnapshot
+
+    for snapshot in BootstrapSnapshot.objects.filter(store_id=store_id).order_by('-created_at')[:3]:
+        if os.path.exists(snapshot.file_path):
+            return snapshot
+    return None
+
+
+def is_stale(snapshot):
+    """True once the store changed SYNC_SNAPSHOT_REBUILD_CHANGES times or the snapshot got too old."""
+    from .models import ChangeLog
+
+    if snapshot is None:
+        return True
+    max_age = timedelta(hours=getattr(settings, 'SYNC_SNAPSHOT_MAX_AGE_HOURS', 24))
+    if snapshot.created_at < timezone.now() - max_age:
+        return True
+    threshold = getattr(settings, 'SYNC_SNAPSHOT_REBUILD_CHANGES', 5000)
+    changes = ChangeLog.objects.filter(
+        seq__gt=snapshot.change_seq, store_id__in=[snapshot.store_id, '']
+    )[:threshold].count()
+    return changes >= threshold
+
+
+def prune_snapshots(store_id):
+    """Keep the newest SYNC_SNAPSHOT_KEEP snapshots of a store, delete the rest and their files."""
+    from .models import BootstrapSnapshot
+
+    keep = max(1, getattr(settings, 'SYNC_SNAPSHOT_KEEP', 2))
+    old = BootstrapSnapshot.objects.filter(store_id=store_id).order_by('-created_at')[keep:]
+    for snapshot in old:
+        try:
+            if os.path.exists(snapshot.file_path):
+                os.remove(snapshot.file_path)
+        except OSError as e:
+            print(f"[SNAPSHOT] Could not delete {snapshot.file_path}: {e}")
+            continue
+        snapshot.delete()
@@ -0,0 +1,836 @@
+"""
+Sync engine helpers shared by the push/pull endpoints.
+
+Keeps the set-based database work (bulk upserts, chunking) out of views.py so
+the endpoints only deal with payload shape and per-table business rules.
+"""
+import base64
+import contextvars
+import hashlib
+import json
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+
+# ─────────────────────────────────────────────────────────────
+# FIELD METADATA REGISTRY
+# ─────────────────────────────────────────────────────────────
+
+# Columns never sent down to devices
+PULL_EXCLUDED_FIELDS = {
+    'password',
+    'date_joined', 'groups', 'user_permissions', 'last_login',
+    'username', 'first_name', 'last_name'
+}
+
+
+@lru_cache(maxsize=4096)
+def camel_to_snake(key):
+    """Payload keys arrive camelCase from the desktop app; cached since the key set is small."""
+    return ''.join(['_' + c.lower() if c.isupper() else c for c in key]).lstrip('_')
+
+
+# ── Pull converters: raw DB value (as returned by values_list) -> JSON value ──
+# Together they reproduce the historical getattr()-based output: ISO dates,
+# 1/0 booleans, FK ids as strings, numbers as-is, everything else str().
+
+def _pull_identity(val):
+    return val
+
+
+def _pull_iso(val):
+    return val.isoformat() if val is not None else None
+
+
+def _pull_bool(val):
+    if val is None:
+        return None
+    return 1 if val else 0
+
+
+def _pull_fk(val):
+    if val is None:
+        return None
+    if val or not isinstance(val, (int, float)):
+        return str(val)
+    return val
+
+
+def _pull_str(val):
+    return str(val) if val is not None else None
+
+
+def _pull_file(val):
+    # FieldFile.__str__ is its name, '' when empty
+    return val or ''
+
+
+def _pull_generic(val):
+    """Fallback for column types without a dedicated converter (e.g. JSONField)."""
+    if isinstance(val, (datetime, date)):
+        return val.isoformat()
+    elif isinstance(val, bool):
+        return 1 if val else 0
+    elif val is not None:
+        if isinstance(val, (int, float)):
+            return val
+        return str(val)
+    return None
+
+
+PULL_CONVERTERS = {
+    'CharField': _pull_identity,
+    'TextField': _pull_identity,
+    'EmailField': _pull_identity,
+    'SlugField': _pull_identity,
+    'URLField': _pull_identity,
+    'DateTimeField': _pull_iso,
+    'DateField': _pull_iso,
+    'TimeField': _pull_str,
+    'BooleanField': _pull_bool,
+    'DecimalField': _pull_str,
+    'UUIDField': _pull_str,
+    'IntegerField': _pull_identity,
+    'BigIntegerField': _pull_identity,
+    'SmallIntegerField': _pull_identity,
+    'PositiveIntegerField': _pull_identity,
+    'PositiveBigIntegerField': _pull_identity,
+    'PositiveSmallIntegerField': _pull_identity,
+    'AutoField': _pull_identity,
+    'BigAutoField': _pull_identity,
+    'SmallAutoField': _pull_identity,
+    'FloatField': _pull_identity,
+    'FileField': _pull_file,
+    'ImageField': _pull_file,
+}
+
+
+# Binary formats (MessagePack) carry datetimes natively; the renderer encodes them.
+# Decimals keep their exact string form, as in JSON.
+PULL_NATIVE_CONVERTERS = {
+    **PULL_CONVERTERS,
+    'DateTimeField': _pull_identity,
+    'DateField': _pull_identity,
+}
+
+
+class SyncField:
+    """Per-column facts the sync pipeline needs, read once from Model._meta."""
+    __slots__ = (
+        'field', 'name', 'attname', 'pull_key', 'pull_convert', 'pull_convert_native',
+        'is_relation', 'related_model',
+        'null', 'blank', 'primary_key', 'auto_now', 'internal_type',
+    )
+
+    def __init__(self, field):
+        self.field = field
+        self.name = field.name
+        self.attname = field.attname
+        self.is_relation = field.is_relation
+        self.related_model = field.related_model if field.is_relation else None
+        self.null = field.null
+        self.blank = field.blank
+        self.primary_key = field.primary_key
+        # auto_now / auto_now_add columns are managed by Django, never written from a payload
+        self.auto_now = getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+        self.internal_type = field.get_internal_type()
+        # Local SQLite expects 'field_id' for Foreign Keys
+        self.pull_key = f"{field.name}_id" if field.is_relation and not field.name.endswith('_id') else field.name
+        self.pull_convert = _pull_fk if field.is_relation else PULL_CONVERTERS.get(self.internal_type, _pull_generic)
+        self.pull_convert_native = _pull_fk if field.is_relation else PULL_NATIVE_CONVERTERS.get(self.internal_type, _pull_generic)
+
+
+class SyncSchema:
+    """
+    Cached view of a model's concrete columns for push normalization and pull
+    serialization. Use get_schema(model) rather than instantiating directly.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.pk_name = model._meta.pk.name
+        self.fields = [SyncField(f) for f in model._meta.concrete_fields]
+        self.field_names = {f.name for f in self.fields}
+
+        # Both 'store' and 'store_id' resolve to the same column
+        self.by_key = {}
+        for f in self.fields:
+            self.by_key[f.name] = f
+            self.by_key[f.attname] = f
+
+        self.relations = [f for f in self.fields if f.is_relation]
+        self.required_fields = [f for f in self.fields if not f.primary_key and not f.blank and not f.null]
+        self.has_store = 'store' in self.field_names or 'store_id' in self.by_key
+        self.pull_fields = [f for f in self.fields if f.name not in PULL_EXCLUDED_FIELDS]
+        # Parallel tuples for the values_list() pull path
+        self.pull_attnames = tuple(f.attname for f in self.pull_fields)
+        self.pull_keys = tuple(f.pull_key for f in self.pull_fields)
+        self.pull_converters = tuple(f.pull_convert for f in self.pull_fields)
+        self.pull_native_converters = tuple(f.pull_convert_native for f in self.pull_fields)
+        self.auto_now_attnames = {
+            f.attname for f in self.fields if getattr(f.field, 'auto_now', False)
+        }
+
+    def has_field(self, name):
+        return name in self.field_names
+
+    def resolve(self, raw_key):
+        """Map an incoming payload key (camelCase or snake_case) to its column, or None."""
+        return self.by_key.get(camel_to_snake(raw_key))
+
+
+_SCHEMAS = {}
+
+
+def get_schema(model):
+    schema = _SCHEMAS.get(model)
+    if schema is None:
+        schema = _SCHEMAS[model] = SyncSchema(model)
+    return schema
+
+
+def build_schemas(models):
+    """Warm the registry at startup so the first push doesn't pay for it."""
+    for model in models:
+        get_schema(model)
+
+
+def get_push_chunk_size():
+    return max(1, getattr(settings, 'SYNC_PUSH_CHUNK_SIZE', 500))
+
+
+def chunked(items, size):
+    """Yield successive `size`-length slices of `items`."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def get_pull_page_size(requested=None):
+    """Client-requested page size clamped to SYNC_PULL_MAX_PAGE_SIZE, else the default."""
+    default = getattr(settings, 'SYNC_PULL_PAGE_SIZE', 1000)
+    ceiling = getattr(settings, 'SYNC_PULL_MAX_PAGE_SIZE', 5000)
+    try:
+        size = int(requested) if requested else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, ceiling))
+
+
+class InvalidCursor(ValueError):
+    """A pull cursor that doesn't decode to a keyset position."""
+
+
+def encode_cursor(values):
+    """Opaque pull cursor for a keyset position, e.g. [updated_at_iso, pk]."""
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor(); raises InvalidCursor on anything malformed."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise InvalidCursor(f"Invalid pull cursor: {token!r}")
+    if not isinstance(values, list):
+        raise InvalidCursor(f"Invalid pull cursor: {token!r}")
+    return values
+
+
+# Models with business post_save receivers, captured before the change log's own
+# receivers are connected (see snapshot_save_side_effects / connect_changelog)
+_SIDE_EFFECT_MODELS = None
+
+# ── Bulk sync context: per-row receivers deferred to one set-based call per batch ──
+
+_BATCH_SIDE_EFFECTS = {}  # model -> fn(pks), the set-based version of its post_save receivers
+_deferred_side_effects = contextvars.ContextVar('deferred_side_effects', default=None)
+
+
+def batch_side_effect(model):
+    """
+    Register the decorated fn(pks) as the set-based equivalent of every
+    post_save receiver of `model`. The receivers must start with
+    `if defer_side_effects(sender, [instance.pk]): return`.
+    """
+    def register(fn):
+        _BATCH_SIDE_EFFECTS[model] = fn
+        return fn
+    return register
+
+
+def defer_side_effects(model, pks):
+    """
+    Inside bulk_sync(), queue `pks` for `model`'s batch side effect and return
+    True; outside it (or without a batch version) return False so the caller
+    runs the per-row logic as usual.
+    """
+    pending = _deferred_side_effects.get()
+    if pending is None or model not in _BATCH_SIDE_EFFECTS:
+        return False
+    pending.setdefault(model, set()).update(pks)
+    return True
+
+
+@contextmanager
+def bulk_sync():
+    """
+    Scope of one push batch. Models with a batch side effect are bulk
+    upserted, their receivers only queue the saved pks, and each batch
+    function runs once with all of them when the block exits cleanly (inside
+    the caller's transaction, so a failed batch leaves no side effects).
+    """
+    if _deferred_side_effects.get() is not None:  # Nested: the outer scope runs them
+        yield
+        return
+    pending = {}
+    token = _deferred_side_effects.set(pending)
+    try:
+        yield
+    finally:
+        _deferred_side_effects.reset(token)
+    for model, pks in pending.items():
+        _BATCH_SIDE_EFFECTS[model](sorted(pks))
+
+
+def snapshot_save_side_effects(models):
+    global _SIDE_EFFECT_MODELS
+    _SIDE_EFFECT_MODELS = {model for model in models if post_save.has_listeners(model)}
+
+
+def has_save_side_effects(model):
+    """
+    True if saving `model` fires post_save receivers (e.g. low-stock alerts,
+    customer -> user provisioning). bulk_create skips those, so such models
+    must keep going through Model.save(). The change log receivers don't
+    count: the bulk path records its changes itself. Inside bulk_sync(),
+    models with a registered batch side effect don't count either.
+    """
+    if model in _BATCH_SIDE_EFFECTS and _deferred_side_effects.get() is not None:
+        return False
+    if _SIDE_EFFECT_MODELS is not None:
+        return model in _SIDE_EFFECT_MODELS
+    return post_save.has_listeners(model)
+
+
+def bulk_upsert(model, prepared):
+    """
+    Upsert a chunk of normalized rows with one INSERT ... ON CONFLICT (pk) per
+    distinct column set.
+
+    `prepared` is a list of (obj_id, cleaned_data) pairs as produced by the push
+    normalizer. Rows that only carry some columns only update those columns on
+    conflict, matching update_or_create(defaults=...) semantics. Duplicate ids
+    inside the chunk are merged in arrival order (last value wins).
+
+    Runs inside its own savepoint and re-raises on any failure so the caller can
+    fall back to row-by-row saves for just this chunk.
+    """
+    schema = get_schema(model)
+    pk_name = model._meta.pk.attname
+
+    merged = {}
+    for obj_id, cleaned_data in prepared:
+        merged[obj_id] = {**merged.get(obj_id, {}), **cleaned_data}
+
+    groups = {}
+    for obj_id, cleaned_data in merged.items():
+        groups.setdefault(frozenset(cleaned_data), []).append((obj_id, cleaned_data))
+
+    # auto_now columns are stamped by pre_save() on insert; refresh them on update too
+    auto_now_fields = schema.auto_now_attnames
+
+    with transaction.atomic():
+        for keys, members in groups.items():
+            objs = [model(**{pk_name: obj_id}, **cleaned_data) for obj_id, cleaned_data in members]
+            update_fields = sorted((set(keys) | auto_now_fields) - {pk_name})
+            if update_fields:
+                model.objects.bulk_create(
+                    objs,
+                    update_conflicts=True,
+                    unique_fields=[pk_name],
+                    update_fields=update_fields,
+                )
+            else:
+                model.objects.bulk_create(objs, ignore_conflicts=True)
+
+    return list(merged.keys())
+
+
+# ─────────────────────────────────────────────────────────────
+# PASSWORD HASHING
+# ─────────────────────────────────────────────────────────────
+
+# Password given to synced users that arrive without one
+PLACEHOLDER_PASSWORD = 'ChangeMe123!'
+HASHED_PASSWORD_PREFIXES = ('pbkdf2_', 'bcrypt', '$2b$', '$2a$', 'argon2')
+
+# PBKDF2 is CPU bound, so hash_passwords can fan out over a process pool of
+# SYNC_HASH_WORKERS. Only processes that call enable_hash_pool() use it (the
+# process_sync_jobs worker does); web workers always hash on the request
+# thread, so a request never forks a pool of its own.
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+_hash_pool_enabled = False
+
+
+@lru_cache(maxsize=None)
+def placeholder_password_hash():
+    """
+    The placeholder hashed with the fixed SYNC_PLACEHOLDER_SALT, so every
+    process (and every restart) produces the same string. Stored placeholders
+    are rewritten to it (migration 0041), which makes spotting one a plain
+    string comparison; changing the salt therefore needs that backfill again.
+    """
+    from django.contrib.auth.hashers import make_password
+    return make_password(PLACEHOLDER_PASSWORD, salt=getattr(settings, 'SYNC_PLACEHOLDER_SALT', 'syncplaceholder'))
+
+
+def is_placeholder_password(encoded):
+    """True for the placeholder hash given out by this server."""
+    return bool(encoded) and encoded == placeholder_password_hash()
+
+
+def encodes_placeholder(encoded):
+    """
+    True for a hash of the placeholder salted elsewhere (e.g. on a device).
+    Costs a full check_password, so only call it for a hash that is about
+    to replace a different stored one.
+    """
+    from django.contrib.auth.hashers import check_password
+    if not encoded or not encoded.startswith(HASHED_PASSWORD_PREFIXES):
+        return False
+    try:
+        return check_password(PLACEHOLDER_PASSWORD, encoded)
+    except ValueError:  # Unknown or malformed hash
+        return False
+
+
+def enable_hash_pool():
+    """Opt this process in to hashing on a pool of SYNC_HASH_WORKERS processes."""
+    global _hash_pool_enabled
+    _hash_pool_enabled = True
+
+
+def get_hash_workers():
+    """Hashing processes for this process; 0 hashes on the calling thread."""
+    if not _hash_pool_enabled:
+        return 0
+    return max(0, getattr(settings, 'SYNC_HASH_WORKERS', 0))
+
+
+def _init_hash_worker():
+    # Spawned workers (non-fork platforms) start without configured settings
+    import django
+    django.setup()
+
+
+def _hash_password(job):
+    """Keep `current` if it already encodes `raw`, else hash `raw` afresh."""
+    from django.contrib.auth.hashers import check_password, make_password
+    raw, current = job
+    if raw == PLACEHOLDER_PASSWORD:
+        return placeholder_password_hash()
+    if current and not is_placeholder_password(current):
+        try:
+            if check_password(raw, current):
+                return current
+        except ValueError:  # Unknown or malformed stored hash
+            pass
+    return make_password(raw)
+
+
+def _get_hash_pool():
+    global _hash_pool
+    if _hash_pool is None:
+        with _hash_pool_lock:
+            if _hash_pool is None:
+                import atexit
+                from concurrent.futures import ProcessPoolExecutor
+                _hash_pool = ProcessPoolExecutor(max_workers=get_hash_workers(), initializer=_init_hash_worker)
+                atexit.register(_hash_pool.shutdown)
+    return _hash_pool
+
+
+def hash_passwords(jobs):
+    """
+    Encode a batch of (raw password, currently stored hash or None) pairs,
+    returning one encoded password per job in order. A stored hash that
+    already matches is returned as is, so re-pushing an unchanged password
+    neither rewrites the row nor logs the user out of other sessions. That
+    comparison costs as much as hashing, so it runs on the pool as well
+    when this process has one (see enable_hash_pool).
+    """
+    if not jobs:
+        return []
+    global _hash_pool
+    workers = get_hash_workers()
+    if workers <= 1:
+        return [_hash_password(job) for job in jobs]
+    pool = _get_hash_pool()
+    try:
+        return list(pool.map(_hash_password, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    except Exception as e:  # e.g. BrokenProcessPool: hash here and start a new pool next time
+        print(f"[SYNC] Password hashing pool failed, hashing {len(jobs)} passwords inline: {e}")
+        with _hash_pool_lock:
+            if _hash_pool is pool:
+                _hash_pool = None
+        pool.shutdown(wait=False)
+        return [_hash_password(job) for job in jobs]
+
+
+# ─────────────────────────────────────────────────────────────
+# PUSH DEDUP LEDGER
+# ─────────────────────────────────────────────────────────────
+
+# Keys that carry no row content: client bookkeeping and the client's own hash
+ROW_HASH_KEYS = ('_hash', 'rowHash')
+HASH_IGNORED_KEYS = {'sync_status', 'syncStatus', *ROW_HASH_KEYS}
+
+
+def row_content_hash(row):
+    """The client's row hash if it sent one, else a hash of the row's canonical JSON."""
+    for key in ROW_HASH_KEYS:
+        if row.get(key):
+            return str(row[key])[:64]
+    content = {k: v for k, v in row.items() if k not in HASH_IGNORED_KEYS}
+    canonical = json.dumps(content, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def split_unchanged(device_id, table, rows):
+    """
+    Split a chunk of raw rows into (changed_rows, unchanged_ids, hashes) against
+    the device's ledger with one query. Rows without an id are always "changed".
+    `hashes` maps row id -> content hash for record_ledger() after the write.
+    """
+    from .models import SyncLedger
+
+    hashes = {}
+    for row in rows:
+        if row.get('id') is not None:
+            hashes[str(row['id'])] = row_content_hash(row)
+    if not hashes:
+        return rows, [], hashes
+
+    known = dict(
+        SyncLedger.objects.filter(
+            device_id=device_id, table_name=table, row_id__in=list(hashes)
+        ).values_list('row_id', 'content_hash')
+    )
+
+    changed, unchanged = [], []
+    for row in rows:
+        row_id = row.get('id')
+        if row_id is not None and known.get(str(row_id)) == hashes[str(row_id)]:
+            unchanged.append(row_id)
+        else:
+            changed.append(row)
+    return changed, unchanged, hashes
+
+
+def record_ledger(device_id, table, saved_ids, hashes):
+    """Remember the hash of every row that was actually written in this chunk."""
+    from django.utils import timezone
+    from .models import SyncLedger
+
+    now = timezone.now()
+    entries = {}
+    for obj_id in saved_ids:
+        content_hash = hashes.get(str(obj_id))
+        if content_hash:
+            entries[str(obj_id)] = SyncLedger(
+                device_id=device_id, table_name=table, row_id=str(obj_id),
+                content_hash=content_hash, updated_at=now,
+            )
+    if entries:
+        SyncLedger.objects.bulk_create(
+            list(entries.values()),
+            update_conflicts=True,
+            unique_fields=['device_id', 'table_name', 'row_id'],
+            update_fields=['content_hash', 'updated_at'],
+        )
+
+
+def get_push_receipt(device_id, key):
+    """Stored response for a retried Idempotency-Key, or None if unknown or expired."""
+    from datetime import timedelta
+    from django.utils import timezone
+    from .models import PushReceipt
+
+    ttl = timedelta(hours=getattr(settings, 'SYNC_IDEMPOTENCY_TTL_HOURS', 72))
+    receipt = PushReceipt.objects.filter(
+        device_id=device_id or '', key=key, created_at__gte=timezone.now() - ttl
+    ).first()
+    return receipt.response if receipt else None
+
+
+def save_push_receipt(device_id, key, response):
+    """Store the response for `key`, dropping this device's expired receipts on the way."""
+    from datetime import timedelta
+    from django.utils import timezone
+    from .models import PushReceipt
+
+    ttl = timedelta(hours=getattr(settings, 'SYNC_IDEMPOTENCY_TTL_HOURS', 72))
+    PushReceipt.objects.filter(device_id=device_id or '', created_at__lt=timezone.now() - ttl).delete()
+    PushReceipt.objects.update_or_create(
+        device_id=device_id or '', key=key, defaults={'response': response}
+    )
+
+
+# ─────────────────────────────────────────────────────────────
+# CHANGE LOG (OUTBOX)
+# ─────────────────────────────────────────────────────────────
+
+_CHANGELOG_TABLES = {}  # model -> (pull table name, store lookup path or None for global rows)
+
+
+def connect_changelog(tables):
+    """
+    Record every save/delete of the pulled models in ChangeLog. `tables` yields
+    (table, model, store_path) where store_path is 'store_id', or None for rows
+    every store receives.
+    """
+    for table, model, store_path in tables:
+        _CHANGELOG_TABLES[model] = (table, store_path)
+        post_save.connect(_changelog_on_save, sender=model, dispatch_uid=f'changelog_save_{table}')
+        post_delete.connect(_changelog_on_delete, sender=model, dispatch_uid=f'changelog_delete_{table}')
+
+
+def _row_store_id(model, instance, store_path):
+    """Store that can see `instance`: '' for global rows, None if no store can."""
+    if store_path is None:
+        return ''
+    return getattr(instance, store_path, None)
+
+
+def _changelog_on_save(sender, instance, raw=False, **kwargs):
+    if raw:  # loaddata
+        return
+    _record_instance(sender, instance, 'upsert')
+
+
+def _changelog_on_delete(sender, instance, **kwargs):
+    _record_instance(sender, instance, 'delete')
+
+
+def _record_instance(model, instance, op):
+    from .models import ChangeLog
+
+    table, store_path = _CHANGELOG_TABLES[model]
+    try:
+        store_id = _row_store_id(model, instance, store_path)
+    except Exception as e:
+        print(f"[CHANGELOG] Could not resolve store for {table}:{instance.pk}: {e}")
+        return
+    if store_id is None:
+        return
+    entry = ChangeLog.objects.create(table_name=table, row_pk=str(instance.pk), store_id=store_id, op=op)
+    announce_changes(table, [store_id], entry.seq)
+
+
+def record_changes(model, pks, op='upsert'):
+    """
+    Bulk counterpart of the signal receivers for writes that skip signals
+    (bulk_create upserts). One query to find each row's store, one insert.
+    """
+    from .models import ChangeLog
+
+    if model not in _CHANGELOG_TABLES or not pks:
+        return
+    table, store_path = _CHANGELOG_TABLES[model]
+    if store_path is None:
+        stores = {str(pk): '' for pk in pks}
+    else:
+        stores = {
+            str(pk): store_id
+            for pk, store_id in model.objects.filter(pk__in=list(pks)).values_list('pk', store_path)
+        }
+    entries = ChangeLog.objects.bulk_create([
+        ChangeLog(table_name=table, row_pk=pk, store_id=store_id, op=op)
+        for pk, store_id in stores.items() if store_id is not None
+    ])
+    # seq is only filled in on backends that return ids from bulk inserts
+    seqs = [entry.seq for entry in entries if entry.seq is not None]
+    announce_changes(table, {entry.store_id for entry in entries}, max(seqs) if seqs else None)
+
+
+def _change_head_key(store_id):
+    return f"sync:change_head:{store_id}"
+
+
+def get_change_head(store_id):
+    """
+    (seq, created_at) of the newest ChangeLog entry for `store_id` ('' = rows
+    every store receives), or (0, None). Cached for SYNC_STATUS_CACHE_SECONDS
+    and dropped whenever that store gets a new entry, so status polls of an
+    idle store don't touch the database.
+
+    The drop only reaches the cache of the writing process. With a per-process
+    cache (the default LocMemCache) entries written by other workers show up
+    once the cached head expires, so sync/status is at most
+    SYNC_STATUS_CACHE_SECONDS behind; a shared cache (Redis, Memcached) makes
+    them visible at once. sync/pull never reads this cache.
+    """
+    from django.core.cache import cache
+    from .models import ChangeLog
+
+    key = _change_head_key(store_id)
+    head = cache.get(key)
+    if head is None:
+        head = ChangeLog.objects.filter(store_id=store_id).order_by('-seq').values_list('seq', 'created_at').first() or (0, None)
+        cache.set(key, head, getattr(settings, 'SYNC_STATUS_CACHE_SECONDS', 30))
+    return head
+
+
+def announce_changes(table, store_ids, seq=None):
+    """
+    Once the writing transaction commits: forget the cached change heads (and
+    product scan lookups, see api.search) of `store_ids` and tell their sync/events subscribers that `table` changed
+    up to `seq` (see api.events).
+    """
+    from django.core.cache import cache
+    from .events import publish_changes
+
+    store_ids = set(store_ids)
+    if not store_ids:
+        return
+
+    def committed():
+        cache.delete_many([_change_head_key(store_id) for store_id in store_ids])
+        if table in ('products', 'tax_slabs'):
+            from .search import forget_product_lookups
+            forget_product_lookups(store_ids if table == 'products' else None)
+        try:
+            for store_id in store_ids:
+                publish_changes(store_id, [table], seq)
+        except Exception as e:
+            print(f"[EVENTS] Could not publish {table} changes: {e}")
+
+    transaction.on_commit(committed)
+
+
+# ─────────────────────────────────────────────────────────────
+# PULL SNAPSHOT & WATERMARK
+# ─────────────────────────────────────────────────────────────
+
+def get_pull_workers():
+    """Threads used to pull tables in parallel; 0 or 1 keeps the sequential pull."""
+    return max(0, getattr(settings, 'SYNC_PULL_WORKERS', 0))
+
+
+@contextmanager
+def read_snapshot():
+    """
+    One transaction for everything a pull reads, so every table (and the
+    watermark) comes from the same point in time. On PostgreSQL it is
+    REPEATABLE READ, READ ONLY and its snapshot is exported for parallel
+    workers (see import_read_snapshot): yields the snapshot id. Elsewhere, or
+    when the caller is already inside a transaction whose isolation can't be
+    changed, yields None.
+    """
+    from django.db import connection
+
+    if connection.in_atomic_block:
+        yield None
+        return
+    with transaction.atomic():
+        if connection.vendor != 'postgresql':
+            yield None
+            return
+        with connection.cursor() as cursor:
+            # Must be the first statement of the transaction
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            cursor.execute("SELECT pg_export_snapshot()")
+            snapshot_id = cursor.fetchone()[0]
+        yield snapshot_id
+
+
+def import_read_snapshot(snapshot_id):
+    """Pin the transaction just opened on this thread's connection to an exported snapshot."""
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        cursor.execute("SET TRANSACTION SNAPSHOT %s", [snapshot_id])
+
+
+def get_settle_cutoff():
+    """
+    Newest moment a pull hands out as its watermark. Rows and ChangeLog
+    entries get their timestamp/seq before their transaction commits, so a
+    snapshot taken now can't see rows stamped by writers still running.
+
+    On PostgreSQL the cutoff stays before the start of the oldest open write
+    transaction (pg_stat_activity), however long it runs; the
+    SYNC_CHANGELOG_SETTLE_SECONDS margin then only absorbs clock skew
+    between app servers and the database. Elsewhere the margin alone is the
+    bound, assuming writes commit within it. Call this BEFORE read_snapshot():
+    a writer that commits between the two is then inside the snapshot.
+    """
+    from datetime import timedelta
+    from django.db import connection
+    from django.utils import timezone
+
+    horizon = timezone.now()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT min(xact_start) FROM pg_stat_activity"
+                " WHERE backend_xid IS NOT NULL AND datname = current_database() AND pid <> pg_backend_pid()"
+            )
+            oldest_writer = cursor.fetchone()[0]
+        if oldest_writer is not None and oldest_writer < horizon:
+            horizon = oldest_writer
+    return horizon - timedelta(seconds=getattr(settings, 'SYNC_CHANGELOG_SETTLE_SECONDS', 5))
+
+
+def get_sync_watermark(cutoff):
+    """
+    (change_seq, server_time) for a pull, read inside its snapshot: the highest
+    ChangeLog seq written before `cutoff`, and `cutoff` itself as an aware ISO
+    timestamp for last_sync. Both only move forward, and everything up to the
+    cutoff is committed (see get_settle_cutoff) and so in the snapshot, so
+    devices need no overlap window or periodic full resync.
+    """
+    from .models import ChangeLog
+
+    seq = ChangeLog.objects.filter(created_at__lte=cutoff).order_by('-seq').values_list('seq', flat=True).first()
+    return seq or 0, cutoff.isoformat()
+
+
+def record_device_state(device_id, store_id, stats, watermark=None, change_seq=None):
+    """
+    Upsert one DeviceSyncState row per pulled table in a single query.
+    `stats` maps table -> (row_count, duration_ms or None).
+    """
+    from django.utils import timezone
+    from django.utils.dateparse import parse_datetime
+    from .models import DeviceSyncState
+
+    if not device_id or not stats:
+        return
+    if isinstance(watermark, str):
+        watermark = parse_datetime(watermark)
+        if watermark is not None and timezone.is_naive(watermark):
+            watermark = timezone.make_aware(watermark)
+    now = timezone.now()
+    DeviceSyncState.objects.bulk_create(
+        [
+            DeviceSyncState(
+                device_id=device_id, table_name=table, store_id=store_id or '',
+                watermark=watermark, change_seq=change_seq,
+                last_row_count=row_count, last_duration_ms=duration_ms, last_pulled_at=now,
+            )
+            for table, (row_count, duration_ms) in stats.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['device_id', 'table_name'],
+        update_fields=['store_id', 'watermark', 'change_seq', 'last_row_count', 'last_duration_ms', 'last_pulled_at'],
+    )
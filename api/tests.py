@@ -1,3 +1,896 @@
-from django.test import TestCase
+import base64
+import hashlib
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .events import change_event_stream, publish_changes
+from .filters import SparseFieldsFilter, indexed_ordering_fields
+from .media import (
+    CONTENT_TYPES, MEDIA_DIR, Image as PILImage, decode_inline_image, get_media_storage, media_name, store_image,
+    thumbnail_format,
+)
+from .models import (
+    ChangeLog, Customer, Employee, Notification, Product, PushReceipt, PushSession, Store, SyncJob, SyncLedger, TaxSlab, User
+)
+from .renderers import msgpack_available, packb, unpackb
+from .search import lookup_product
+from .snapshots import build_snapshot, is_stale
+from .sync import (
+    PLACEHOLDER_PASSWORD, encodes_placeholder, get_settle_cutoff, is_placeholder_password, placeholder_password_hash
+)
+
+
+class SyncTestCase(TestCase):
+    """Authenticated API client and a store for the sync endpoint tests."""
+
+    def setUp(self):
+        self.store = Store.objects.create(id='store-1', name='Main')
+        self.admin = User.objects.create_superuser(
+            id='admin-1', username='admin', email='admin@example.com', password='admin-pass', store=self.store
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def push(self, payload, device_id='device-1', **extra):
+        return self.api.post('/api/v1/sync/push', {'payload': payload, 'deviceId': device_id}, format='json', **extra)
+
+
+# ─────────────────────────────────────────────────────────────
+# BULK UPSERT
+# ─────────────────────────────────────────────────────────────
+
+class BulkUpsertTests(SyncTestCase):
+    def customer_rows(self, count, **fields):
+        return [
+            {'id': f'cust-{i}', 'name': f'Customer {i}', 'phone': f'555-{i}', 'storeId': 'store-1', **fields}
+            for i in range(count)
+        ]
+
+    def test_push_inserts_then_updates_in_bulk(self):
+        self.assertEqual(self.push({'customers': self.customer_rows(3)}).status_code, 200)
+        response = self.push({'customers': self.customer_rows(3, area='North')}, device_id='device-2')
+
+        self.assertEqual(sorted(response.json()['synced_ids']['customers']), ['cust-0', 'cust-1', 'cust-2'])
+        self.assertEqual(Customer.objects.filter(area='North').count(), 3)
+        self.assertEqual(ChangeLog.objects.filter(table_name='customers').count(), 6)
+
+    def test_failed_bulk_chunk_is_rolled_back_before_row_by_row_retry(self):
+        with mock.patch('api.views.defer_side_effects', side_effect=RuntimeError('side effects down')):
+            response = self.push({'customers': self.customer_rows(3)})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Customer.objects.count(), 3)
+        # Only the row-by-row writes are logged; the bulk attempt left nothing behind
+        self.assertEqual(ChangeLog.objects.filter(table_name='customers').count(), 3)
+
+    def test_bad_row_only_skips_itself(self):
+        rows = self.customer_rows(2) + [{'id': 'cust-bad', 'name': 'Bad', 'storeId': 'store-1', 'creditBalance': 'lots'}]
+
+        response = self.push({'customers': rows})
+
+        self.assertEqual(sorted(response.json()['synced_ids']['customers']), ['cust-0', 'cust-1'])
+        self.assertFalse(Customer.objects.filter(pk='cust-bad').exists())
+
+
+# ─────────────────────────────────────────────────────────────
+# BATCHED SIDE EFFECTS
+# ─────────────────────────────────────────────────────────────
+
+@override_settings(SYNC_HASH_WORKERS=0)
+class BatchSideEffectTests(SyncTestCase):
+    def product_rows(self, count, quantity=0):
+        return [
+            {'id': f'prod-{i}', 'name': f'Product {i}', 'sellingPrice': 10, 'purchasePrice': 5,
+             'quantity': quantity, 'minStock': 5, 'storeId': 'store-1'}
+            for i in range(count)
+        ]
+
+    def test_pushed_customers_get_logins(self):
+        rows = [
+            {'id': f'cust-{i}', 'name': f'Customer {i}', 'phone': f'555-{i}', 'email': f'c{i}@example.com', 'storeId': 'store-1'}
+            for i in range(3)
+        ]
+
+        response = self.push({'customers': rows})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(User.objects.filter(email__in=[row['email'] for row in rows], role='user').count(), 3)
+
+    def test_out_of_stock_products_raise_one_alert_each(self):
+        rows = self.product_rows(3) + [{**self.product_rows(4)[3], 'quantity': 50}]
+
+        response = self.push({'products': rows})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            sorted(Notification.objects.values_list('title', flat=True)),
+            ['Low Stock: Product 0', 'Low Stock: Product 1', 'Low Stock: Product 2'],
+        )
+
+    def test_failed_chunk_drops_its_side_effects(self):
+        from .views import PushEndpoint
+        with mock.patch('api.views.record_ledger', side_effect=RuntimeError('ledger down')):
+            with self.assertRaises(RuntimeError):
+                PushEndpoint().ingest({'products': self.product_rows(3)}, device_id='device-1')
+
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+
+# ─────────────────────────────────────────────────────────────
+# PUSH LEDGER & RECEIPTS
+# ─────────────────────────────────────────────────────────────
+
+@override_settings(SYNC_LEDGER_RETENTION_DAYS=30, SYNC_IDEMPOTENCY_TTL_HOURS=72, SYNC_CHANGELOG_RETENTION_DAYS=30)
+class PushRetentionTests(SyncTestCase):
+    def test_prune_drops_expired_ledger_rows_and_receipts(self):
+        now = timezone.now()
+        for row_id, age in (('old', timedelta(days=31)), ('fresh', timedelta(days=1))):
+            SyncLedger.objects.create(device_id='device-1', table_name='customers', row_id=row_id, content_hash='h')
+            SyncLedger.objects.filter(row_id=row_id).update(updated_at=now - age)
+        for key, age in (('old', timedelta(hours=73)), ('fresh', timedelta(hours=1))):
+            PushReceipt.objects.create(device_id='device-2', key=key)
+            PushReceipt.objects.filter(key=key).update(created_at=now - age)
+
+        call_command('prune_changelog', stdout=StringIO())
+
+        self.assertEqual(list(SyncLedger.objects.values_list('row_id', flat=True)), ['fresh'])
+        self.assertEqual(list(PushReceipt.objects.values_list('key', flat=True)), ['fresh'])
+
+
+class IdempotentPushTests(SyncTestCase):
+    def test_retried_idempotency_key_replays_the_first_answer(self):
+        rows = [{'id': 'cust-1', 'name': 'Asha', 'phone': '1', 'storeId': 'store-1'}]
+        first = self.push({'customers': rows}, HTTP_IDEMPOTENCY_KEY='batch-1')
+        Customer.objects.filter(pk='cust-1').update(area='Edited on the server')
+
+        retry = self.push({'customers': rows}, HTTP_IDEMPOTENCY_KEY='batch-1')
+
+        self.assertTrue(retry.json()['replayed'])
+        self.assertEqual(retry.json()['synced_ids'], first.json()['synced_ids'])
+        self.assertEqual(Customer.objects.get(pk='cust-1').area, 'Edited on the server')
+
+    def test_unchanged_rows_from_the_same_device_are_not_rewritten(self):
+        rows = [{'id': f'cust-{i}', 'name': f'C{i}', 'phone': str(i), 'storeId': 'store-1'} for i in range(3)]
+        self.push({'customers': rows})
+        rows[0]['name'] = 'Renamed'
+
+        same_device = self.push({'customers': rows}).json()
+        other_device = self.push({'customers': rows}, device_id='device-2').json()
+
+        self.assertEqual((same_device['applied'], same_device['noops']), (1, 2))
+        self.assertEqual(sorted(same_device['noop_ids']['customers']), ['cust-1', 'cust-2'])
+        self.assertEqual((other_device['applied'], other_device['noops']), (3, 0))
+        self.assertEqual(Customer.objects.get(pk='cust-0').name, 'Renamed')
+
+
+# ─────────────────────────────────────────────────────────────
+# PASSWORDS
+# ─────────────────────────────────────────────────────────────
+
+@override_settings(SYNC_HASH_WORKERS=0)
+class PlaceholderPasswordTests(SyncTestCase):
+    def test_placeholder_hash_is_the_same_in_every_process(self):
+        first = placeholder_password_hash()
+        placeholder_password_hash.cache_clear()
+        self.assertEqual(placeholder_password_hash(), first)
+
+    def test_placeholder_check_is_a_string_comparison(self):
+        self.assertTrue(is_placeholder_password(placeholder_password_hash()))
+        self.assertFalse(is_placeholder_password(make_password(PLACEHOLDER_PASSWORD)))
+        self.assertFalse(is_placeholder_password(''))
+        self.assertTrue(encodes_placeholder(make_password(PLACEHOLDER_PASSWORD)))
+        self.assertFalse(encodes_placeholder(make_password('real-password')))
+
+    def test_stored_placeholders_are_normalized(self):
+        from django.apps import apps
+        from importlib import import_module
+        migration = import_module('api.migrations.0041_normalize_placeholder_passwords')
+        placeholder = User.objects.create(id='user-1', username='new', email='new@example.com', password=make_password(PLACEHOLDER_PASSWORD))
+        real = User.objects.create_user(id='user-2', username='real', email='real@example.com', password='real-password')
+
+        migration.normalize_placeholder_passwords(apps, None)
+
+        placeholder.refresh_from_db()
+        real.refresh_from_db()
+        self.assertEqual(placeholder.password, placeholder_password_hash())
+        self.assertTrue(real.check_password('real-password'))
+
+    def test_repushing_stored_hashes_runs_no_password_check(self):
+        rows = []
+        for i in range(3):
+            user = User.objects.create(
+                id=f'user-{i}', username=f'staff{i}', email=f'staff{i}@example.com',
+                password=make_password(f'password-{i}'), store=self.store
+            )
+            rows.append({
+                'id': user.id, 'username': user.username, 'email': user.email,
+                'password': user.password, 'storeId': 'store-1', 'role': 'staff',
+            })
+
+        with mock.patch('django.contrib.auth.hashers.check_password') as check_password:
+            response = self.push({'users': rows})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        check_password.assert_not_called()
+        self.assertEqual(User.objects.filter(role='staff').count(), 3)
+
+    @override_settings(SYNC_HASH_WORKERS=4)
+    def test_hash_pool_is_opt_in(self):
+        from . import sync
+        self.assertEqual(sync.get_hash_workers(), 0)
+        with mock.patch.object(sync, '_hash_pool_enabled', True):
+            self.assertEqual(sync.get_hash_workers(), 4)
+
+    def test_push_of_foreign_placeholder_keeps_real_password(self):
+        user = User.objects.create_user(
+            id='user-1', username='cashier', email='cashier@example.com', password='real-password', store=self.store
+        )
+        row = {
+            'id': 'device-user-9', 'username': 'cashier', 'email': 'cashier@example.com',
+            'password': make_password(PLACEHOLDER_PASSWORD), 'storeId': 'store-1', 'role': 'staff',
+        }
+        response = self.push({'users': [row]})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        user.refresh_from_db()
+        self.assertTrue(user.check_password('real-password'))
+        self.assertEqual(user.role, 'staff')
+
+
+# ─────────────────────────────────────────────────────────────
+# CHUNKED PUSH SESSIONS
+# ─────────────────────────────────────────────────────────────
+
+@override_settings(SYNC_HASH_WORKERS=0)
+class PushSessionTests(SyncTestCase):
+    def open_session(self):
+        response = self.api.post('/api/v1/sync/push/sessions', {'deviceId': 'device-1'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['session_id']
+
+    def push_chunk(self, session_id, seq, payload):
+        return self.api.post(f'/api/v1/sync/push/sessions/{session_id}/chunks/{seq}', {'payload': payload}, format='json')
+
+    def test_later_chunk_follows_id_remapped_by_earlier_chunk(self):
+        User.objects.create_user(id='user-1', username='cashier', email='cashier@example.com', password='x', store=self.store)
+        session_id = self.open_session()
+
+        # Chunk 0: the device's copy of the user collapses into the existing one by email
+        user_row = {'id': 'device-user-9', 'username': 'cashier', 'email': 'cashier@example.com', 'storeId': 'store-1'}
+        self.assertEqual(self.push_chunk(session_id, 0, {'users': [user_row]}).status_code, 200)
+        self.assertEqual(PushSession.objects.get(pk=session_id).id_mapping, {'device-user-9': 'user-1'})
+
+        # Chunk 1: a row pointing at the device's user id lands on the server's user
+        employee_row = {
+            'id': 'emp-1', 'userId': 'device-user-9', 'department': 'Sales', 'designation': 'Cashier',
+            'salary': '100.00', 'joiningDate': '2024-01-01', 'storeId': 'store-1',
+        }
+        response = self.push_chunk(session_id, 1, {'employees': [employee_row]})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Employee.objects.get(pk='emp-1').user_id, 'user-1')
+        self.assertFalse(User.objects.filter(pk='device-user-9').exists())
+        self.assertFalse(User.objects.filter(username__startswith='placeholder_').exists())
+
+    def test_resent_chunk_is_acknowledged_once(self):
+        session_id = self.open_session()
+        row = {'id': 'user-2', 'username': 'clerk', 'email': 'clerk@example.com', 'storeId': 'store-1'}
+        self.assertEqual(self.push_chunk(session_id, 0, {'users': [row]}).json()['status'], 'committed')
+
+        replay = self.push_chunk(session_id, 0, {'users': [row]})
+
+        self.assertEqual(replay.json()['status'], 'duplicate')
+        self.assertEqual(replay.json()['synced_ids'], {'users': ['user-2']})
+        state = self.api.get(f'/api/v1/sync/push/sessions/{session_id}').json()
+        self.assertEqual(state['acked_seqs'], [0])
+        self.assertEqual(state['next_seq'], 1)
+
+
+# ─────────────────────────────────────────────────────────────
+# ASYNC PUSH JOBS
+# ─────────────────────────────────────────────────────────────
+
+@override_settings(SYNC_JOB_TIMEOUT_SECONDS=60, SYNC_JOB_MAX_ATTEMPTS=2)
+class SyncJobTests(SyncTestCase):
+    def running_job(self, idle_seconds, attempts=1, **fields):
+        job = SyncJob.objects.create(store_id='store-1', **fields)
+        # update() skips auto_now, so the job looks idle since then
+        last_progress = timezone.now() - timedelta(seconds=idle_seconds)
+        SyncJob.objects.filter(pk=job.pk).update(
+            status='running', attempts=attempts, started_at=last_progress, updated_at=last_progress
+        )
+        return job
+
+    def test_running_job_blocks_its_store_until_stale(self):
+        self.running_job(idle_seconds=10)
+        SyncJob.objects.create(store_id='store-1')
+
+        self.assertIsNone(SyncJob.claim_next())
+
+    def test_stale_job_is_requeued_and_claimed_first(self):
+        stale = self.running_job(idle_seconds=120)
+        SyncJob.objects.create(store_id='store-1')
+
+        job = SyncJob.claim_next()
+
+        self.assertEqual(job.pk, stale.pk)
+        self.assertEqual(job.status, 'running')
+        self.assertEqual(job.attempts, 2)
+
+    def test_stale_job_out_of_attempts_fails_and_unblocks_the_store(self):
+        stale = self.running_job(idle_seconds=120, attempts=2)
+        queued = SyncJob.objects.create(store_id='store-1')
+
+        self.assertEqual(SyncJob.claim_next().pk, queued.pk)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+        self.assertIsNotNone(stale.finished_at)
+
+    def test_worker_startup_reruns_job_left_by_dead_worker(self):
+        payload = {'customers': [{'id': 'cust-1', 'name': 'Asha', 'storeId': 'store-1'}]}
+        stale = self.running_job(idle_seconds=120, payload=payload, device_id='device-1')
+
+        call_command('process_sync_jobs', '--once', stdout=StringIO())
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'completed')
+        self.assertEqual(stale.synced_ids['customers'], ['cust-1'])
+        self.assertTrue(Customer.objects.filter(pk='cust-1').exists())
+
+
+    @skipUnless(msgpack_available(), 'msgpack is not installed')
+    def test_async_msgpack_push_is_queued_and_applied(self):
+        joined = timezone.now().replace(microsecond=123456)
+        row = {'id': 'cust-1', 'name': 'Asha', 'phone': '1', 'storeId': 'store-1',
+               'joinedAt': joined, 'creditBalance': Decimal('12.50')}
+        body = packb({'payload': {'customers': [row]}, 'deviceId': 'device-1'})
+
+        response = self.api.post('/api/v1/sync/push?async=1', body, content_type='application/msgpack')
+        self.assertEqual(response.status_code, 202, response.content)
+        call_command('process_sync_jobs', '--once', stdout=StringIO())
+
+        self.assertEqual(SyncJob.objects.get().status, 'completed')
+        customer = Customer.objects.get(pk='cust-1')
+        self.assertEqual(customer.joined_at, joined)
+        self.assertEqual(customer.credit_balance, Decimal('12.50'))
+
+
+# ─────────────────────────────────────────────────────────────
+# LIST PAGINATION & SPARSE FIELDS
+# ─────────────────────────────────────────────────────────────
+
+class ListEndpointTests(SyncTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(7):
+            Product.objects.create(
+                id=f'prod-{i}', name=f'Product {i}', sku=f'SKU-{i}', barcode=None if i % 2 else f'89{i}',
+                description='Long text ' * 50, selling_price=10, purchase_price=5, store=self.store,
+            )
+
+    def walk(self, url):
+        ids = []
+        while url:
+            page = self.api.get(url).json()
+            ids += [row['id'] for row in page['results']]
+            url = page['next']
+        return ids
+
+    def test_nullable_columns_are_not_orderable(self):
+        self.assertNotIn('barcode', indexed_ordering_fields(Product))
+        self.assertIn('sku', indexed_ordering_fields(Product))
+
+    def test_every_row_once_across_cursor_pages(self):
+        for ordering in ('sku', '-name', 'barcode', '-barcode'):
+            ids = self.walk(f'/api/v1/products/?page_size=2&ordering={ordering}&fields=id')
+            self.assertEqual(sorted(ids), [f'prod-{i}' for i in range(7)], ordering)
+
+    def test_sparse_fields_defer_unrequested_text_columns(self):
+        request = self.view_request('name')
+        qs = SparseFieldsFilter().filter_queryset(request, Product.objects.all(), self.view(request))
+
+        self.assertEqual(qs.query.deferred_loading, (frozenset({'description', 'image'}), True))
+
+    def test_sparse_fields_load_everything_for_method_fields(self):
+        request = self.view_request('slug')
+        qs = SparseFieldsFilter().filter_queryset(request, Product.objects.all(), self.view(request))
+
+        self.assertEqual(qs.query.deferred_loading, (frozenset(), True))
+
+    def view_request(self, fields):
+        from rest_framework.request import Request
+        return Request(APIRequestFactory().get('/api/v1/products/', {'fields': fields}))
+
+    def view(self, request):
+        from .views import ProductViewSet
+        return ProductViewSet(request=request, format_kwarg=None, action='list')
+
+
+# ─────────────────────────────────────────────────────────────
+# PRODUCT SEARCH
+# ─────────────────────────────────────────────────────────────
+
+class ProductSearchTests(SyncTestCase):
+    def setUp(self):
+        super().setUp()
+        products = [
+            ('prod-exact', 'Chai Mix', 'TEA'),
+            ('prod-start', 'Tea Leaves', 'LV-1'),
+            ('prod-word', 'Green Tea', 'GT-1'),
+            ('prod-desc', 'Kettle', 'KT-1'),
+            ('prod-other', 'Coffee', 'CF-1'),
+        ]
+        for pk, name, sku in products:
+            Product.objects.create(
+                id=pk, name=name, sku=sku, description='Boils water for tea' if pk == 'prod-desc' else '',
+                selling_price=10, purchase_price=5, store=self.store,
+            )
+        for i in range(4):
+            Product.objects.create(id=f'prod-tea-{i}', name=f'Tea Bag {i}', sku=f'TB-{i}', selling_price=1, purchase_price=1, store=self.store)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            page = self.api.get(url).json()
+            ids += [row['id'] for row in page['results']]
+            url = page['next']
+        return ids
+
+    @skipUnless(connection.vendor != 'postgresql', 'exercises the non-PostgreSQL fallback')
+    def test_fallback_ranks_and_pages_with_the_cursor(self):
+        ids = self.walk('/api/v1/products/?search=tea&page_size=2&fields=id')
+
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(ids[0], 'prod-exact')
+        self.assertEqual(set(ids[1:6]), {'prod-start', *(f'prod-tea-{i}' for i in range(4))})
+        self.assertEqual(ids[6:], ['prod-word', 'prod-desc'])
+
+    def test_every_word_must_match(self):
+        ids = self.walk('/api/v1/products/?search=green%20tea&fields=id')
+
+        self.assertEqual(ids, ['prod-word'])
+
+
+# ─────────────────────────────────────────────────────────────
+# PRODUCT SCAN LOOKUP
+# ─────────────────────────────────────────────────────────────
+
+class ProductLookupTests(SyncTestCase):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.slab = TaxSlab.objects.create(id='tax-1', name='GST 5', percentage=Decimal('5.00'))
+        self.product = Product.objects.create(
+            id='prod-1', name='Tea', sku='TEA-1', barcode='8901', selling_price=Decimal('20.00'),
+            purchase_price=10, quantity=5, tax_slab=self.slab, store=self.store,
+        )
+
+    def test_hit_is_served_from_the_cache(self):
+        self.assertEqual(lookup_product('8901', 'store-1')[0], 'barcode')
+        with self.assertNumQueries(0):
+            match, product = lookup_product('8901', 'store-1')
+
+        self.assertEqual(match, 'barcode')
+        self.assertEqual((product['id'], product['selling_price'], product['tax_percentage']), ('prod-1', '20.00', '5.00'))
+
+    def test_miss_is_cached_until_a_product_is_saved(self):
+        self.assertEqual(lookup_product('8902', 'store-1'), (None, None))
+        with self.assertNumQueries(0):
+            self.assertEqual(lookup_product('8902', 'store-1'), (None, None))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(id='prod-2', name='Coffee', barcode='8902', selling_price=30, purchase_price=15, store=self.store)
+
+        self.assertEqual(lookup_product('8902', 'store-1')[1]['id'], 'prod-2')
+        response = self.api.get('/api/v1/products/lookup/', {'code': 'nope', 'store_id': 'store-1'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_product_save_invalidates(self):
+        lookup_product('8901', 'store-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.selling_price = Decimal('25.00')
+            self.product.save()
+
+        self.assertEqual(lookup_product('8901', 'store-1')[1]['selling_price'], '25.00')
+
+    def test_tax_slab_save_invalidates(self):
+        lookup_product('8901', 'store-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.slab.percentage = Decimal('12.00')
+            self.slab.save()
+
+        self.assertEqual(lookup_product('8901', 'store-1')[1]['tax_percentage'], '12.00')
+
+
+# ─────────────────────────────────────────────────────────────
+# WIRE FORMATS
+# ─────────────────────────────────────────────────────────────
+
+@skipUnless(msgpack_available(), 'msgpack is not installed')
+class MessagePackTests(SyncTestCase):
+    def test_decimals_round_trip_exactly(self):
+        self.assertEqual(unpackb(packb({'total': Decimal('1234567.89')})), {'total': '1234567.89'})
+
+    def test_pull_sends_the_same_money_values_as_json(self):
+        Product.objects.create(
+            id='prod-1', name='Rice', sku='RICE', selling_price=Decimal('1999999.99'),
+            purchase_price=Decimal('0.10'), store=self.store,
+        )
+        body = {'store_id': 'store-1'}
+
+        as_json = self.api.post('/api/v1/sync/pull', body, format='json').json()
+        as_msgpack = unpackb(self.api.post('/api/v1/sync/pull', body, format='json', HTTP_ACCEPT='application/msgpack').content)
+
+        json_row, = as_json['updates']['products']
+        msgpack_row, = as_msgpack['updates']['products']
+        for key in ('selling_price', 'purchase_price'):
+            self.assertEqual(msgpack_row[key], json_row[key])
+        self.assertEqual(json_row['selling_price'], '1999999.99')
+
+
+# ─────────────────────────────────────────────────────────────
+# MEDIA STORE
+# ─────────────────────────────────────────────────────────────
+
+class MediaTestCase(SyncTestCase):
+    """Media storage in a temporary directory."""
+
+    def setUp(self):
+        super().setUp()
+        import shutil
+        import tempfile
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        storage = override_settings(STORAGES={
+            **settings.STORAGES,
+            'media': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': root}},
+        })
+        storage.enable()
+        self.addCleanup(storage.disable)
+        self.storage = get_media_storage()
+
+    def stored_names(self, directory):
+        names = []
+        for sub in self.storage.listdir(directory)[0]:
+            names += [f'{directory}/{sub}/{name}' for name in self.storage.listdir(f'{directory}/{sub}')[1]]
+        return names
+
+
+class MediaStoreTests(MediaTestCase):
+    # Only the magic bytes matter to the store
+    PNG = b'\x89PNG\r\n\x1a\n' + bytes(range(256))
+
+    def product_row(self, pk, image):
+        return {'id': pk, 'name': pk, 'sellingPrice': 10, 'purchasePrice': 5, 'quantity': 50, 'storeId': 'store-1', 'image': image}
+
+    def test_same_bytes_are_stored_once(self):
+        encoded = base64.b64encode(self.PNG).decode()
+        rows = [self.product_row('prod-1', f'data:image/png;base64,{encoded}'), self.product_row('prod-2', encoded)]
+
+        self.assertEqual(self.push({'products': rows}).status_code, 200)
+
+        digest = hashlib.sha256(self.PNG).hexdigest()
+        urls = set(Product.objects.values_list('image', flat=True))
+        self.assertEqual(len(urls), 1)
+        self.assertEqual(self.stored_names(MEDIA_DIR), [f'{MEDIA_DIR}/{digest[:2]}/{digest}.png'])
+        response = self.api.get(urls.pop())
+        self.assertEqual(b''.join(response.streaming_content), self.PNG)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_base64_that_is_not_an_image_is_left_alone(self):
+        text = base64.b64encode(b'just some text, not an image ' * 8).decode()
+
+        self.assertIsNone(decode_inline_image(text))
+        self.assertEqual(self.push({'products': [self.product_row('prod-1', text)]}).status_code, 200)
+        self.assertEqual(Product.objects.get().image, text)
+        self.assertFalse(self.storage.exists(MEDIA_DIR))
+
+
+@skipUnless(PILImage is not None, 'Pillow is not installed')
+class ThumbnailTests(MediaTestCase):
+    def store_png(self, size=(1000, 500)):
+        out = BytesIO()
+        PILImage.new('RGB', size, (200, 30, 30)).save(out, 'PNG')
+        return media_name(store_image(out.getvalue(), 'png'))
+
+    def thumbnail(self, variant, name):
+        return self.api.get(f'/api/v1/media/thumbs/{variant}/{name}')
+
+    def test_thumbnail_is_resized_and_stored(self):
+        name = self.store_png()
+
+        response = self.thumbnail('grid', name)
+
+        self.assertEqual(response.status_code, 200)
+        ext = thumbnail_format()
+        self.assertEqual(response['Content-Type'], CONTENT_TYPES[ext])
+        image = PILImage.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual((image.format, image.size), ({'webp': 'WEBP', 'jpg': 'JPEG'}[ext], (320, 160)))
+        digest = name.rsplit('/', 1)[1].split('.')[0]
+        self.assertTrue(self.storage.exists(f'thumbs/grid/{digest[:2]}/{digest}.{ext}'))
+
+    def test_undecodable_image_serves_the_original(self):
+        data = b'\x89PNG\r\n\x1a\n' + b'not really a png' * 16
+        name = media_name(store_image(data, 'png'))
+
+        response = self.thumbnail('cart', name)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(b''.join(response.streaming_content), data)
+
+    def test_unknown_variant_or_name_is_not_found(self):
+        name = self.store_png()
+
+        self.assertEqual(self.thumbnail('huge', name).status_code, 404)
+        self.assertEqual(self.thumbnail('grid', 'images/../../settings.py').status_code, 404)
+
+
+# ─────────────────────────────────────────────────────────────
+# SYNC PULL
+# ─────────────────────────────────────────────────────────────
+
+class PullTestCase(SyncTestCase):
+    def pull(self, **body):
+        response = self.api.post('/api/v1/sync/pull', {'store_id': 'store-1', **body}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def create_customers(self, count):
+        for i in range(count):
+            Customer.objects.create(id=f'cust-{i}', name=f'C{i}', phone=str(i), store=self.store)
+
+
+class CursorPullTests(PullTestCase):
+    def test_cursor_pages_return_every_row_once(self):
+        self.create_customers(7)
+        # Ties on the delta column: the cursor must fall back on the pk
+        Customer.objects.update(updated_at=timezone.now() - timedelta(minutes=5))
+
+        seen, cursors, pages = [], {}, 0
+        while True:
+            page = self.pull(page_size=3, cursors=cursors)
+            seen += [row['id'] for row in page['updates'].get('customers', [])]
+            cursors = page['cursors']
+            pages += 1
+            if not page['has_more']['customers']:
+                break
+
+        self.assertEqual(sorted(seen), [f'cust-{i}' for i in range(7)])
+        self.assertEqual(pages, 3)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.api.post(
+            '/api/v1/sync/pull', {'store_id': 'store-1', 'page_size': 3, 'cursors': {'customers': 'garbage'}}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ChangeLogPullTests(PullTestCase):
+    def test_changelog_keeps_write_order(self):
+        self.create_customers(2)
+        Customer.objects.get(pk='cust-0').save()
+        Customer.objects.get(pk='cust-1').delete()
+
+        entries = list(ChangeLog.objects.filter(table_name='customers').order_by('seq').values_list('row_pk', 'op'))
+
+        self.assertEqual(entries, [
+            ('cust-0', 'upsert'), ('cust-1', 'upsert'), ('cust-0', 'upsert'), ('cust-1', 'delete'),
+        ])
+
+    @override_settings(SYNC_CHANGELOG_SETTLE_SECONDS=0)
+    def test_changes_since_seq_pages_through_the_log(self):
+        start = ChangeLog.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+        self.create_customers(3)
+        Customer.objects.get(pk='cust-2').delete()
+
+        first = self.pull(since_seq=start, page_size=2)
+        self.assertTrue(first['more'])
+        self.assertEqual([row['id'] for row in first['updates']['customers']], ['cust-0', 'cust-1'])
+
+        second = self.pull(since_seq=first['change_seq'], page_size=2)
+        self.assertFalse(second['more'])
+        self.assertEqual(second['deletes'], {'customers': ['cust-2']})
+        self.assertNotIn('customers', second['updates'])
+
+        caught_up = self.pull(since_seq=second['change_seq'])
+        self.assertEqual(caught_up['change_seq'], second['change_seq'])
+        self.assertEqual(caught_up['updates'], {})
+
+
+class WatermarkTests(PullTestCase):
+    @override_settings(SYNC_CHANGELOG_SETTLE_SECONDS=300)
+    def test_unsettled_changes_wait_for_a_later_pull(self):
+        start = ChangeLog.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+        self.create_customers(2)
+
+        page = self.pull(since_seq=start)
+
+        self.assertEqual(page['change_seq'], start)
+        self.assertEqual(page['updates'], {})
+        self.assertLessEqual(parse_datetime(page['server_time']), timezone.now() - timedelta(seconds=299))
+
+    @override_settings(SYNC_CHANGELOG_SETTLE_SECONDS=0)
+    def test_full_pull_watermark_covers_what_it_returned(self):
+        self.create_customers(2)
+
+        page = self.pull()
+
+        self.assertEqual(page['change_seq'], ChangeLog.objects.order_by('-seq').values_list('seq', flat=True).first())
+        self.assertEqual(sorted(row['id'] for row in page['updates']['customers']), ['cust-0', 'cust-1'])
+
+
+@override_settings(
+    SYNC_STATUS_CACHE_SECONDS=30, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+)
+class SyncStatusTests(PullTestCase):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.start = ChangeLog.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+
+    def status(self):
+        response = self.api.get('/api/v1/sync/status', {'store_id': 'store-1', 'since_seq': self.start})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_writes_in_this_process_show_up_at_once(self):
+        self.assertFalse(self.status()['changed'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_customers(1)
+
+        self.assertTrue(self.status()['changed'])
+
+    def test_writes_elsewhere_show_up_within_the_cache_ttl(self):
+        import time
+        self.assertFalse(self.status()['changed'])
+        # Written by another worker: this process's cached head is not dropped
+        ChangeLog.objects.create(table_name='customers', row_pk='cust-9', store_id='store-1', op='upsert')
+
+        self.assertFalse(self.status()['changed'])
+        later = time.time() + 31
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertTrue(self.status()['changed'])
+
+
+@override_settings(SYNC_CHANGELOG_SETTLE_SECONDS=0, SYNC_SNAPSHOT_COMPRESSION='gzip')
+class BootstrapSnapshotTests(PullTestCase):
+    def setUp(self):
+        super().setUp()
+        import shutil
+        import tempfile
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        snapshot_dir = override_settings(SYNC_SNAPSHOT_DIR=directory)
+        snapshot_dir.enable()
+        self.addCleanup(snapshot_dir.disable)
+        self.create_customers(3)
+
+    def read_lines(self, snapshot):
+        import gzip
+        import json
+        with gzip.open(snapshot.file_path, 'rt', encoding='utf-8') as lines:
+            return [json.loads(line) for line in lines]
+
+    def test_snapshot_holds_the_store_as_of_its_change_seq(self):
+        snapshot = build_snapshot('store-1')
+
+        lines = self.read_lines(snapshot)
+        self.assertEqual(lines[0]['type'], 'header')
+        self.assertEqual(lines[0]['change_seq'], ChangeLog.objects.order_by('-seq').values_list('seq', flat=True).first())
+        self.assertEqual(snapshot.change_seq, lines[0]['change_seq'])
+        self.assertEqual(sorted(line['row']['id'] for line in lines if line.get('table') == 'customers'), ['cust-0', 'cust-1', 'cust-2'])
+        self.assertEqual((lines[-1]['type'], lines[-1]['row_counts']['customers']), ('end', 3))
+        self.assertEqual(snapshot.row_count, len(lines) - 2)
+
+        response = self.api.get('/api/v1/sync/snapshot', {'store_id': 'store-1'})
+        self.assertEqual(response['X-Snapshot-Id'], snapshot.id)
+
+    @override_settings(SYNC_SNAPSHOT_REBUILD_CHANGES=2)
+    def test_snapshot_goes_stale_after_enough_changes(self):
+        snapshot = build_snapshot('store-1')
+        self.assertFalse(is_stale(snapshot))
+
+        Customer.objects.create(id='cust-8', name='C8', phone='8', store=self.store)
+        self.assertFalse(is_stale(snapshot))
+        Customer.objects.create(id='cust-9', name='C9', phone='9', store=self.store)
+        self.assertTrue(is_stale(snapshot))
+
+    def test_snapshot_goes_stale_with_age(self):
+        snapshot = build_snapshot('store-1')
+
+        snapshot.created_at -= timedelta(hours=25)
+        self.assertTrue(is_stale(snapshot))
+
+
+@override_settings(SYNC_CHANGELOG_SETTLE_SECONDS=0)
+class ChangeEventStreamTests(PullTestCase):
+    def stream(self, action, since_seq=None, events=1):
+        """The first `events` messages the stream sends once `action` ran (in this thread)."""
+        import asyncio
+        from asgiref.sync import async_to_sync, sync_to_async
+
+        async def run():
+            stream = change_event_stream('store-1', since_seq)
+            self.assertEqual(await stream.__anext__(), 'retry: 5000\n\n')  # Subscribed from here on
+            await sync_to_async(action)()
+            try:
+                return [await asyncio.wait_for(stream.__anext__(), 5) for _ in range(events)]
+            finally:
+                await stream.aclose()
+        return async_to_sync(run)()
+
+    def event_data(self, event):
+        import json
+        return json.loads(event.rsplit('data: ', 1)[1])
+
+    def test_committed_change_is_announced(self):
+        def save():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.create_customers(1)
+
+        [event] = self.stream(save)
+
+        seq = ChangeLog.objects.order_by('-seq').values_list('seq', flat=True).first()
+        self.assertTrue(event.startswith(f'id: {seq}\nevent: changes\n'))
+        self.assertEqual(self.event_data(event), {'store_id': 'store-1', 'tables': ['customers'], 'seq': seq})
+
+    @override_settings(SYNC_CHANGELOG_SETTLE_SECONDS=0.05)
+    def test_burst_is_merged_into_one_message(self):
+        def burst():
+            publish_changes('store-1', ['sales'], 7)
+            publish_changes('', ['tax_slabs'], 9)
+            publish_changes('store-2', ['products'], 8)
+
+        [event] = self.stream(burst)
+
+        self.assertEqual(self.event_data(event), {'store_id': 'store-1', 'tables': ['sales', 'tax_slabs'], 'seq': 9})
+
+    def test_reconnect_reports_missed_changes(self):
+        start = ChangeLog.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+        self.create_customers(2)
+
+        [event] = self.stream(lambda: None, since_seq=start)
+
+        self.assertEqual(self.event_data(event)['tables'], ['customers'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'pg_stat_activity is PostgreSQL only')
+class SettleCutoffPostgresTests(TransactionTestCase):
+    def test_cutoff_stays_behind_an_open_write_transaction(self):
+        import threading
+
+        started, release = threading.Event(), threading.Event()
+
+        def long_push():
+            with transaction.atomic():
+                Store.objects.create(id='store-long', name='Long push')
+                started.set()
+                release.wait(10)
+            connection.close()
+
+        writer = threading.Thread(target=long_push)
+        writer.start()
+        started.wait(10)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT min(xact_start) FROM pg_stat_activity WHERE backend_xid IS NOT NULL")
+                writer_start = cursor.fetchone()[0]
+            self.assertLessEqual(get_settle_cutoff(), writer_start)
+        finally:
+            release.set()
+            writer.join()
@@ -1,7 +1,8 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 from .views import (
-    PushEndpoint, PullEndpoint, EmployeeViewSet, AttendanceViewSet, 
+    PushEndpoint, PullEndpoint, SyncJobStatusView, DeviceSyncStateView, EmployeeViewSet,
+    PushSessionView, PushChunkView, PushSessionCompleteView, SnapshotView, SyncStatusView, sync_events, AttendanceViewSet, 
     LeaveViewSet, PayrollViewSet, PerformanceReviewViewSet, health_check, db_diagnostic,
     SupplierViewSet, SupplierCustomFieldViewSet, 
     SupplierCustomFieldValueViewSet, SupplierTransactionViewSet,
@@ -12,7 +13,7 @@ from .views import (
     ReviewViewSet, FeedbackViewSet, CartViewSet, get_profile, CartItemViewSet,
     OnlineOrderViewSet, OnlineReturnViewSet, OnlineReportViewSet, verify_email,
     SaleReturnViewSet, NotificationViewSet,
-    LicenseVerifyView, EnabledFeaturesView
+    LicenseVerifyView, EnabledFeaturesView, media_file, media_thumbnail
 )
 
 from .serializers import CustomTokenObtainPairView
@@ -54,8 +55,19 @@ router.register(r'store/cart', CartViewSet, basename='cart')
 urlpatterns = [
     path('sync/push', PushEndpoint.as_view(), name='sync-push'),
     path('sync/pull', PullEndpoint.as_view(), name='sync-pull'),
+    path('sync/status', SyncStatusView.as_view(), name='sync-status'),
+    path('sync/events', sync_events, name='sync-events'),
+    path('sync/snapshot', SnapshotView.as_view(), name='sync-snapshot'),
+    path('sync/jobs/<str:job_id>', SyncJobStatusView.as_view(), name='sync-job-status'),
+    path('sync/devices', DeviceSyncStateView.as_view(), name='sync-device-state'),
+    path('sync/push/sessions', PushSessionView.as_view(), name='sync-push-session-open'),
+    path('sync/push/sessions/<str:session_id>', PushSessionView.as_view(), name='sync-push-session'),
+    path('sync/push/sessions/<str:session_id>/chunks/<int:seq>', PushChunkView.as_view(), name='sync-push-chunk'),
+    path('sync/push/sessions/<str:session_id>/complete', PushSessionCompleteView.as_view(), name='sync-push-session-complete'),
     path('diagnostic/', db_diagnostic, name='diagnostic'),
     path('health', health_check, name='health'),
+    path('media/thumbs/<str:variant>/<path:name>', media_thumbnail, name='media-thumbnail'),
+    path('media/<path:name>', media_file, name='media-file'),
     path('db-diagnostic', db_diagnostic, name='db-diagnostic'),
     
     # Auth
@@ -17,11 +17,22 @@ from .models import (
     GiftCard, SalePayment, WorkOrder, Delivery, DeliveryZone,
     Invoice, InvoiceItem, Cheque, Category,
     OnlineReturn, SaleReturn, Notification, UserPermission,
-    OnlineOrder, OnlineOrderItem
+    OnlineOrder, OnlineOrderItem, SyncJob, PushSession, PushChunk
 )
 from django.db.models import Sum, Count, F, Q
+from .sync import (
+    bulk_upsert, camel_to_snake, chunked, get_push_chunk_size, get_schema,
+    has_save_side_effects, get_push_receipt, record_ledger, save_push_receipt,
+    split_unchanged, InvalidCursor, decode_cursor, encode_cursor, get_pull_page_size,
+    record_changes, get_pull_workers, import_read_snapshot, read_snapshot,
+    get_settle_cutoff, get_sync_watermark, record_device_state, get_change_head,
+    bulk_sync, defer_side_effects, encodes_placeholder, hash_passwords, is_placeholder_password,
+    placeholder_password_hash, HASHED_PASSWORD_PREFIXES
+)
 
 
+from .media import externalize_rows
+from .renderers import sync_parser_classes, sync_renderer_classes, to_json_types, wants_native_types
 from .serializers import (
     EmployeeSerializer, AttendanceSerializer, LeaveSerializer, 
     PayrollSerializer, PerformanceReviewSerializer,
@@ -61,6 +72,63 @@ def health_check(request):
         "roles": [c[0] for c in User._meta.get_field('role').choices]
     })
 
+def media_response(request, name, content_type, etag):
+    """An immutable media store file, or 304 when the client already has it."""
+    from django.http import FileResponse, HttpResponse, HttpResponseNotFound
+    from .media import get_media_storage
+
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=304)
+    else:
+        storage = get_media_storage()
+        if not storage.exists(name):
+            return HttpResponseNotFound()
+        response = FileResponse(storage.open(name, 'rb'), content_type=content_type)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response['X-Content-Type-Options'] = 'nosniff'
+    if content_type == 'image/svg+xml':
+        # SVG can carry scripts; never let it run as a document on this origin
+        response['Content-Security-Policy'] = "default-src 'none'; style-src 'unsafe-inline'; sandbox"
+    return response
+
+def media_file(request, name):
+    """
+    GET media/<name>: an image from the content-addressed media store (see
+    api.media). Names are content hashes, so responses are cacheable forever.
+    """
+    from django.http import HttpResponseNotAllowed, HttpResponseNotFound
+    from .media import CONTENT_TYPES, MEDIA_NAME
+
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    if not MEDIA_NAME.match(name):
+        return HttpResponseNotFound()
+    digest, ext = name.rsplit('/', 1)[1].split('.')
+    return media_response(request, name, CONTENT_TYPES[ext], f'"{digest}"')
+
+def media_thumbnail(request, variant, name):
+    """
+    GET media/thumbs/<variant>/<name>: a cart/grid/detail sized copy of a
+    media store image, rendered on the first request and stored for the next.
+    """
+    from django.http import HttpResponseNotAllowed, HttpResponseNotFound
+    from .media import MEDIA_NAME, THUMBNAIL_SIZES, get_thumbnail, thumbnail_format
+
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    if variant not in THUMBNAIL_SIZES or not MEDIA_NAME.match(name):
+        return HttpResponseNotFound()
+    digest = name.rsplit('/', 1)[1].split('.')[0]
+    # Checked before rendering so revalidations never touch the image
+    etag = f'"{digest}-{variant}-{thumbnail_format()}"'
+    if request.headers.get('If-None-Match') == etag:
+        return media_response(request, name, None, etag)
+    thumb, content_type = get_thumbnail(variant, name)
+    if thumb == name:
+        etag = f'"{digest}"'  # Served the original
+    return media_response(request, thumb, content_type, etag)
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def db_diagnostic(request):
@@ -165,434 +233,105 @@ def make_aware_if_naive(value):
 class PushEndpoint(APIView):
     permission_classes = [AllowBootstrapSync | permissions.IsAuthenticated]
 
+    # Order matters for Foreign Keys
+    ORDER = [
+        'stores',
+        'users',
+        'accounts',
+        'categories',
+        'expense_categories',
+        'tax_slabs',
+        'customers',
+        'payment_terms',
+        'suppliers',
+        'supplier_custom_fields',
+        'supplier_custom_values',
+        'products',
+        'quotations',
+        'sales',
+        'purchases',
+        'sale_payments',  # Added
+        'supplier_transactions',
+        'supplier_documents',
+        'purchase_orders',
+        'stock_transfers',
+        'transactions',
+        'stock_logs',
+        'loyalty_points',
+        'commissions',
+        'receivings',
+        'receiving_items',
+        'invoices',
+        'invoice_items',
+        'cheques',
+        'employees',
+        'attendance',
+        'leaves',
+        'payroll',
+        'performance_reviews',
+        'shifts',
+        'product_images',
+        'key_features',
+        'online_orders', # Added
+        'online_order_items', # Added
+        'online_returns', # Added
+        'sale_returns', # Added
+        'notifications', # Added
+        'gift_cards', # Added
+        'work_orders', # Added
+        'deliveries', # Added
+        'delivery_zones', # Added
+    ]
+
+    parser_classes = sync_parser_classes()
+    renderer_classes = sync_renderer_classes()
+
+    # Tables that match existing records by something other than the primary key
+    # (users by email, employees by user) and therefore can't be bulk upserted.
+    ROW_BY_ROW_TABLES = {'users', 'employees'}
+
     def post(self, request):
         data = request.data
         payload = data.get('payload', {})
         print(f"SYNC PUSH RECEIVED: Payload keys: {list(payload.keys())}")
-        if 'products' in payload:
-            print(f"SYNC PUSH PRODUCTS: {payload['products']}")
-        
-        device_id = data.get('deviceId')
-        
-        # Order matters for Foreign Keys
-        ORDER = [
-            'stores', 
-            'users', 
-            'accounts', 
-            'categories',
-            'expense_categories',
-            'tax_slabs',
-            'customers', 
-            'payment_terms',
-            'suppliers',
-            'supplier_custom_fields',
-            'supplier_custom_values',
-            'products', 
-            'quotations',
-            'sales', 
-            'purchases', 
-            'sale_payments',  # Added
-            'supplier_transactions',
-            'supplier_documents',
-            'purchase_orders',
-            'stock_transfers',
-            'transactions', 
-            'stock_logs',
-            'loyalty_points',
-            'commissions',
-            'receivings',
-            'receiving_items',
-            'invoices',
-            'invoice_items',
-            'cheques',
-            'employees',
-            'attendance',
-            'leaves',
-            'payroll',
-            'performance_reviews',
-            'shifts',
-            'product_images',
-            'key_features',
-            'online_orders', # Added
-            'online_order_items', # Added
-            'online_returns', # Added
-            'sale_returns', # Added
-            'notifications', # Added
-            'gift_cards', # Added
-            'work_orders', # Added
-            'deliveries', # Added
-            'delivery_zones', # Added
-        ]
 
+        device_id = data.get('deviceId')
 
-        synced_ids = {table: [] for table in ORDER}
-        id_mapping = {}  # Map incoming ID -> existing server ID for collisions
-
+        # A retried batch with the same key gets the original answer back
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotencyKey')
+        if idempotency_key:
+            receipt = get_push_receipt(device_id, idempotency_key)
+            if receipt is not None:
+                print(f"SYNC PUSH REPLAYED: Idempotency-Key {idempotency_key} already processed")
+                return Response({**receipt, "replayed": True}, status=receipt.get("http_status", status.HTTP_200_OK))
+
+        if request.query_params.get('async') in ['1', 'true']:
+            response = self.enqueue(request, payload, device_id)
+            if idempotency_key:
+                save_push_receipt(device_id, idempotency_key, {**response.data, "http_status": response.status_code})
+            return response
+
+        force = request.query_params.get('force') in ['1', 'true']
         try:
-            with transaction.atomic():
-                for table in ORDER:
-                    if table not in payload:
-                        continue
-                    
-                    rows = payload[table]
-                    model = self.get_model(table)
-                    if not model:
-                        print(f"DEBUG: Model NOT FOUND for table {table}")
-                        continue
-                    
-                    print(f"DEBUG: Processing {len(rows)} rows for table {table}")
-
-                    for row in rows:
-                        obj_id = row.get('id', 'unknown')
-                        try:
-                            # Use nested transaction to allow skipping single row failures
-                            with transaction.atomic():
-                                # 1. Convert camelCase to snake_case for all keys
-                                row_data = {}
-                                for k, v in row.items():
-                                    if k == 'sync_status': continue
-                                    # Convert camelCase to snake_case
-                                    snake_key = ''.join(['_' + c.lower() if c.isupper() else c for c in k]).lstrip('_')
-                                    row_data[snake_key] = v
-                                
-                                # Ensure password is handled correctly
-                                if table == 'users':
-                                    incoming_password = row_data.get('password')
-                                    is_new_user = not User.objects.filter(email=row_data.get('email')).exists()
-                                    
-                                    if not incoming_password:
-                                        if is_new_user:
-                                            from django.contrib.auth.hashers import make_password
-                                            row_data['password'] = make_password('ChangeMe123!')
-                                        else:
-                                            # For existing users, if password is not provided, don't update it
-                                            row_data.pop('password', None)
-                                    elif not incoming_password.startswith(('pbkdf2_', 'bcrypt', '$2b$', '$2a$', 'argon2')):
-                                        # Only hash if it's plain text and not a placeholder
-                                        if incoming_password not in ['', '********']:
-                                            from django.contrib.auth.hashers import make_password
-                                            row_data['password'] = make_password(incoming_password)
-                                        else:
-                                            row_data.pop('password', None)
-
-                                # Debug logging
-                                if table in ['users', 'products', 'customers', 'sales']:
-                                    print(f"SYNCING {table.upper()}: {row_data.get('id')} | Deleted: {row_data.get('is_deleted')} | Email/Name: {row_data.get('email') or row_data.get('name')}")
-                                       
-                                if 'email' in row_data and not row_data.get('username'):
-                                    row_data['username'] = row_data['email']
-
-                                # Normalize roles: only for users
-                                if table == 'users':
-                                    valid_roles = [c[0] for c in model._meta.get_field('role').choices]
-                                    if row_data.get('role') not in valid_roles:
-                                        row_data['role'] = 'staff'
-                                    
-                                    if 'is_active' not in row_data:
-                                        row_data['is_active'] = True
-                                    
-                                    row_data['is_verified'] = True
-                                    
-                                    incoming_role = (row_data.get('role') or 'user').lower()
-                                    if incoming_role in ['admin', 'super_admin']:
-                                        row_data['is_staff'] = True
-                                        row_data['is_superuser'] = True
-                                elif table == 'employees':
-                                    row_data['is_verified'] = True
-
-                                if 'name' in row_data:
-                                    name_parts = row_data['name'].split(' ', 1)
-                                    row_data['first_name'] = name_parts[0]
-                                    row_data['last_name'] = name_parts[1] if len(name_parts) > 1 else ''
-
-                                valid_fields = {f.name for f in model._meta.get_fields() if not (f.is_relation and not f.concrete)}
-                                valid_fields.update({getattr(f, 'attname', None) for f in model._meta.get_fields()})
-                                
-                                cleaned_data = {}
-                                for k, v in row_data.items():
-                                    if k not in valid_fields:
-                                        continue
-                                    
-                                    field_obj = next((f for f in model._meta.get_fields() if f.name == k or getattr(f, 'attname', None) == k), None)
-                                    
-                                    # SKIP auto_now / auto_now_add — Django manages these, passing values causes RuntimeWarning
-                                    if field_obj and (getattr(field_obj, 'auto_now', False) or getattr(field_obj, 'auto_now_add', False)):
-                                        continue
-                                    
-                                    # If it's a relationship, use the attname (e.g. category_id) for assignment
-                                    effective_key = k
-                                    if field_obj and field_obj.is_relation and field_obj.concrete:
-                                        effective_key = getattr(field_obj, 'attname', k)
-
-                                    is_nullable = getattr(field_obj, 'null', False)
-                                    internal_type = field_obj.get_internal_type() if field_obj else ""
-
-                                    if v == "" or v is None:
-                                        if is_nullable:
-                                            cleaned_data[effective_key] = None
-                                        elif internal_type in ['CharField', 'TextField']:
-                                            cleaned_data[effective_key] = ""
-                                        else:
-                                            cleaned_data[effective_key] = v
-                                    # Hardened Datetime Handling
-                                    if internal_type in ['DateTimeField', 'DateField', 'TimeField']:
-                                        v = make_aware_if_naive(v)
-                                        if internal_type == 'DateField' and isinstance(v, datetime):
-                                            v = v.date()
-                                        elif internal_type == 'TimeField' and isinstance(v, datetime):
-                                            v = v.time()
-                                    
-                                    cleaned_data[effective_key] = v
-                                
-                                if table == 'users':
-                                    if cleaned_data.get('first_name') is None: cleaned_data['first_name'] = ""
-                                    if cleaned_data.get('last_name') is None: cleaned_data['last_name'] = ""
-                                
-                                obj_id = cleaned_data.pop('id')
-                                
-                                # PROACTIVE FK VALIDATION & MAPPING
-                                from django.db import IntegrityError
-                                relationships = [f for f in model._meta.get_fields() if f.is_relation and f.concrete]
-                                for rel in relationships:
-                                    fk_field = getattr(rel, 'attname', None)
-                                    if not fk_field: continue
-                                    fk_value = cleaned_data.get(fk_field)
-                                    if isinstance(fk_value, str):
-                                        fk_value = fk_value.strip()
-                                        cleaned_data[fk_field] = fk_value
-                                    
-                                    print(f"DEBUG: Checking FK {table}.{fk_field} = {fk_value}")
-                                    # Try to resolve ID via mapping first
-                                    if fk_value in id_mapping:
-                                        print(f"[SYNC] Translating FK {fk_field}: {fk_value} -> {id_mapping[fk_value]}")
-                                        fk_value = id_mapping[fk_value]
-                                        cleaned_data[fk_field] = fk_value
-
-                                    # Validation: check if FK exists on server
-                                    if fk_value and not rel.related_model.objects.filter(id=fk_value).exists():
-                                        target_model = rel.related_model
-                                        potential_match = None
-                                        
-                                        # Special case for Users: match by email or username first
-                                        if target_model == User:
-                                            potential_match = User.objects.filter(
-                                                Q(id=fk_value) | Q(username=fk_value) | Q(email=fk_value)
-                                            ).first()
-                                        
-                                        # Search by common name fields
-                                        if not potential_match:
-                                            for search_field in ['name', 'company_name', 'full_name', 'username', 'email']:
-                                                try:
-                                                    if search_field in [f.name for f in target_model._meta.get_fields()]:
-                                                        potential_match = target_model.objects.filter(**{search_field: fk_value}).first()
-                                                        if potential_match:
-                                                            break
-                                                except: continue
-                                        
-                                        # GENERAL HAMMER: Create a minimal placeholder for any missing required FK
-                                        if not potential_match:
-                                            print(f"[SYNC] Creating placeholder {target_model.__name__} id={fk_value}")
-                                            try:
-                                                placeholder_data = {target_model._meta.pk.name: fk_value}
-                                                # Fill required string fields with placeholder text
-                                                for f in target_model._meta.get_fields():
-                                                    if not hasattr(f, 'column'): continue
-                                                    if f.primary_key: continue
-                                                    if not getattr(f, 'blank', True) and not getattr(f, 'null', True):
-                                                        if f.is_relation and f.concrete:
-                                                            # For required FK fields, try to use the current row's value
-                                                            fk_attname = getattr(f, 'attname', f.name + '_id')
-                                                            row_fk_val = cleaned_data.get(fk_attname) or row_data.get(fk_attname)
-                                                            if row_fk_val and f.related_model.objects.filter(id=row_fk_val).exists():
-                                                                placeholder_data[fk_attname] = row_fk_val
-                                                            else:
-                                                                # Try store_id specifically as a common required FK
-                                                                if fk_attname == 'store_id':
-                                                                    store_val = cleaned_data.get('store_id') or row_data.get('store_id')
-                                                                    if store_val:
-                                                                        placeholder_data[fk_attname] = store_val
-                                                                elif fk_attname == 'account_id':
-                                                                    # For Sales placeholders, use the default account
-                                                                    acct_val = cleaned_data.get('account_id') or row_data.get('account_id')
-                                                                    if acct_val:
-                                                                        placeholder_data[fk_attname] = acct_val
-                                                                    else:
-                                                                        # Try to find any account for the store
-                                                                        from api.models import Account
-                                                                        store_val = cleaned_data.get('store_id') or row_data.get('store_id')
-                                                                        if store_val:
-                                                                            default_acct = Account.objects.filter(store_id=store_val).first()
-                                                                            if default_acct:
-                                                                                placeholder_data[fk_attname] = default_acct.id
-                                                        elif f.get_internal_type() in ['CharField', 'TextField']:
-                                                            placeholder_data[f.name] = f"placeholder_{fk_value}"
-                                                        elif f.get_internal_type() == 'BooleanField':
-                                                            placeholder_data[f.name] = False
-                                                        elif f.get_internal_type() in ['IntegerField', 'FloatField', 'DecimalField']:
-                                                            placeholder_data[f.name] = 0
-                                                        elif f.get_internal_type() == 'DateField':
-                                                            placeholder_data[f.name] = timezone.now().date()
-                                                        elif f.get_internal_type() == 'DateTimeField':
-                                                            placeholder_data[f.name] = timezone.now()
-                                                # Special extra fields for User
-                                                if target_model == User:
-                                                    placeholder_data.update({
-                                                        'username': f"placeholder_{fk_value}",
-                                                        'email': f"placeholder_{fk_value}@ghizer.local",
-                                                        'is_active': True, # Allow immediate login for synced ERP users
-                                                    })
-                                                potential_match, _ = target_model.objects.get_or_create(
-                                                    **{target_model._meta.pk.name: fk_value},
-                                                    defaults=placeholder_data
-                                                )
-                                            except Exception as p_err:
-                                                print(f"[SYNC] Placeholder creation failed for {target_model.__name__}: {p_err}")
-                                        
-                                        if potential_match:
-                                            print(f"[SYNC] Resolved FK {fk_field}='{fk_value}' to {potential_match.id}")
-                                            id_mapping[fk_value] = potential_match.id
-                                            fk_value = potential_match.id
-                                            cleaned_data[fk_field] = fk_value
-                                        else:
-                                            # Truly unresolvable — null it if allowed, else skip row
-                                            if getattr(rel, 'null', False):
-                                                cleaned_data[fk_field] = None
-                                            else:
-                                                error_msg = f"Missing dependency {fk_value} for {table}.{fk_field}"
-                                                print(f"[SYNC] SKIP ROW: {error_msg}")
-                                                raise Exception(error_msg)
-
-                                if 'sync_status' in valid_fields:
-                                    cleaned_data['sync_status'] = 1
-                                
-                                if table == 'users' and 'email' in cleaned_data:
-                                    email = cleaned_data.get('email')
-                                    existing_user = User.objects.filter(email=email).first()
-                                    if existing_user:
-                                        incoming_password = cleaned_data.get('password')
-                                        from django.contrib.auth.hashers import check_password
-                                        is_placeholder = False
-                                        if incoming_password:
-                                            try:
-                                                is_placeholder = check_password('ChangeMe123!', incoming_password)
-                                            except: pass
-
-                                        for key, value in cleaned_data.items():
-                                            if key == 'password' and is_placeholder:
-                                                continue
-                                            setattr(existing_user, key, value)
-                                        
-                                        # Critical: ensure the ID matches if we found it by email
-                                        if existing_user.id != obj_id:
-                                            print(f"[SYNC] Collapsing user ID {obj_id} into existing {existing_user.id} ({email})")
-                                            id_mapping[obj_id] = existing_user.id
-                                        
-                                        existing_user.save()
-                                        obj, created = existing_user, False
-                                    else:
-                                        obj, created = model.objects.update_or_create(id=obj_id, defaults=cleaned_data)
-                                elif table == 'employees' and 'user_id' in cleaned_data:
-                                    user_id = cleaned_data.get('user_id')
-                                    existing_emp = model.objects.filter(user_id=user_id).first()
-                                    if existing_emp:
-                                        print(f"[SYNC] Employee for user {user_id} already exists (id={existing_emp.id}). Updating instead of creating {obj_id}.")
-                                        for key, value in cleaned_data.items():
-                                            setattr(existing_emp, key, value)
-                                        existing_emp.save()
-                                        obj, created = existing_emp, False
-                                    else:
-                                        obj, created = model.objects.update_or_create(id=obj_id, defaults=cleaned_data)
-                                elif table == 'payroll' and 'month' in cleaned_data:
-                                    # Fix: Handle "March 2026" or other non-ISO formats
-                                    month_val = cleaned_data.get('month')
-                                    if isinstance(month_val, str) and '-' not in month_val:
-                                        try:
-                                            # Try common formats like "March 2026"
-                                            try:
-                                                parsed_date = datetime.strptime(month_val, '%B %Y')
-                                            except:
-                                                # Fallback to general parser if available or just skip
-                                                from dateutil import parser
-                                                parsed_date = parser.parse(month_val)
-                                            
-                                            cleaned_data['month'] = parsed_date.strftime('%Y-%m-%d')
-                                            print(f"[SYNC] Normalized payroll month: {month_val} -> {cleaned_data['month']}")
-                                        except:
-                                            print(f"[SYNC] Failed to parse payroll month: {month_val}")
-                                    obj, created = model.objects.update_or_create(id=obj_id, defaults=cleaned_data)
-                                else:
-                                    if table == 'users':
-                                        cleaned_data['is_active'] = True
-                                    obj, created = model.objects.update_or_create(id=obj_id, defaults=cleaned_data)
-                                
-                                print(f"SAVED {table} {obj_id}: Created={created}")
-                                synced_ids[table].append(obj_id)
-                                # Universal mapping update
-                                if obj.id != obj_id:
-                                    id_mapping[obj_id] = obj.id
-                        except Exception as row_error:
-                            import traceback
-                            print(f"CRITICAL ERROR syncing {table} row {obj_id}: {str(row_error)}")
-                            traceback.print_exc()
-                            continue
-                
-                # CATCH-ALL Loop for tables not in the fixed ORDER list
-                for table, rows in payload.items():
-                    if table in ORDER or table in ['deviceId', 'sync_version']: 
-                        continue
-                    
-                    if table not in synced_ids:
-                        synced_ids[table] = []
-                        
-                    model = self.get_model(table)
-                    if not model: continue
-                    
-                    print(f"DEBUG: Processing Catch-All table {table} ({len(rows)} rows)")
-                    for row in rows:
-                        obj_id = row.get('id', 'unknown')
-                        try:
-                            with transaction.atomic():
-                                row_data = {}
-                                for k, v in row.items():
-                                    if k == 'sync_status': continue
-                                    snake_key = ''.join(['_' + c.lower() if c.isupper() else c for c in k]).lstrip('_')
-                                    row_data[snake_key] = v
-                                    
-                                valid_fields = {f.name for f in model._meta.get_fields() if not (f.is_relation and not f.concrete)}
-                                valid_fields.update({getattr(f, 'attname', None) for f in model._meta.get_fields()})
-                                
-                                cleaned_data = {}
-                                for k, v in row_data.items():
-                                    if k not in valid_fields: continue
-                                    field_obj = next((f for f in model._meta.get_fields() if f.name == k or getattr(f, 'attname', None) == k), None)
-                                    effective_key = getattr(field_obj, 'attname', k) if field_obj and field_obj.is_relation else k
-                                    
-                                    # Basic normalization
-                                    if v == "" or v is None:
-                                        cleaned_data[effective_key] = None if getattr(field_obj, 'null', False) else v
-                                    else:
-                                        # Simple Aware transition
-                                        if field_obj and field_obj.get_internal_type() == 'DateTimeField' and isinstance(v, str):
-                                            try:
-                                                from django.utils.dateparse import parse_datetime
-                                                pv = parse_datetime(v.strip())
-                                                if pv and timezone.is_naive(pv):
-                                                    v = timezone.make_aware(pv)
-                                            except: pass
-                                        cleaned_data[effective_key] = v
-                                
-                                target_id = cleaned_data.pop('id', obj_id)
-                                obj, created = model.objects.update_or_create(id=target_id, defaults=cleaned_data)
-                                synced_ids[table].append(obj_id)
-                        except Exception as row_err:
-                            print(f"Catch-all ERROR {table} {obj_id}: {str(row_err)}")
-                            continue
-
-            return Response({
+            # No outer transaction: each chunk commits on its own, like the job
+            # worker. A push-long transaction would commit rows stamped behind
+            # watermarks pulls had already handed out (see get_settle_cutoff).
+            # A failed push is simply retried, the ledger skips applied rows.
+            noop_ids = {}
+            synced_ids = self.ingest(payload, device_id=device_id, noop_ids=noop_ids, force=force)
+            noops = sum(len(ids) for ids in noop_ids.values())
+            result = {
                 "status": "success",
                 "synced_ids": synced_ids,
+                "noop_ids": noop_ids,
+                "applied": sum(len(ids) for ids in synced_ids.values()) - noops,
+                "noops": noops,
                 "sync_version": "1.0.3-Robust-FK"
-            }, status=status.HTTP_200_OK)
+            }
+            if idempotency_key:
+                save_push_receipt(device_id, idempotency_key, result)
+
+            return Response(result, status=status.HTTP_200_OK)
 
         except Exception as e:
             import traceback
@@ -605,6 +344,595 @@ class PushEndpoint(APIView):
                 "sync_version": "1.0.3-Robust-FK-FAILED"
             }, status=status.HTTP_400_BAD_REQUEST)
 
+    def enqueue(self, request, payload, device_id):
+        """Persist the payload as a SyncJob for process_sync_jobs and answer immediately."""
+        store_id = self.get_store_id(request.data, payload)
+        progress = {
+            table: {"total": len(payload[table]), "synced": 0}
+            for table in self.push_tables(payload)
+        }
+        job = SyncJob.objects.create(
+            store_id=store_id,
+            device_id=device_id,
+            # MessagePack pushes parse to datetimes/Decimals; the worker reads them back as JSON strings
+            payload=to_json_types(payload),
+            progress=progress,
+            total_rows=sum(entry["total"] for entry in progress.values()),
+        )
+        print(f"SYNC PUSH QUEUED: job {job.id} for store {job.store_id} ({job.total_rows} rows)")
+        return Response({
+            "status": "queued",
+            "job_id": job.id,
+            "status_url": f"sync/jobs/{job.id}",
+            "sync_version": "1.0.3-Robust-FK"
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @staticmethod
+    def get_store_id(data, payload=None):
+        """Store a push belongs to: explicit store_id, else the first pushed store, else ''."""
+        store_id = data.get('store_id') or data.get('storeId')
+        if not store_id and payload and payload.get('stores'):
+            store_id = payload['stores'][0].get('id')
+        return store_id or ''
+
+    def ingest(self, payload, progress=None, device_id=None, noop_ids=None, force=False, id_mapping=None):
+        """
+        Apply a push payload table by table. Each table is normalized in memory one
+        chunk at a time and written with a single bulk upsert; a chunk that fails
+        as a whole is replayed row by row so one bad row only skips itself.
+
+        Every chunk runs in its own atomic block, a real commit for sync/push and
+        the job worker, a savepoint inside a push session chunk. The optional
+        `progress(table, synced_count, total)` callback fires after each chunk.
+
+        With a device_id, rows identical to what that device last pushed (per the
+        SyncLedger) are not written again; they are still reported in synced_ids
+        and, if a `noop_ids` dict is passed, collected there per table. `force`
+        re-applies every row but still refreshes the ledger.
+
+        `id_mapping` (incoming id -> server id) is updated in place; chunked
+        pushes pass the session's mapping so remaps made by earlier chunks
+        still apply to the foreign keys of later ones.
+        Returns the synced_ids dict reported back to the device.
+        """
+        synced_ids = {table: [] for table in self.ORDER}
+        if id_mapping is None:
+            id_mapping = {}  # Map incoming ID -> existing server ID for collisions
+        chunk_size = get_push_chunk_size()
+
+        for table in self.push_tables(payload):
+            rows = payload[table]
+            # CATCH-ALL for tables not in the fixed ORDER list
+            catch_all = table not in self.ORDER
+            if table not in synced_ids:
+                synced_ids[table] = []
+
+            model = self.get_model(table)
+            if not model:
+                if not catch_all:
+                    print(f"DEBUG: Model NOT FOUND for table {table}")
+                continue
+
+            if catch_all:
+                print(f"DEBUG: Processing Catch-All table {table} ({len(rows)} rows)")
+            else:
+                print(f"DEBUG: Processing {len(rows)} rows for table {table}")
+
+            for chunk in chunked(rows, chunk_size):
+                unchanged = []
+                # bulk_sync: post_save side effects (low stock, user logins) run once per chunk
+                with transaction.atomic(), bulk_sync():
+                    if device_id:
+                        changed, unchanged, hashes = split_unchanged(device_id, table, chunk)
+                        if force:
+                            unchanged = []
+                        else:
+                            chunk = changed
+                    saved = self.ingest_chunk(table, model, chunk, id_mapping, catch_all) if chunk else []
+                    if device_id:
+                        record_ledger(device_id, table, saved, hashes)
+                synced_ids[table].extend(saved)
+                if unchanged:
+                    print(f"[SYNC] {table}: {len(unchanged)} unchanged rows skipped")
+                    synced_ids[table].extend(unchanged)
+                    if noop_ids is not None:
+                        noop_ids.setdefault(table, []).extend(unchanged)
+                if progress:
+                    progress(table, len(synced_ids[table]), len(rows))
+
+        return synced_ids
+
+    def push_tables(self, payload):
+        """Payload tables in FK-safe order: ORDER first, then anything unknown."""
+        tables = [table for table in self.ORDER if table in payload]
+        tables += [
+            table for table in payload
+            if table not in self.ORDER and table not in ['deviceId', 'sync_version']
+        ]
+        return tables
+
+    def ingest_chunk(self, table, model, chunk, id_mapping, catch_all=False):
+        """Normalize, FK-resolve and write one chunk of raw rows. Returns the saved ids."""
+        prepared = []
+        for row in chunk:
+            obj_id = row.get('id', 'unknown')
+            try:
+                if catch_all:
+                    prepared.append(self.normalize_catch_all_row(model, row))
+                else:
+                    prepared.append(self.normalize_row(table, model, row))
+            except Exception as row_error:
+                import traceback
+                print(f"CRITICAL ERROR syncing {table} row {obj_id}: {str(row_error)}")
+                traceback.print_exc()
+                continue
+
+        if table == 'users':
+            self.prepare_user_passwords(prepared)
+        if not catch_all:
+            prepared = self.resolve_foreign_keys(table, model, prepared, id_mapping)
+            self.fill_parent_store(model, prepared)
+        # Bulk upserts skip the pre_save receiver that moves inline images out
+        externalize_rows(model, prepared)
+        return self.write_chunk(table, model, prepared, id_mapping)
+
+    def write_chunk(self, table, model, prepared, id_mapping):
+        """Persist one normalized chunk, returning the ids that were saved."""
+        if not prepared:
+            return []
+
+        if table not in self.ROW_BY_ROW_TABLES and not has_save_side_effects(model):
+            try:
+                # One savepoint: if logging the changes fails too, the upsert is
+                # rolled back with it and the row-by-row retry starts clean
+                with transaction.atomic():
+                    saved = bulk_upsert(model, prepared)
+                    # bulk_create sends no post_save, so log the changes and queue the side effects here
+                    record_changes(model, saved)
+                    defer_side_effects(model, saved)
+                print(f"SAVED {table}: {len(prepared)} rows (bulk)")
+                return [obj_id for obj_id, _ in prepared]
+            except Exception as bulk_error:
+                print(f"[SYNC] Bulk upsert failed for {table} chunk ({len(prepared)} rows), retrying row by row: {bulk_error}")
+
+        saved = []
+        for obj_id, cleaned_data in prepared:
+            try:
+                with transaction.atomic():
+                    obj, created = self.save_row(table, model, obj_id, cleaned_data, id_mapping)
+                print(f"SAVED {table} {obj_id}: Created={created}")
+                saved.append(obj_id)
+                # Universal mapping update
+                if obj.pk != obj_id:
+                    id_mapping[obj_id] = obj.pk
+            except Exception as row_error:
+                import traceback
+                print(f"CRITICAL ERROR syncing {table} row {obj_id}: {str(row_error)}")
+                traceback.print_exc()
+                continue
+        return saved
+
+    def prepare_user_passwords(self, prepared):
+        """
+        Turn the passwords of a chunk of users rows into hashes: already hashed
+        values are kept, plaintext is hashed (see hash_passwords), new users
+        without one get the placeholder and existing users without one keep
+        theirs. Existing users also keep theirs when the row carries the hash
+        they already have or a placeholder, so re-pushing a pulled user costs
+        a string comparison. One email lookup per chunk.
+        """
+        emails = {cleaned_data.get('email') for _, cleaned_data in prepared if cleaned_data.get('email')}
+        stored = dict(User.objects.filter(email__in=emails).values_list('email', 'password')) if emails else {}
+
+        pending = []
+        for _, cleaned_data in prepared:
+            incoming_password = cleaned_data.get('password')
+            email = cleaned_data.get('email')
+            if not incoming_password:
+                if email in stored:
+                    # For existing users, if password is not provided, don't update it
+                    cleaned_data.pop('password', None)
+                else:
+                    cleaned_data['password'] = placeholder_password_hash()
+            elif incoming_password == '********':
+                cleaned_data.pop('password', None)
+            elif not incoming_password.startswith(HASHED_PASSWORD_PREFIXES):
+                pending.append(cleaned_data)
+            elif email in stored and (
+                incoming_password == stored[email]
+                or is_placeholder_password(incoming_password)
+                # A placeholder hashed on the device; only checked for a hash that differs from the stored one
+                or encodes_placeholder(incoming_password)
+            ):
+                cleaned_data.pop('password', None)
+
+        hashes = hash_passwords([(cleaned_data['password'], stored.get(cleaned_data.get('email'))) for cleaned_data in pending])
+        for cleaned_data, encoded in zip(pending, hashes):
+            cleaned_data['password'] = encoded
+
+    def fill_parent_store(self, model, prepared):
+        """
+        Copy the parent's store onto child rows that arrive without one
+        (models with STORE_PARENT, e.g. sale payments). Model.save() does the
+        same, but the bulk path skips it. One IN query per chunk.
+        """
+        parent_name = getattr(model, 'STORE_PARENT', None)
+        if not parent_name or not prepared:
+            return
+        parent_field = model._meta.get_field(parent_name)
+        missing = {
+            cleaned_data[parent_field.attname] for _, cleaned_data in prepared
+            if not cleaned_data.get('store_id') and cleaned_data.get(parent_field.attname)
+        }
+        if not missing:
+            return
+        stores = dict(parent_field.related_model.objects.filter(pk__in=missing).values_list('pk', 'store_id'))
+        for _, cleaned_data in prepared:
+            if not cleaned_data.get('store_id'):
+                store_id = stores.get(cleaned_data.get(parent_field.attname))
+                if store_id:
+                    cleaned_data['store_id'] = store_id
+
+    def normalize_row(self, table, model, row):
+        """
+        Turn one incoming camelCase row into (obj_id, cleaned_data) ready for the ORM:
+        snake_case keys, only concrete fields and aware datetimes. FKs are resolved
+        afterwards for the whole chunk by resolve_foreign_keys().
+        """
+        schema = get_schema(model)
+
+        # 1. Convert camelCase to snake_case for all keys
+        row_data = {}
+        for k, v in row.items():
+            if k == 'sync_status': continue
+            row_data[camel_to_snake(k)] = v
+
+        # Passwords are hashed per chunk afterwards, see prepare_user_passwords()
+
+        # Debug logging
+        if table in ['users', 'products', 'customers', 'sales']:
+            print(f"SYNCING {table.upper()}: {row_data.get('id')} | Deleted: {row_data.get('is_deleted')} | Email/Name: {row_data.get('email') or row_data.get('name')}")
+
+        if 'email' in row_data and not row_data.get('username'):
+            row_data['username'] = row_data['email']
+
+        # Normalize roles: only for users
+        if table == 'users':
+            valid_roles = [c[0] for c in model._meta.get_field('role').choices]
+            if row_data.get('role') not in valid_roles:
+                row_data['role'] = 'staff'
+
+            if 'is_active' not in row_data:
+                row_data['is_active'] = True
+
+            row_data['is_verified'] = True
+
+            incoming_role = (row_data.get('role') or 'user').lower()
+            if incoming_role in ['admin', 'super_admin']:
+                row_data['is_staff'] = True
+                row_data['is_superuser'] = True
+        elif table == 'employees':
+            row_data['is_verified'] = True
+
+        if 'name' in row_data:
+            name_parts = row_data['name'].split(' ', 1)
+            row_data['first_name'] = name_parts[0]
+            row_data['last_name'] = name_parts[1] if len(name_parts) > 1 else ''
+
+        cleaned_data = {}
+        for k, v in row_data.items():
+            field_obj = schema.by_key.get(k)
+            if field_obj is None:
+                continue
+
+            # SKIP auto_now / auto_now_add — Django manages these, passing values causes RuntimeWarning
+            if field_obj.auto_now:
+                continue
+
+            # If it's a relationship, use the attname (e.g. category_id) for assignment
+            effective_key = field_obj.attname
+            internal_type = field_obj.internal_type
+
+            if v == "" or v is None:
+                if field_obj.null:
+                    v = None
+                elif internal_type in ['CharField', 'TextField']:
+                    v = ""
+            # Hardened Datetime Handling
+            elif internal_type in ['DateTimeField', 'DateField', 'TimeField']:
+                v = make_aware_if_naive(v)
+                if internal_type == 'DateField' and isinstance(v, datetime):
+                    v = v.date()
+                elif internal_type == 'TimeField' and isinstance(v, datetime):
+                    v = v.time()
+
+            cleaned_data[effective_key] = v
+
+        if table == 'users':
+            if cleaned_data.get('first_name') is None: cleaned_data['first_name'] = ""
+            if cleaned_data.get('last_name') is None: cleaned_data['last_name'] = ""
+
+        obj_id = cleaned_data.pop('id')
+
+        if schema.has_field('sync_status'):
+            cleaned_data['sync_status'] = 1
+
+        if table == 'payroll' and 'month' in cleaned_data:
+            # Fix: Handle "March 2026" or other non-ISO formats
+            month_val = cleaned_data.get('month')
+            if isinstance(month_val, str) and '-' not in month_val:
+                try:
+                    # Try common formats like "March 2026"
+                    try:
+                        parsed_date = datetime.strptime(month_val, '%B %Y')
+                    except:
+                        # Fallback to general parser if available or just skip
+                        from dateutil import parser
+                        parsed_date = parser.parse(month_val)
+
+                    cleaned_data['month'] = parsed_date.strftime('%Y-%m-%d')
+                    print(f"[SYNC] Normalized payroll month: {month_val} -> {cleaned_data['month']}")
+                except:
+                    print(f"[SYNC] Failed to parse payroll month: {month_val}")
+
+        return obj_id, cleaned_data
+
+    # Fields tried, in order, when an incoming FK value isn't a known primary key
+    FK_NAME_FALLBACK_FIELDS = ['name', 'company_name', 'full_name', 'username', 'email']
+
+    def resolve_foreign_keys(self, table, model, prepared, id_mapping):
+        """
+        PROACTIVE FK VALIDATION & MAPPING for a whole normalized chunk.
+
+        Collects every FK value per target model and resolves them set-wise:
+        one pk IN query, then the name-field fallback (also IN queries) for the
+        misses, then a single bulk_create of placeholders for whatever is still
+        unknown. Rows whose required FK can't be resolved are dropped.
+        """
+        schema = get_schema(model)
+        if not prepared or not schema.relations:
+            return prepared
+
+        # 1. Clean + translate values, and collect them per target model
+        wanted = {}  # target model -> {fk_value: first row's cleaned_data (placeholder context)}
+        for obj_id, cleaned_data in prepared:
+            for rel in schema.relations:
+                fk_field = rel.attname
+                fk_value = cleaned_data.get(fk_field)
+                if isinstance(fk_value, str):
+                    fk_value = fk_value.strip()
+                    cleaned_data[fk_field] = fk_value
+
+                # Try to resolve ID via mapping first
+                if fk_value in id_mapping:
+                    fk_value = id_mapping[fk_value]
+                    cleaned_data[fk_field] = fk_value
+
+                if fk_value:
+                    wanted.setdefault(rel.related_model, {}).setdefault(fk_value, cleaned_data)
+
+        # 2. Resolve each target model with set-based queries
+        resolved = {}  # target model -> {fk_value: server pk}
+        for target_model, values in wanted.items():
+            resolved[target_model] = self.resolve_fk_values(target_model, values)
+
+        # 3. Rewrite rows, dropping those with an unresolvable required FK
+        kept = []
+        for obj_id, cleaned_data in prepared:
+            skip = False
+            for rel in schema.relations:
+                fk_field = rel.attname
+                fk_value = cleaned_data.get(fk_field)
+                if not fk_value:
+                    continue
+                match = resolved[rel.related_model].get(fk_value)
+                if match is not None:
+                    if match != fk_value:
+                        print(f"[SYNC] Resolved FK {fk_field}='{fk_value}' to {match}")
+                        id_mapping[fk_value] = match
+                    cleaned_data[fk_field] = match
+                elif rel.null:
+                    # Truly unresolvable — null it if allowed, else skip row
+                    cleaned_data[fk_field] = None
+                else:
+                    print(f"[SYNC] SKIP ROW: Missing dependency {fk_value} for {table}.{fk_field}")
+                    skip = True
+                    break
+            if not skip:
+                kept.append((obj_id, cleaned_data))
+        return kept
+
+    def resolve_fk_values(self, target_model, values):
+        """Map each requested FK value to an existing (or newly placeholdered) pk of target_model."""
+        target_schema = get_schema(target_model)
+
+        found = {pk: pk for pk in target_model.objects.filter(pk__in=list(values)).values_list('pk', flat=True)}
+        # Values may arrive as str for integer pks; compare on the string form
+        found.update({str(pk): pk for pk in list(found)})
+        misses = [v for v in values if v not in found]
+        if not misses:
+            return found
+
+        # Special case for Users: match by email or username first
+        if target_model == User:
+            for user_id, username, email in User.objects.filter(
+                Q(username__in=misses) | Q(email__in=misses)
+            ).values_list('id', 'username', 'email'):
+                for key in (username, email):
+                    if key in misses and key not in found:
+                        found[key] = user_id
+            misses = [v for v in misses if v not in found]
+
+        # Search by common name fields
+        for search_field in self.FK_NAME_FALLBACK_FIELDS:
+            if not misses:
+                break
+            if not target_schema.has_field(search_field):
+                continue
+            try:
+                for key, pk in target_model.objects.filter(
+                    **{f"{search_field}__in": misses}
+                ).values_list(search_field, 'pk'):
+                    found.setdefault(key, pk)
+            except Exception:
+                continue
+            misses = [v for v in misses if v not in found]
+
+        # GENERAL HAMMER: Create minimal placeholders for any missing FK targets
+        if misses:
+            found.update(self.create_placeholders(target_model, {v: values[v] for v in misses}))
+        return found
+
+    def create_placeholders(self, target_model, misses):
+        """
+        Create one placeholder row per missing FK value in a single bulk_create.
+        `misses` maps fk_value -> the referencing row's cleaned_data, which supplies
+        required parent FKs such as store_id/account_id.
+        """
+        target_schema = get_schema(target_model)
+        pk_name = target_schema.pk_name
+        print(f"[SYNC] Creating {len(misses)} placeholder {target_model.__name__} rows: {list(misses)[:10]}")
+
+        # Existence of the parent FKs the placeholders would borrow, one query per parent model
+        required_fks = [f for f in target_schema.required_fields if f.is_relation]
+        known_parents = {}
+        for f in required_fks:
+            candidates = {ctx.get(f.attname) for ctx in misses.values() if ctx.get(f.attname)}
+            known_parents[f.attname] = set(
+                f.related_model.objects.filter(pk__in=candidates).values_list('pk', flat=True)
+            ) if candidates else set()
+
+        default_accounts = {}
+        if any(f.attname == 'account_id' for f in required_fks):
+            store_ids = {ctx.get('store_id') for ctx in misses.values() if ctx.get('store_id')}
+            for acct_id, acct_store in Account.objects.filter(store_id__in=store_ids).values_list('id', 'store_id'):
+                default_accounts.setdefault(acct_store, acct_id)
+
+        placeholders = []
+        now = timezone.now()
+        for fk_value, ctx in misses.items():
+            placeholder_data = {pk_name: fk_value}
+            # Fill required fields with placeholder values
+            for f in target_schema.required_fields:
+                if f.is_relation:
+                    # For required FK fields, try to use the current row's value
+                    row_fk_val = ctx.get(f.attname)
+                    if row_fk_val and row_fk_val in known_parents[f.attname]:
+                        placeholder_data[f.attname] = row_fk_val
+                    # Try store_id specifically as a common required FK
+                    elif f.attname == 'store_id':
+                        if ctx.get('store_id'):
+                            placeholder_data[f.attname] = ctx['store_id']
+                    elif f.attname == 'account_id':
+                        # For Sales placeholders, use the row's account or any account of the store
+                        acct_val = ctx.get('account_id') or default_accounts.get(ctx.get('store_id'))
+                        if acct_val:
+                            placeholder_data[f.attname] = acct_val
+                elif f.internal_type in ['CharField', 'TextField']:
+                    placeholder_data[f.name] = f"placeholder_{fk_value}"
+                elif f.internal_type == 'BooleanField':
+                    placeholder_data[f.name] = False
+                elif f.internal_type in ['IntegerField', 'FloatField', 'DecimalField']:
+                    placeholder_data[f.name] = 0
+                elif f.internal_type == 'DateField':
+                    placeholder_data[f.name] = now.date()
+                elif f.internal_type == 'DateTimeField':
+                    placeholder_data[f.name] = now
+            # Special extra fields for User
+            if target_model == User:
+                placeholder_data.update({
+                    'username': f"placeholder_{fk_value}",
+                    'email': f"placeholder_{fk_value}@ghizer.local",
+                    'is_active': True, # Allow immediate login for synced ERP users
+                })
+            placeholders.append(placeholder_data)
+
+        if not has_save_side_effects(target_model):
+            try:
+                with transaction.atomic():
+                    target_model.objects.bulk_create(
+                        [target_model(**data) for data in placeholders], ignore_conflicts=True
+                    )
+                # ignore_conflicts also swallows clashes on other unique columns, so confirm what exists
+                existing = list(target_model.objects.filter(pk__in=list(misses)).values_list('pk', flat=True))
+                # Like bulk_upsert, bulk_create sends no post_save
+                record_changes(target_model, existing)
+                defer_side_effects(target_model, existing)
+                return {pk: pk for pk in existing}
+            except Exception as p_err:
+                print(f"[SYNC] Bulk placeholder creation failed for {target_model.__name__}, retrying one by one: {p_err}")
+
+        created = {}
+        for placeholder_data in placeholders:
+            fk_value = placeholder_data.pop(pk_name)
+            try:
+                with transaction.atomic():
+                    target_model.objects.get_or_create(**{pk_name: fk_value}, defaults=placeholder_data)
+                created[fk_value] = fk_value
+            except Exception as p_err:
+                print(f"[SYNC] Placeholder creation failed for {target_model.__name__}: {p_err}")
+        return created
+
+    def normalize_catch_all_row(self, model, row):
+        """Lightweight normalization for tables outside ORDER (no FK repair)."""
+        schema = get_schema(model)
+        obj_id = row.get('id', 'unknown')
+
+        cleaned_data = {}
+        for k, v in row.items():
+            if k == 'sync_status': continue
+            field_obj = schema.resolve(k)
+            if field_obj is None: continue
+            effective_key = field_obj.attname
+
+            # Basic normalization
+            if v == "" or v is None:
+                cleaned_data[effective_key] = None if field_obj.null else v
+            else:
+                # Simple Aware transition
+                if field_obj.internal_type == 'DateTimeField' and isinstance(v, str):
+                    try:
+                        from django.utils.dateparse import parse_datetime
+                        pv = parse_datetime(v.strip())
+                        if pv and timezone.is_naive(pv):
+                            v = timezone.make_aware(pv)
+                    except: pass
+                cleaned_data[effective_key] = v
+
+        target_id = cleaned_data.pop('id', obj_id)
+        return target_id, cleaned_data
+
+    def save_row(self, table, model, obj_id, cleaned_data, id_mapping):
+        """Row-by-row write path (special tables and failed bulk chunks)."""
+        if table == 'users' and 'email' in cleaned_data:
+            email = cleaned_data.get('email')
+            existing_user = User.objects.filter(email=email).first()
+            if existing_user:
+                # prepare_user_passwords() already dropped passwords that must not replace theirs
+                for key, value in cleaned_data.items():
+                    setattr(existing_user, key, value)
+
+                # Critical: ensure the ID matches if we found it by email
+                if existing_user.id != obj_id:
+                    print(f"[SYNC] Collapsing user ID {obj_id} into existing {existing_user.id} ({email})")
+                    id_mapping[obj_id] = existing_user.id
+
+                existing_user.save()
+                return existing_user, False
+        elif table == 'employees' and 'user_id' in cleaned_data:
+            user_id = cleaned_data.get('user_id')
+            existing_emp = model.objects.filter(user_id=user_id).first()
+            if existing_emp:
+                print(f"[SYNC] Employee for user {user_id} already exists (id={existing_emp.id}). Updating instead of creating {obj_id}.")
+                for key, value in cleaned_data.items():
+                    setattr(existing_emp, key, value)
+                existing_emp.save()
+                return existing_emp, False
+
+        if table == 'users':
+            cleaned_data['is_active'] = True
+        return model.objects.update_or_create(id=obj_id, defaults=cleaned_data)
+
     def get_model(self, table_name):
         model_mapping = {
             'stores': Store,
@@ -654,246 +982,951 @@ class PushEndpoint(APIView):
         return model_mapping.get(table_name)
 
 class PullEndpoint(APIView):
+    """
+    Sends every row changed since `last_sync` for the device's store.
+
+    Paginated mode: when the client sends `page_size` and/or a `cursors` dict,
+    each table returns at most page_size rows ordered by (delta field, pk),
+    together with an opaque per-table cursor and a has_more flag. The client
+    passes `cursors` back unchanged (with the same last_sync) until no table
+    has more. Without either key the whole delta is returned as before.
+    """
     permission_classes = [AllowBootstrapSync | permissions.IsAuthenticated]
 
+     # Order for pulling usually doesn't matter as much, but we'll follow same order
+    ORDER = [
+        'stores', 
+        'users', 
+        'accounts', 
+        'categories',
+        'expense_categories',
+        'tax_slabs',
+        'customers', 
+        'payment_terms',
+        'suppliers',
+        'supplier_custom_fields',
+        'supplier_custom_values',
+        'products', 
+        'quotations',
+        'sales', 
+        'purchases',
+        'supplier_transactions',
+        'supplier_documents', 
+        'transactions', 
+        'stock_logs',
+        'receivings',
+        'receiving_items',
+        'gift_cards',
+        'sale_payments',
+        'work_orders',
+        'deliveries', 
+        'delivery_zones', 
+        'user_permissions',
+        'invoices',
+        'invoice_items',
+        'cheques',
+        'attendance',
+        'leaves',
+        'employees',
+        'payroll',
+        'performance_reviews',
+        'shifts',
+        'online_orders',
+        'online_order_items',
+    ]
+
+    # We can use the mapping from a helper or just define it here to be cleaner
+    MODEL_MAPPING = {
+        'stores': Store,
+        'users': User,
+        'accounts': Account,
+        'expense_categories': ExpenseCategory,
+        'tax_slabs': TaxSlab,
+        'products': Product,
+        'customers': Customer,
+        'sales': Sale,
+        'quotations': Quotation,
+        'purchases': Purchase,
+        'purchase_orders': PurchaseOrder,
+        'stock_transfers': StockTransfer,
+        'stock_logs': StockLog,
+        'transactions': Transaction,
+        'loyalty_points': LoyaltyPoint,
+        'commissions': Commission,
+        'suppliers': Supplier,
+        'supplier_custom_fields': SupplierCustomField,
+        'supplier_custom_values': SupplierCustomFieldValue,
+        'supplier_transactions': SupplierTransaction,
+        'payment_terms': PaymentTerm,
+        'supplier_documents': SupplierDocument,
+        'gift_cards': GiftCard,
+        'sale_payments': SalePayment,
+        'work_orders': WorkOrder,
+        'deliveries': Delivery,
+        'delivery_zones': DeliveryZone,
+        'invoice_items': InvoiceItem,
+        'invoices': Invoice,
+        'receivings': Receiving,
+        'receiving_items': ReceivingItem,
+        'attendance': Attendance,
+        'leaves': Leave,
+        'employees': Employee,
+        'cheques': Cheque,
+        'categories': Category,
+        'user_permissions': UserPermission,
+        'online_orders': OnlineOrder,
+        'online_order_items': OnlineOrderItem,
+    }
+
+    # Append-only tables are delta-filtered on their creation timestamp
+    CREATED_AT_TABLES = ['stock_logs', 'supplier_transactions', 'cheques']
+
+    # Rows every store receives
+    GLOBAL_TABLES = ['stores', 'users', 'user_permissions', 'expense_categories', 'tax_slabs']
+
+    # Negotiated per request: MessagePack responses keep Decimal/datetime values native
+    parser_classes = sync_parser_classes()
+    renderer_classes = sync_renderer_classes()
+    native_types = False
+
+    # Columns fetched only to derive other output keys (users' display name)
+    PULL_EXTRA_COLUMNS = {
+        'users': ('first_name', 'last_name', 'username'),
+    }
+
     def post(self, request):
         try:
             data = request.data
             store_id = data.get('store_id')
             last_sync = data.get('last_sync') # ISO timestamp string
+            self.native_types = wants_native_types(request)
             bootstrap = request.query_params.get('bootstrap') == 'true'
             
             if not store_id and not bootstrap:
                 return Response({"status": "error", "message": "store_id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-             # Order for pulling usually doesn't matter as much, but we'll follow same order
-            ORDER = [
-                'stores', 
-                'users', 
-                'accounts', 
-                'categories',
-                'expense_categories',
-                'tax_slabs',
-                'customers', 
-                'payment_terms',
-                'suppliers',
-                'supplier_custom_fields',
-                'supplier_custom_values',
-                'products', 
-                'quotations',
-                'sales', 
-                'purchases',
-                'supplier_transactions',
-                'supplier_documents', 
-                'transactions', 
-                'stock_logs',
-                'receivings',
-                'receiving_items',
-                'gift_cards',
-                'sale_payments',
-                'work_orders',
-                'deliveries', 
-                'delivery_zones', 
-                'user_permissions',
-                'invoices',
-                'invoice_items',
-                'cheques',
-                'attendance',
-                'leaves',
-                'employees',
-                'payroll',
-                'performance_reviews',
-                'shifts',
-                'user_permissions',
-                'online_orders',
-                'online_order_items',
-            ]
-
-            updates = {}
-            
-            # We can use the mapping from a helper or just define it here to be cleaner
-            model_mapping = {
-                'stores': Store,
-                'users': User,
-                'accounts': Account,
-                'expense_categories': ExpenseCategory,
-                'tax_slabs': TaxSlab,
-                'products': Product,
-                'customers': Customer,
-                'sales': Sale,
-                'quotations': Quotation,
-                'purchases': Purchase,
-                'purchase_orders': PurchaseOrder,
-                'stock_transfers': StockTransfer,
-                'stock_logs': StockLog,
-                'transactions': Transaction,
-                'loyalty_points': LoyaltyPoint,
-                'commissions': Commission,
-                'suppliers': Supplier,
-                'supplier_custom_fields': SupplierCustomField,
-                'supplier_custom_values': SupplierCustomFieldValue,
-                'supplier_transactions': SupplierTransaction,
-                'payment_terms': PaymentTerm,
-                'supplier_documents': SupplierDocument,
-                'gift_cards': GiftCard,
-                'sale_payments': SalePayment,
-                'work_orders': WorkOrder,
-                'deliveries': Delivery,
-                'delivery_zones': DeliveryZone,
-                'invoice_items': InvoiceItem,
-                'invoices': Invoice,
-                'receivings': Receiving,
-                'receiving_items': ReceivingItem,
-                'attendance': Attendance,
-                'leaves': Leave,
-                'employees': Employee,
-                'cheques': Cheque,
-                'categories': Category,
-                'user_permissions': UserPermission,
-                'online_orders': OnlineOrder,
-                'online_order_items': OnlineOrderItem,
+            # Every read below (watermark included) sees one consistent snapshot,
+            # which contains every write stamped before the cutoff taken first
+            self.table_stats = {}
+            cutoff = get_settle_cutoff()
+            with read_snapshot() as snapshot_id:
+                response = self.pull(data, store_id, last_sync, snapshot_id, cutoff)
+
+            # Outside the read-only snapshot: remember what this device was served
+            device_id = data.get('deviceId') or data.get('device_id')
+            if device_id and response.status_code == status.HTTP_200_OK:
+                since_seq = data.get('since_seq')
+                try:
+                    record_device_state(
+                        device_id, store_id, self.table_stats,
+                        watermark=last_sync, change_seq=int(since_seq) if since_seq is not None else None,
+                    )
+                except Exception as state_err:
+                    print(f"[SYNC] Could not record sync state for device {device_id}: {state_err}")
+            return response
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            error_msg = str(e)
+            return Response({
+                "status": "error",
+                "message": error_msg
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    def pull(self, data, store_id, last_sync, snapshot_id, cutoff):
+        """Build the pull response; runs inside read_snapshot()."""
+        change_seq, server_time = get_sync_watermark(cutoff)
+
+        # Change-log mode: "everything since seq X" from one indexed table
+        since_seq = data.get('since_seq')
+        if since_seq is not None and store_id:
+            result = self.pull_changes(store_id, int(since_seq), get_pull_page_size(data.get('page_size')), cutoff)
+            result["server_time"] = server_time
+            for table in set(result.get("updates", {})) | set(result.get("deletes", {})):
+                row_count = len(result["updates"].get(table, [])) + len(result["deletes"].get(table, []))
+                self.table_stats[table] = (row_count, None)
+            return Response(result, status=status.HTTP_200_OK)
+
+        cursors = data.get('cursors')
+        paginate = cursors is not None or bool(data.get('page_size'))
+        page_size = get_pull_page_size(data.get('page_size')) if paginate else None
+        cursors = cursors or {}
+
+        updates = {}
+        next_cursors = {}
+        has_more = {}
+
+        # Incremental pulls skip tables with nothing newer than last_sync (one probe query)
+        skip = set()
+        if last_sync and store_id:
+            candidates = [table for table in self.ORDER if table in self.MODEL_MAPPING and not cursors.get(table)]
+            skip = set(candidates) - self.changed_tables(store_id, last_sync, candidates)
+            if skip:
+                print(f"[SYNC] Skipping {len(skip)} unchanged tables")
+
+        # Opt-in fan-out; tables it didn't produce are pulled below one by one
+        prefetched = {}
+        if get_pull_workers() > 1 and snapshot_id:
+            prefetched = self.pull_tables_parallel(snapshot_id, store_id, last_sync, cursors, page_size, skip)
+
+        for table in self.ORDER:
+            model = self.MODEL_MAPPING.get(table)
+            if not model:
+                continue
+            if table in skip:
+                self.table_stats[table] = (0, None)
+                if paginate:
+                    next_cursors[table] = None
+                    has_more[table] = False
+                continue
+
+            try:
+                outcome = prefetched.get(table)
+                if isinstance(outcome, Exception):
+                    raise outcome
+                if outcome is None:
+                    print(f"[SYNC] Pulling table: {table}")
+                    # Savepoint: a failing table must not abort the snapshot transaction
+                    with transaction.atomic():
+                        outcome = self.timed_pull_table(table, model, store_id, last_sync, cursors.get(table), page_size)
+                rows, cursor, more = outcome
+                if rows:
+                    updates[table] = rows
+                if paginate:
+                    next_cursors[table] = cursor
+                    has_more[table] = more
+            except InvalidCursor as cursor_err:
+                # A cursor we can't read: make the client restart this table rather than skip rows
+                return Response({"status": "error", "message": str(cursor_err)}, status=status.HTTP_400_BAD_REQUEST)
+            except Exception as table_err:
+                print(f"[PULL] SKIPPING table '{table}': {str(table_err)}")
+                # Don't abort the whole sync — skip this table and continue
+                continue
+
+        result = {
+            "status": "success",
+            "updates": updates,
+            "change_seq": change_seq,
+            "server_time": server_time
+        }
+        if paginate:
+            result.update({
+                "cursors": next_cursors,
+                "has_more": has_more,
+                "more": any(has_more.values()),
+                "page_size": page_size,
+            })
+        return Response(result, status=status.HTTP_200_OK)
+
+    @classmethod
+    def store_path(cls, table, model):
+        """
+        Lookup from a row of `table` to the store that receives it, or None when
+        every store does (ALL stores so the manager's store appears, ALL users
+        for cross-store staff/admins, shared lookup tables).
+        """
+        if table in cls.GLOBAL_TABLES:
+            return None
+        if get_schema(model).has_store:
+            return 'store_id'
+        return None
+
+    def pull_tables_parallel(self, snapshot_id, store_id, last_sync, cursors, page_size, skip=()):
+        """
+        Pull every table across SYNC_PULL_WORKERS threads, each on its own DB
+        connection pinned to the request's exported snapshot (`snapshot_id`
+        from read_snapshot, PostgreSQL only), so the result is as consistent
+        as the sequential pull but takes about as long as the slowest table.
+        Returns {table: (rows, cursor, more) or the exception raised}; tables
+        a worker never reached are simply missing.
+        """
+        import queue
+        import threading
+        import time
+        from django.db import connections
+
+        tables = [table for table in self.ORDER if table in self.MODEL_MAPPING and table not in skip]
+        outcomes = {}
+
+        def worker(snapshot_id, pending):
+            try:
+                with transaction.atomic():
+                    import_read_snapshot(snapshot_id)
+                    while True:
+                        try:
+                            table = pending.get_nowait()
+                        except queue.Empty:
+                            return
+                        try:
+                            # Savepoint: a failing table must not abort the snapshot transaction
+                            with transaction.atomic():
+                                outcomes[table] = self.timed_pull_table(
+                                    table, self.MODEL_MAPPING[table], store_id, last_sync,
+                                    cursors.get(table), page_size
+                                )
+                        except Exception as table_err:
+                            outcomes[table] = table_err
+            except Exception as e:
+                print(f"[PULL] Worker {threading.current_thread().name} failed: {e}")
+            finally:
+                # Worker threads own their connections; don't leak them
+                connections.close_all()
+
+        started = time.monotonic()
+        pending = queue.Queue()
+        for table in tables:
+            pending.put(table)
+        workers = [
+            threading.Thread(target=worker, args=(snapshot_id, pending), name=f"sync-pull-{i}")
+            for i in range(min(get_pull_workers(), len(tables)))
+        ]
+        for thread in workers:
+            thread.start()
+        # The exporting transaction (the caller's) has to stay open until every worker has imported it
+        for thread in workers:
+            thread.join()
+        print(f"[SYNC] Pulled {len(outcomes)}/{len(tables)} tables on {len(workers)} threads in {time.monotonic() - started:.3f}s")
+        return outcomes
+
+    def timed_pull_table(self, table, model, store_id, last_sync, cursor=None, page_size=None):
+        """pull_table() that also records (row count, duration ms) in self.table_stats."""
+        import time
+
+        started = time.monotonic()
+        rows, cursor, more = self.pull_table(table, model, store_id, last_sync, cursor, page_size)
+        self.table_stats[table] = (len(rows), round((time.monotonic() - started) * 1000, 2))
+        return rows, cursor, more
+
+    def changed_tables(self, store_id, last_sync, tables):
+        """
+        The subset of `tables` with rows newer than `last_sync` for this store,
+        found in one query: an EXISTS probe per table, each answered from its
+        (store, delta field, id) index. Tables without a delta field, and every
+        table if the probe fails, count as changed.
+        """
+        from django.db.models import Exists
+
+        changed, probes = set(), {}
+        for table in tables:
+            model = self.MODEL_MAPPING[table]
+            filter_field = self.delta_field(table, get_schema(model))
+            if filter_field is None:
+                changed.add(table)
+                continue
+            probes[table] = Exists(
+                self.base_queryset(table, model, store_id).filter(**{f"{filter_field}__gt": last_sync})
+            )
+        if not probes:
+            return changed
+
+        aliases = {f"changed_{i}": table for i, table in enumerate(probes)}
+        try:
+            with transaction.atomic():
+                flags = (
+                    Store.objects.filter(pk=store_id)
+                    .annotate(**{alias: probes[table] for alias, table in aliases.items()})
+                    .values_list(*aliases)
+                    .first()
+                )
+        except Exception as probe_err:
+            print(f"[SYNC] Change probe failed, pulling every table: {probe_err}")
+            return set(tables)
+        if flags is None:  # Unknown store: nothing to plan against
+            return set(tables)
+        return changed | {table for table, flag in zip(aliases.values(), flags) if flag}
+
+    @classmethod
+    def changelog_tables(cls):
+        """(table, model, store_path) for every pulled table, for api.sync.connect_changelog."""
+        return [
+            (table, cls.MODEL_MAPPING[table], cls.store_path(table, cls.MODEL_MAPPING[table]))
+            for table in cls.ORDER if table in cls.MODEL_MAPPING
+        ]
+
+    def base_queryset(self, table, model, store_id):
+        """Rows of `table` visible to a device of `store_id`."""
+        store_path = self.store_path(table, model)
+        if store_path is None:
+            return model.objects.all()
+        return model.objects.filter(**{store_path: store_id})
+
+    def delta_field(self, table, schema):
+        """Timestamp column used for `last_sync` filtering and keyset order, or None."""
+        # Generic filter field is updated_at, but some tables might use created_at or uploaded_at
+        if table in self.CREATED_AT_TABLES:
+            filter_field = 'created_at'
+        elif table == 'supplier_documents':
+            filter_field = 'uploaded_at'
+        else:
+            filter_field = 'updated_at'
+
+        # Check if the filter field exists in the model
+        if schema.has_field(filter_field):
+            return filter_field
+        elif schema.has_field('created_at'):
+            # Fallback to created_at if updated_at is missing
+            return 'created_at'
+        return None
+
+    def pull_table(self, table, model, store_id, last_sync, cursor=None, page_size=None):
+        """
+        Serialized rows of one table, plus the cursor after the last row and
+        whether more rows remain. With page_size=None the whole delta is returned.
+        """
+        schema = get_schema(model)
+        queryset = self.base_queryset(table, model, store_id)
+        filter_field = self.delta_field(table, schema)
+        pk_name = schema.pk_name
+
+        if last_sync:
+            if filter_field:
+                queryset = queryset.filter(**{f"{filter_field}__gt": last_sync})
+            else:
+                # If no timestamp field exists, we can't filter by delta, so fetch all
+                print(f"[SYNC] WARNING: Model {model.__name__} has no timestamp field to filter by {last_sync}")
+
+        # Plain tuples via values_list(): no model instances, no per-row FK lookups
+        columns, positions = self.pull_columns(table, schema, filter_field)
+
+        if page_size is None:
+            rows = [self.serialize_values(table, schema, values, positions) for values in queryset.values_list(*columns)]
+            return rows, None, False
+
+        # Keyset pagination on (filter_field, pk): stable under concurrent inserts, no OFFSET scans
+        if cursor:
+            from django.utils.dateparse import parse_datetime
+            position = decode_cursor(cursor)
+            if filter_field and len(position) == 2:
+                ts, last_pk = position
+                ts = parse_datetime(ts) if isinstance(ts, str) else None
+                if ts is None:
+                    raise InvalidCursor(f"Invalid pull cursor for {table}")
+                queryset = queryset.filter(
+                    Q(**{f"{filter_field}__gt": ts}) | Q(**{filter_field: ts, f"{pk_name}__gt": last_pk})
+                )
+            elif not filter_field and len(position) == 1:
+                queryset = queryset.filter(**{f"{pk_name}__gt": position[0]})
+            else:
+                raise InvalidCursor(f"Invalid pull cursor for {table}")
+
+        ordering = [filter_field, pk_name] if filter_field else [pk_name]
+        page = list(queryset.order_by(*ordering).values_list(*columns)[:page_size + 1])
+        more = len(page) > page_size
+        page = page[:page_size]
+
+        if page:
+            last = page[-1]
+            last_pk = last[positions[pk_name]]
+            if filter_field:
+                cursor = encode_cursor([last[positions[filter_field]].isoformat(), last_pk])
+            else:
+                cursor = encode_cursor([last_pk])
+        # No rows: keep the incoming cursor so the next call resumes from the same spot
+
+        return [self.serialize_values(table, schema, values, positions) for values in page], cursor, more
+
+    def pull_columns(self, table, schema, filter_field=None):
+        """values_list() columns for a table: the pull columns first, then any extras."""
+        columns = list(schema.pull_attnames)
+        for column in self.PULL_EXTRA_COLUMNS.get(table, ()) + (filter_field, schema.pk_name):
+            if column and column not in columns:
+                columns.append(column)
+        return columns, {column: index for index, column in enumerate(columns)}
+
+    def pull_changes(self, store_id, since_seq, limit, cutoff):
+        """
+        Change-log pull: the rows behind ChangeLog entries after `since_seq` for
+        this store, plus tombstones for deleted rows. At most `limit` entries are
+        consumed per call; `change_seq` is the watermark to send next time.
+        Entries newer than `cutoff` (get_settle_cutoff) wait for the next call:
+        an older seq may still be uncommitted, and jumping past it loses it.
+        """
+        from .models import ChangeLog
+
+        oldest = ChangeLog.objects.order_by('seq').values_list('seq', flat=True).first()
+        if oldest is not None and since_seq < oldest - 1:
+            # Entries after since_seq were pruned: only a full pull can catch up
+            return {
+                "status": "reset",
+                "message": "Change log no longer covers since_seq; run a full pull",
+                "change_seq": get_sync_watermark(cutoff)[0],
             }
 
+        entries = list(
+            ChangeLog.objects.filter(seq__gt=since_seq, store_id__in=[store_id, ''])
+            .order_by('seq')
+            .values_list('seq', 'table_name', 'row_pk', 'op', 'created_at')[:limit + 1]
+        )
+        more = len(entries) > limit
+        entries = entries[:limit]
+        for i, entry in enumerate(entries):
+            if entry[4] > cutoff:
+                entries, more = entries[:i], False
+                break
+
+        # Only the latest op per row matters
+        latest = {}
+        for seq, table, row_pk, op, _ in entries:
+            latest[(table, row_pk)] = op
+
+        upserts, deletes = {}, {}
+        for (table, row_pk), op in latest.items():
+            (deletes if op == 'delete' else upserts).setdefault(table, []).append(row_pk)
+
+        updates = {}
+        for table in self.ORDER:
+            model = self.MODEL_MAPPING.get(table)
+            if not model or table not in upserts:
+                continue
+            schema = get_schema(model)
+            columns, positions = self.pull_columns(table, schema)
+            rows = []
+            for pks in chunked(upserts[table], 500):
+                queryset = self.base_queryset(table, model, store_id).filter(pk__in=pks)
+                rows.extend(self.serialize_values(table, schema, values, positions) for values in queryset.values_list(*columns))
+            if rows:
+                updates[table] = rows
+
+        return {
+            "status": "success",
+            "updates": updates,
+            "deletes": deletes,
+            "change_seq": entries[-1][0] if entries else since_seq,
+            "more": more,
+        }
+
+    def serialize_values(self, table, schema, values, positions):
+        """
+        One values_list() tuple as the flat dict the desktop app's SQLite expects.
+        `values` starts with schema.pull_attnames; `positions` locates any extra columns.
+        """
+        # zip() stops at the pull columns; extra columns are only read below
+        converters = schema.pull_native_converters if self.native_types else schema.pull_converters
+        row_data = {
+            key: convert(val)
+            for key, convert, val in zip(schema.pull_keys, converters, values)
+        }
+        
+        # SPECIAL HANDLING FOR ACCOUNTS & PAYMENT TYPES
+        if table in ['accounts', 'sales', 'purchases', 'transactions']:
+            if row_data.get('type') not in ['cash', 'card', 'wallet']:
+                row_data['type'] = 'card'
+        
+        # SPECIAL HANDLING FOR SALES
+        if table == 'sales':
+            if row_data.get('type') not in ['retail', 'cash', 'credit']:
+                 row_data['type'] = 'cash'
+            if row_data.get('payment_mode') not in ['cash', 'card', 'wallet']:
+                 row_data['payment_mode'] = 'card'
+
+        # SPECIAL HANDLING FOR PURCHASES
+        if table == 'purchases':
+            if row_data.get('type') not in ['cash', 'credit']:
+                 row_data['type'] = 'cash'
+
+        # SPECIAL HANDLING FOR USERS
+        if table == 'users':
+            first_name = values[positions['first_name']]
+            last_name = values[positions['last_name']]
+            row_data['name'] = f"{first_name} {last_name}".strip()
+            if not row_data['name']:
+                 row_data['name'] = values[positions['username']]
+
+        return row_data
+
+
+class SyncStatusView(APIView):
+    """
+    Cheap "anything to pull?" check for clients polling on a timer.
+
+    GET sync/status?store_id=X&since_seq=N       (change-log watermark)
+    GET sync/status?store_id=X&last_sync=<iso>   (timestamp watermark)
+
+    Returns whether anything changed plus an estimated row count per table
+    (ChangeLog entries, so a row written twice counts twice; None when only
+    the per-table probe could answer). An idle store is answered from the
+    cached change head without a query, which may lag writes made by other
+    processes by up to SYNC_STATUS_CACHE_SECONDS (see get_change_head).
+    """
+    permission_classes = [AllowBootstrapSync | permissions.IsAuthenticated]
+
+    def get(self, request):
+        from django.db.models import Count
+        from django.utils.dateparse import parse_datetime
+        from .models import ChangeLog
+
+        store_id = request.query_params.get('store_id')
+        since_seq = request.query_params.get('since_seq')
+        last_sync = request.query_params.get('last_sync')
+        if not store_id or (since_seq is None and not last_sync):
+            return Response(
+                {"status": "error", "message": "store_id and since_seq or last_sync are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Newest entry visible to this store: its own or a global one
+        head_seq, head_at = max(get_change_head(store_id), get_change_head(''), key=lambda head: head[0])
+        result = {"status": "success", "changed": False, "tables": {}, "change_seq": head_seq}
+        visible = ChangeLog.objects.filter(store_id__in=[store_id, ''])
+
+        if since_seq is not None:
+            try:
+                since_seq = int(since_seq)
+            except ValueError:
+                return Response({"status": "error", "message": "since_seq must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+            if head_seq <= since_seq:
+                return Response(result, status=status.HTTP_200_OK)
+            entries = visible.filter(seq__gt=since_seq)
+        else:
+            last_sync_at = parse_datetime(last_sync)
+            if last_sync_at is None:
+                return Response({"status": "error", "message": "last_sync must be an ISO timestamp"}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(last_sync_at):
+                last_sync_at = timezone.make_aware(last_sync_at)
+            if head_at is not None and head_at <= last_sync_at:
+                return Response(result, status=status.HTTP_200_OK)
+            oldest_at = ChangeLog.objects.order_by('seq').values_list('created_at', flat=True).first()
+            if oldest_at is None or oldest_at > last_sync_at:
+                # The log was pruned past this watermark (or never had it): ask the tables themselves
+                pull = PullEndpoint()
+                tables = [table for table in pull.ORDER if table in pull.MODEL_MAPPING]
+                changed = pull.changed_tables(store_id, last_sync_at, tables)
+                result.update({"changed": bool(changed), "tables": {table: None for table in tables if table in changed}})
+                return Response(result, status=status.HTTP_200_OK)
+            entries = visible.filter(created_at__gt=last_sync_at)
+
+        counts = dict(entries.values_list('table_name').annotate(n=Count('seq')).order_by())
+        result.update({"changed": bool(counts), "tables": counts})
+        return Response(result, status=status.HTTP_200_OK)
+
+
+def authorize_sync_request(request):
+    """
+    The sync permission check (JWT user or bootstrap) for plain Django views
+    that can't go through DRF, such as the async event stream.
+    """
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except Exception as e:
+        print(f"[AUTH] Invalid token on {request.path}: {e}")
+        authenticated = None
+    if authenticated:
+        request.user = authenticated[0]
+    return AllowBootstrapSync().has_permission(request, None)
+
+
+async def sync_events(request):
+    """
+    GET sync/events?store_id=X[&since_seq=N]
+
+    Server-Sent Events stream of "tables X, Y changed up to seq N" messages for
+    a store (see api.events), so devices pull when something changed instead
+    of polling. Reconnecting clients resume from the Last-Event-ID header or
+    since_seq. Needs an ASGI server: under WSGI the stream would hold a worker.
+    """
+    from asgiref.sync import sync_to_async
+    from django.http import JsonResponse, StreamingHttpResponse
+    from .events import change_event_stream
+
+    if request.method != 'GET':
+        return JsonResponse({"status": "error", "message": "Method not allowed"}, status=405)
+    if 'wsgi.version' in request.META:
+        return JsonResponse({"status": "error", "message": "sync/events needs the ASGI server; poll sync/status instead"}, status=501)
+    if not await sync_to_async(authorize_sync_request)(request):
+        return JsonResponse({"status": "error", "message": "Authentication required"}, status=401)
+
+    store_id = request.GET.get('store_id')
+    if not store_id:
+        return JsonResponse({"status": "error", "message": "store_id is required"}, status=400)
+    since_seq = request.headers.get('Last-Event-ID') or request.GET.get('since_seq')
+    try:
+        since_seq = int(since_seq) if since_seq is not None else None
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "since_seq must be an integer"}, status=400)
+
+    response = StreamingHttpResponse(change_event_stream(store_id, since_seq), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
+
+
+class SnapshotView(APIView):
+    """
+    Bootstrap snapshot of a store (see api.snapshots).
+
+    GET  sync/snapshot?store_id=X          -> the compressed NDJSON file, built first if none exists
+    GET  sync/snapshot?store_id=X&meta=1   -> its metadata only
+    POST sync/snapshot {"store_id": X}     -> build a fresh one now
+    """
+    permission_classes = [AllowBootstrapSync | permissions.IsAuthenticated]
+
+    def get(self, request):
+        import os
+        from django.http import FileResponse
+        from .snapshots import build_snapshot, latest_snapshot
+
+        store_id = request.query_params.get('store_id')
+        if not store_id:
+            return Response({"status": "error", "message": "store_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        snapshot = latest_snapshot(store_id)
+        if snapshot is None:
+            print(f"[SNAPSHOT] No snapshot for {store_id}, building on demand")
+            snapshot = build_snapshot(store_id)
+
+        if request.query_params.get('meta') in ['1', 'true']:
+            return Response(self.describe(snapshot), status=status.HTTP_200_OK)
+
+        response = FileResponse(
+            open(snapshot.file_path, 'rb'),
+            as_attachment=True,
+            filename=os.path.basename(snapshot.file_path),
+            content_type='application/zstd' if snapshot.compression == 'zstd' else 'application/gzip',
+        )
+        response['X-Snapshot-Id'] = snapshot.id
+        response['X-Snapshot-Change-Seq'] = str(snapshot.change_seq)
+        response['X-Snapshot-Row-Count'] = str(snapshot.row_count)
+        return response
+
+    def post(self, request):
+        from .snapshots import build_snapshot
+
+        store_id = request.data.get('store_id')
+        if not store_id:
+            return Response({"status": "error", "message": "store_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        snapshot = build_snapshot(store_id)
+        return Response(self.describe(snapshot), status=status.HTTP_201_CREATED)
+
+    def describe(self, snapshot):
+        return {
+            "status": "success",
+            "snapshot_id": snapshot.id,
+            "store_id": snapshot.store_id,
+            "change_seq": snapshot.change_seq,
+            "compression": snapshot.compression,
+            "size_bytes": snapshot.size_bytes,
+            "row_count": snapshot.row_count,
+            "created_at": snapshot.created_at.isoformat(),
+        }
+
+
+class SyncJobStatusView(APIView):
+    """Progress of an async push queued with sync/push?async=1."""
+    permission_classes = [AllowBootstrapSync | permissions.IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = get_object_or_404(SyncJob, pk=job_id)
+        data = {
+            "status": job.status,
+            "job_id": job.id,
+            "store_id": job.store_id,
+            "device_id": job.device_id,
+            "progress": job.progress,
+            "total_rows": job.total_rows,
+            "processed_rows": job.processed_rows,
+            "attempts": job.attempts,
+            "created_at": job.created_at.isoformat(),
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+        if job.status == 'completed':
+            data["synced_ids"] = job.synced_ids
+        elif job.status == 'failed':
+            data["message"] = job.error
+        return Response(data, status=status.HTTP_200_OK)
 
-            for table in ORDER:
-                print(f"[SYNC] Pulling table: {table}")
-                model = model_mapping.get(table)
-                if not model:
-                    continue
-                
-                # 1. Class-based overrides (Most reliable)
-                if model == Store: 
-                     queryset = model.objects.all() # Fetch ALL stores so manager's store appears
-                elif model == User:
-                     queryset = model.objects.all() # Fetch ALL users for cross-store staff/admins
-                elif model == UserPermission:
-                     queryset = model.objects.all()
-                elif model == SalePayment:
-                     queryset = model.objects.filter(sale__store_id=store_id)
-                elif model == SupplierCustomFieldValue:
-                     queryset = model.objects.filter(supplier__store_id=store_id)
-                elif model in [LoyaltyPoint, Commission]:
-                     queryset = model.objects.filter(sale__store_id=store_id)
-                elif model in [WorkOrder, Delivery]:
-                     queryset = model.objects.filter(sale__store_id=store_id)
-                elif model in [ReceivingItem]:
-                     queryset = model.objects.filter(receiving__store_id=store_id)
-                elif model in [InvoiceItem]:
-                     queryset = model.objects.filter(invoice__store_id=store_id)
-                elif model in [ExpenseCategory, TaxSlab]:
-                     queryset = model.objects.all()
-                
-                # 2. Field-based filtering
-                elif 'store' in [f.name for f in model._meta.fields] or 'store_id' in [getattr(f, 'attname', None) for f in model._meta.fields]:
-                     queryset = model.objects.filter(store_id=store_id)
-                
-                # 3. Fallback
-                else:
-                     queryset = model.objects.all()
-
-                if last_sync:
-                    # Generic filter field is updated_at, but some tables might use created_at or uploaded_at
-                    if table in ['stock_logs', 'loyalty_points', 'commissions', 'supplier_transactions', 'cheques']:
-                        filter_field = 'created_at'
-                    elif table == 'supplier_documents':
-                        filter_field = 'uploaded_at'
-                    else:
-                        filter_field = 'updated_at'
-                        
-                    # Check if the filter field exists in the model
-                    available_fields = [f.name for f in model._meta.fields]
-                    if filter_field in available_fields:
-                        queryset = queryset.filter(**{f"{filter_field}__gt": last_sync})
-                    elif 'created_at' in available_fields:
-                        # Fallback to created_at if updated_at is missing
-                        queryset = queryset.filter(created_at__gt=last_sync)
-                    else:
-                        # If no timestamp field exists, we can't filter by delta, so fetch all
-                        print(f"[SYNC] WARNING: Model {model.__name__} has no timestamp field to filter by {last_sync}")
-                
-                try:
-                    rows = []
-                    for obj in queryset:
-                        row_data = {}
-                        for field in obj._meta.fields:
-                            if field.name in [
-                                'password', 
-                                'date_joined', 'groups', 'user_permissions', 'last_login', 
-                                'username', 'first_name', 'last_name'
-                            ]:
-                                continue
-                            
-                            val = getattr(obj, field.name)
-                            
-                            # Determine key_name (Local SQLite expects 'field_id' for Foreign Keys)
-                            key_name = field.name
-                            if field.is_relation and not key_name.endswith('_id'):
-                                key_name = f"{key_name}_id"
-
-                            if isinstance(val, (datetime, date)):
-                                row_data[key_name] = val.isoformat()
-                            elif isinstance(val, bool):
-                                row_data[key_name] = 1 if val else 0
-                            elif field.is_relation and val:
-                                row_data[key_name] = str(val.pk) if hasattr(val, 'pk') else str(val)
-                            elif val is not None:
-                                if isinstance(val, (int, float)):
-                                    row_data[key_name] = val
-                                else:
-                                    row_data[key_name] = str(val)
-                            else:
-                                row_data[key_name] = None
-                        
-                        # SPECIAL HANDLING FOR ACCOUNTS & PAYMENT TYPES
-                        if table in ['accounts', 'sales', 'purchases', 'transactions']:
-                            if row_data.get('type') not in ['cash', 'card', 'wallet']:
-                                row_data['type'] = 'card'
-                        
-                        # SPECIAL HANDLING FOR SALES
-                        if table == 'sales':
-                            if row_data.get('type') not in ['retail', 'cash', 'credit']:
-                                 row_data['type'] = 'cash'
-                            if row_data.get('payment_mode') not in ['cash', 'card', 'wallet']:
-                                 row_data['payment_mode'] = 'card'
-                        
-                        # SPECIAL HANDLING FOR PURCHASES
-                        if table == 'purchases':
-                            if row_data.get('type') not in ['cash', 'credit']:
-                                 row_data['type'] = 'cash'
-
-                        # SPECIAL HANDLING FOR USERS
-                        if table == 'users' and isinstance(obj, User):
-                            row_data['name'] = f"{obj.first_name} {obj.last_name}".strip()
-                            if not row_data['name']:
-                                 row_data['name'] = obj.username
-
-                        rows.append(row_data)
-                    
-                    if rows:
-                        updates[table] = rows
-                except Exception as table_err:
-                    print(f"[PULL] SKIPPING table '{table}': {str(table_err)}")
-                    # Don't abort the whole sync — skip this table and continue
-                    continue
+
+class DeviceSyncStateView(APIView):
+    """
+    Per-device pull lag, from DeviceSyncState.
+
+    GET sync/devices?store_id=...            -> one summary per device
+    GET sync/devices?device_id=...           -> that device, with per-table detail
+    """
+    permission_classes = [AllowBootstrapSync | permissions.IsAuthenticated]
+
+    def get(self, request):
+        from django.db.models import Max, Min, Sum
+        from .models import ChangeLog, DeviceSyncState
+
+        states = DeviceSyncState.objects.all()
+        store_id = request.query_params.get('store_id')
+        device_id = request.query_params.get('device_id')
+        if store_id:
+            states = states.filter(store_id=store_id)
+        if device_id:
+            states = states.filter(device_id=device_id)
+
+        now = timezone.now()
+        latest_seq = ChangeLog.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+        devices = []
+        summaries = states.values('device_id', 'store_id').annotate(
+            oldest_watermark=Min('watermark'),
+            change_seq=Min('change_seq'),
+            last_pulled_at=Max('last_pulled_at'),
+            last_row_count=Sum('last_row_count'),
+            last_duration_ms=Sum('last_duration_ms'),
+        ).order_by('device_id')
+        for summary in summaries:
+            watermark = summary['oldest_watermark']
+            devices.append({
+                **summary,
+                # Lag: how far behind the device's acknowledged state is
+                "lag_seconds": round((now - watermark).total_seconds(), 1) if watermark else None,
+                "lag_changes": latest_seq - summary['change_seq'] if summary['change_seq'] is not None else None,
+                "idle_seconds": round((now - summary['last_pulled_at']).total_seconds(), 1),
+            })
+
+        data = {"status": "success", "devices": devices}
+        if device_id:
+            data["tables"] = list(states.order_by('table_name').values(
+                'table_name', 'watermark', 'change_seq', 'last_row_count', 'last_duration_ms', 'last_pulled_at'
+            ))
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class PushSessionView(APIView):
+    """
+    Chunked, resumable push.
+
+    POST sync/push/sessions                       -> open a session
+    GET  sync/push/sessions/<id>                  -> acked chunk numbers (resume point)
+    POST sync/push/sessions/<id>/chunks/<seq>     -> PushChunkView
+    POST sync/push/sessions/<id>/complete         -> PushSessionCompleteView
+    """
+    permission_classes = [AllowBootstrapSync | permissions.IsAuthenticated]
+
+    def post(self, request):
+        data = request.data
+        session = PushSession.objects.create(
+            store_id=PushEndpoint.get_store_id(data),
+            device_id=data.get('deviceId'),
+            total_chunks=data.get('totalChunks') or data.get('total_chunks'),
+        )
+        print(f"SYNC PUSH SESSION OPENED: {session.id} (device {session.device_id})")
+        return Response({
+            "status": "open",
+            "session_id": session.id,
+            "chunk_size": get_push_chunk_size(),
+            "next_seq": 0,
+            "sync_version": "1.0.3-Robust-FK"
+        }, status=status.HTTP_201_CREATED)
+
+    def get(self, request, session_id):
+        session = get_object_or_404(PushSession, pk=session_id)
+        return Response(push_session_state(session), status=status.HTTP_200_OK)
+
+
+def push_session_state(session):
+    acked = list(session.chunks.values_list('seq', flat=True))
+    return {
+        "status": session.status,
+        "session_id": session.id,
+        "acked_seqs": acked,
+        "next_seq": max(acked) + 1 if acked else 0,
+        "total_chunks": session.total_chunks,
+    }
+
+
+class PushChunkView(APIView):
+    """
+    Apply one chunk of a PushSession. The chunk's rows and its PushChunk ack
+    commit in the same transaction: either both exist or neither does, so a
+    retried chunk is either replayed from its ack or applied for the first time.
+    """
+    permission_classes = [AllowBootstrapSync | permissions.IsAuthenticated]
+    parser_classes = sync_parser_classes()
+    renderer_classes = sync_renderer_classes()
+
+    def post(self, request, session_id, seq):
+        payload = request.data.get('payload', {})
+        session = get_object_or_404(PushSession, pk=session_id)
+
+        try:
+            with transaction.atomic():
+                # Lock the session so concurrent retries of the same chunk serialize here
+                session = PushSession.objects.select_for_update().get(pk=session.pk)
+                if session.status != 'open':
+                    return Response({
+                        "status": "error",
+                        "message": f"Push session {session.id} is {session.status}",
+                    }, status=status.HTTP_409_CONFLICT)
+
+                ack = session.chunks.filter(seq=seq).first()
+                if ack is not None:
+                    print(f"SYNC PUSH CHUNK {session.id}#{seq}: duplicate, skipped")
+                    return Response({
+                        "status": "duplicate",
+                        "seq": seq,
+                        "synced_ids": ack.synced_ids,
+                        "sync_version": "1.0.3-Robust-FK"
+                    }, status=status.HTTP_200_OK)
+
+                print(f"SYNC PUSH CHUNK {session.id}#{seq}: Payload keys: {list(payload.keys())}")
+                noop_ids = {}
+                synced_ids = PushEndpoint().ingest(
+                    payload, device_id=session.device_id, noop_ids=noop_ids, id_mapping=session.id_mapping
+                )
+                # Only report tables that were part of this chunk
+                synced_ids = {table: ids for table, ids in synced_ids.items() if ids or table in payload}
+                PushChunk.objects.create(
+                    session=session,
+                    seq=seq,
+                    row_count=sum(len(rows) for rows in payload.values() if isinstance(rows, list)),
+                    synced_ids=synced_ids,
+                )
+                # Committed with the chunk: remaps it made apply to the next chunks
+                session.save(update_fields=['id_mapping', 'updated_at'])
 
             return Response({
-                "status": "success",
-                "updates": updates,
-                "server_time": datetime.now().isoformat()
+                "status": "committed",
+                "seq": seq,
+                "synced_ids": synced_ids,
+                "noop_ids": noop_ids,
+                "sync_version": "1.0.3-Robust-FK"
             }, status=status.HTTP_200_OK)
 
         except Exception as e:
             import traceback
             traceback.print_exc()
-            error_msg = str(e)
-            if 'table' in locals():
-                error_msg = f"Error in table {table}: {error_msg}"
+            print(f"SYNC PUSH CHUNK {session_id}#{seq} FAILED: {e}")
             return Response({
                 "status": "error",
-                "message": error_msg
+                "seq": seq,
+                "message": str(e),
+                "sync_version": "1.0.3-Robust-FK-FAILED"
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
+class PushSessionCompleteView(APIView):
+    """Close a PushSession once every chunk is acked. Reports missing chunks instead if any."""
+    permission_classes = [AllowBootstrapSync | permissions.IsAuthenticated]
+
+    def post(self, request, session_id):
+        with transaction.atomic():
+            session = get_object_or_404(PushSession.objects.select_for_update(), pk=session_id)
+            state = push_session_state(session)
+
+            total = request.data.get('totalChunks') or request.data.get('total_chunks') or session.total_chunks
+            if total:
+                missing = sorted(set(range(int(total))) - set(state["acked_seqs"]))
+                if missing:
+                    state.update({"status": "incomplete", "missing_seqs": missing})
+                    return Response(state, status=status.HTTP_409_CONFLICT)
+
+            if session.status != 'completed':
+                session.status = 'completed'
+                session.completed_at = timezone.now()
+                session.save(update_fields=['status', 'completed_at', 'updated_at'])
+                print(f"SYNC PUSH SESSION COMPLETED: {session.id} ({len(state['acked_seqs'])} chunks)")
+
+        state["status"] = session.status
+        return Response(state, status=status.HTTP_200_OK)
+
+
 class EmployeeViewSet(viewsets.ModelViewSet):
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
@@ -1142,10 +2175,29 @@ class ProductViewSet(viewsets.ModelViewSet):
         if category_slug:
             qs = qs.filter(Q(category__name__iexact=category_slug.replace('-', ' ')) | Q(category__id=category_slug))
         if search:
-            qs = qs.filter(Q(name__icontains=search) | Q(sku__icontains=search) | Q(description__icontains=search) | Q(brand__icontains=search))
+            from .search import search_products
+            return search_products(qs, search)
             
         return qs.order_by('-updated_at')
 
+    @action(detail=False, methods=['get'], url_path='lookup', url_name='lookup')
+    def lookup_code(self, request):
+        """
+        GET products/lookup?code=<barcode|sku|id>&store_id=X
+
+        Exact-match scan resolution for POS counters: a compact product (no
+        nested images/features) from the scan cache or one indexed query.
+        """
+        from .search import lookup_product
+
+        code = (request.query_params.get('code') or '').strip()
+        if not code:
+            return Response({"status": "error", "message": "code is required"}, status=status.HTTP_400_BAD_REQUEST)
+        match, product = lookup_product(code, request.query_params.get('store_id'))
+        if product is None:
+            return Response({"status": "error", "message": f"No product with barcode, SKU or id {code}"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"status": "success", "match": match, "product": product})
+
 class CustomerViewSet(viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
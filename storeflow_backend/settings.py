@@ -58,7 +58,14 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.DefaultCursorPagination',
+    'PAGE_SIZE': config('API_PAGE_SIZE', default=50, cast=int), # Rows per list page unless ?page_size= asks otherwise
+    'DEFAULT_FILTER_BACKENDS': (
+        'api.filters.IndexedOrderingFilter', # ?ordering= on indexed fields only
+        'api.filters.SparseFieldsFilter', # ?fields= skips unused heavy columns
+    ),
 }
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=500, cast=int) # Upper bound for ?page_size= on list endpoints
 
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -69,6 +76,7 @@ SIMPLE_JWT = {
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.SyncCompressionMiddleware', # gzip/zstd bodies on /sync/ endpoints
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -154,15 +162,56 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Content-addressed image store (api/media.py): inline Base64 images are moved here
+MEDIA_ROOT = config('MEDIA_ROOT', default=os.path.join(BASE_DIR, 'media'))
+MEDIA_STORAGE_BACKEND = config('MEDIA_STORAGE_BACKEND', default='django.core.files.storage.FileSystemStorage') # e.g. storages.backends.s3.S3Storage (django-storages, configured by its AWS_* settings)
+MEDIA_PUBLIC_BASE_URL = config('MEDIA_PUBLIC_BASE_URL', default='') # CDN/bucket URL of the store; empty serves images from /api/v1/media/
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'media': {
+        'BACKEND': MEDIA_STORAGE_BACKEND,
+        'OPTIONS': {'location': MEDIA_ROOT} if MEDIA_STORAGE_BACKEND.endswith('FileSystemStorage') else {},
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Razorpay Configuration
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID', default='rzp_test_RkIqS6NBhGBvNP')
+RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='R6NhkQ1ajPrZOFbP694hZEcD')
 
 # Sync Configuration
 ALLOW_BOOTSTRAP_SYNC = config('ALLOW_BOOTSTRAP_SYNC', default=False, cast=bool)
-RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='R6NhkQ1ajPrZOFbP694hZEcD')
+SYNC_PUSH_CHUNK_SIZE = config('SYNC_PUSH_CHUNK_SIZE', default=500, cast=int) # Rows per bulk upsert during sync push
+SYNC_JOB_TIMEOUT_SECONDS = config('SYNC_JOB_TIMEOUT_SECONDS', default=900, cast=int) # A running async push with no progress for this long is requeued (its worker died)
+SYNC_JOB_MAX_ATTEMPTS = config('SYNC_JOB_MAX_ATTEMPTS', default=3, cast=int) # ...and failed once it has been started this many times
+SYNC_IDEMPOTENCY_TTL_HOURS = config('SYNC_IDEMPOTENCY_TTL_HOURS', default=72, cast=int) # How long Idempotency-Key receipts are replayed
+SYNC_LEDGER_RETENTION_DAYS = config('SYNC_LEDGER_RETENTION_DAYS', default=30, cast=int) # Push dedup ledger rows not refreshed for this long are pruned (manage.py prune_changelog)
+SYNC_PULL_PAGE_SIZE = config('SYNC_PULL_PAGE_SIZE', default=1000, cast=int) # Default rows per table per paginated pull
+SYNC_PULL_MAX_PAGE_SIZE = config('SYNC_PULL_MAX_PAGE_SIZE', default=5000, cast=int) # Upper bound for a client-requested page_size
+SYNC_PULL_WORKERS = config('SYNC_PULL_WORKERS', default=0, cast=int) # >1 pulls tables in parallel on this many DB connections (PostgreSQL only)
+SYNC_HASH_WORKERS = config('SYNC_HASH_WORKERS', default=0, cast=int) # >1 hashes pushed user passwords on a process pool of this size, in process_sync_jobs only (see api.sync.enable_hash_pool)
+SYNC_PLACEHOLDER_SALT = config('SYNC_PLACEHOLDER_SALT', default='syncplaceholder') # Fixed salt of the placeholder password hash given to synced users without one (changing it needs migration 0041's backfill again)
+SYNC_COMPRESS_MIN_BYTES = config('SYNC_COMPRESS_MIN_BYTES', default=1024, cast=int) # Smaller sync responses are sent uncompressed
+SYNC_MAX_DECOMPRESSED_BYTES = config('SYNC_MAX_DECOMPRESSED_BYTES', default=256 * 1024 * 1024, cast=int) # Cap for inflated gzip/zstd push bodies
+SYNC_CHANGELOG_RETENTION_DAYS = config('SYNC_CHANGELOG_RETENTION_DAYS', default=30, cast=int) # Devices further behind than this must do a full pull
+SYNC_CHANGELOG_SETTLE_SECONDS = config('SYNC_CHANGELOG_SETTLE_SECONDS', default=5, cast=int) # Pull watermarks stay this far behind now and, on PostgreSQL, behind the oldest open write transaction (clock skew margin); on other databases writes must commit within it
+SYNC_STATUS_CACHE_SECONDS = config('SYNC_STATUS_CACHE_SECONDS', default=30, cast=int) # Max staleness of sync/status across processes (in-process writes invalidate at once)
+SYNC_EVENTS_BROKER = config('SYNC_EVENTS_BROKER', default='api.events.InProcessBroker') # Fan-out for sync/events streams; swap for a shared backend with several workers
+SYNC_EVENTS_KEEPALIVE_SECONDS = config('SYNC_EVENTS_KEEPALIVE_SECONDS', default=15, cast=int) # Comment line sent on idle sync/events streams so proxies keep them open
+
+# Bootstrap snapshots (manage.py build_snapshots, sync/snapshot)
+SYNC_SNAPSHOT_DIR = config('SYNC_SNAPSHOT_DIR', default=os.path.join(BASE_DIR, 'sync_snapshots'))
+SYNC_SNAPSHOT_COMPRESSION = config('SYNC_SNAPSHOT_COMPRESSION', default='gzip') # gzip, or zstd if zstandard is installed
+SYNC_SNAPSHOT_REBUILD_CHANGES = config('SYNC_SNAPSHOT_REBUILD_CHANGES', default=5000, cast=int) # Rebuild after this many store changes
+SYNC_SNAPSHOT_MAX_AGE_HOURS = config('SYNC_SNAPSHOT_MAX_AGE_HOURS', default=24, cast=int) # ...or once the newest snapshot is this old
+SYNC_SNAPSHOT_KEEP = config('SYNC_SNAPSHOT_KEEP', default=2, cast=int) # Snapshots kept per store, older ones are deleted
+
+# POS barcode/SKU scans (products/lookup); writes in this process invalidate at once
+PRODUCT_LOOKUP_CACHE_SECONDS = config('PRODUCT_LOOKUP_CACHE_SECONDS', default=60, cast=int) # Max staleness of a cached scan across processes
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'